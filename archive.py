@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Архив сессий radacct в сжатых CSV-файлах по месяцам
+"""
+
+import csv
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from schema import ACCT_COLUMNS
+
+class MonthlyCsvArchive:
+    """Каталог файлов radacct-ГГГГ-ММ.csv.gz с контрольной точкой
+    
+    Строки дописываются в файл месяца начала сессии (каждая дозапись -
+    отдельный член gzip, файл читается обычными средствами). Колонки - как
+    в radacct на момент архивации; если они изменились, строки месяца
+    пишутся в следующий файл (radacct-ГГГГ-ММ.2.csv.gz), а не под чужой
+    заголовок. Контрольная точка хранит диапазон radacctid, записанный
+    в файлы, но еще не удаленный из radacct: после сбоя эти строки
+    удаляются без повторной записи.
+    """
+    
+    CHECKPOINT = 'checkpoint.json'
+    
+    def __init__(self, directory: str, columns: Sequence[str] = ACCT_COLUMNS):
+        self.directory = directory
+        self.columns = tuple(columns)
+        self.start_index = self.columns.index('acctstarttime')
+        self.stop_index = self.columns.index('acctstoptime')
+        os.makedirs(directory, exist_ok=True)
+    
+    def month_path(self, month: str) -> str:
+        """Файл месяца с текущими колонками (новый или с тем же заголовком)"""
+        number = 1
+        while True:
+            suffix = f".{number}" if number > 1 else ''
+            path = os.path.join(self.directory, f"radacct-{month}{suffix}.csv.gz")
+            if not os.path.exists(path):
+                return path
+            with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+                if tuple(next(csv.reader(f), ())) == self.columns:
+                    return path
+            number += 1
+    
+    def write(self, rows: Sequence[tuple]) -> Dict[str, int]:
+        """Дозапись строк (в порядке columns) в файлы месяцев"""
+        by_month: Dict[str, List[tuple]] = defaultdict(list)
+        for row in rows:
+            moment = row[self.start_index] or row[self.stop_index]
+            month = moment.strftime('%Y-%m') if isinstance(moment, datetime) else 'unknown'
+            by_month[month].append(row)
+        
+        for month, month_rows in by_month.items():
+            path = self.month_path(month)
+            is_new = not os.path.exists(path)
+            with gzip.open(path, 'at', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(self.columns)
+                writer.writerows(month_rows)
+        
+        return {month: len(month_rows) for month, month_rows in by_month.items()}
+    
+    def load_checkpoint(self) -> Optional[dict]:
+        """Незавершенный диапазон {'lo', 'hi', 'cutoff'} или None"""
+        try:
+            with open(os.path.join(self.directory, self.CHECKPOINT), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def save_checkpoint(self, lo: int, hi: int, cutoff: datetime):
+        """Запись контрольной точки (атомарно, через временный файл)"""
+        path = os.path.join(self.directory, self.CHECKPOINT)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'lo': lo, 'hi': hi, 'cutoff': cutoff.isoformat()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+    
+    def clear_checkpoint(self):
+        try:
+            os.remove(os.path.join(self.directory, self.CHECKPOINT))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,720 @@
+#!/usr/bin/env python3
+"""
+Консольный (headless) интерфейс RADIUS User Manager
+
+Примеры:
+    python cli.py users list --format csv > users.csv
+    python cli.py users import users.csv
+    cat blocked.txt | python cli.py users block -
+    python cli.py attrs add user alice Session-Timeout := 7200 --type reply
+    python cli.py tables procedures
+    python cli.py -v acct archive --days 180 --mode csv
+    python cli.py acct close-stale --dry-run
+    python cli.py -v acct load-detail /var/log/freeradius/radacct/10.0.0.1/detail-*
+    python cli.py acct top --by nasipaddress --month 2024-05
+    python cli.py quota set group students --limit Max-Monthly-Traffic --value 50
+
+Не импортирует tkinter и не требует дисплея.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from config import ConfigManager
+from database import DatabaseManager, User, Group, Attribute, read_users_csv
+from jobs import ChunkSizer, Job, format_duration
+from maintenance import in_window, parse_window
+from quota import QUOTA_COUNTERS, find_counter, sqlcounter_config
+from schema import SCHEMA_VERSION
+from utils.logger import Logger
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_INTERRUPTED = 130
+
+def write_rows(rows: Iterable[Sequence], header: Sequence[str], fmt: str, out=sys.stdout) -> int:
+    """Вывод строк в формате tsv, csv или json (JSON Lines)"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == 'json':
+        for row in rows:
+            out.write(json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        for row in rows:
+            out.write("\t".join(str(value) for value in row) + "\n")
+            count += 1
+    return count
+
+def read_names(names: List[str], stdin=sys.stdin) -> List[str]:
+    """Имена из аргументов или из stdin (если аргументов нет или указан '-')"""
+    if not names or names == ['-']:
+        return [line.strip() for line in stdin if line.strip() and not line.startswith('#')]
+    return names
+
+def error(message: str):
+    """Сообщение об ошибке в stderr"""
+    print(f"Ошибка: {message}", file=sys.stderr)
+
+def run_job(db: DatabaseManager, name: str, items: list, process: Callable,
+            label: Callable = str, chunk_size: int = 100, show_progress: bool = False,
+            sizer: ChunkSizer = None, writers: int = None) -> int:
+    """Выполнение массовой операции как фоновой задачи с прогрессом в stderr"""
+    if writers is None:
+        writers = db.config.bulk_writers if db.config else 1
+    job = Job(name, items, process, db, chunk_size=chunk_size, label=label, sizer=sizer,
+              writers=writers)
+    job.start()
+    
+    try:
+        while job.is_running():
+            job.wait(1.0)
+            if show_progress:
+                progress = job.progress()
+                print(f"\r{name}: {progress.done}/{progress.total} "
+                      f"| {progress.rate:.1f} строк/с | порция {progress.chunk_size} "
+                      f"| осталось {format_duration(progress.eta)}",
+                      end='', file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        job.cancel()
+        job.wait()
+    
+    progress = job.progress()
+    if show_progress:
+        print(file=sys.stderr)
+    
+    for item, message in job.errors:
+        print(f"{item}\t{message}", file=sys.stderr)
+    
+    print(f"{name}: успешно {progress.succeeded}, ошибок {len(job.errors)}, "
+          f"время {format_duration(progress.elapsed)}", file=sys.stderr)
+    if job.metrics and progress.retries:
+        print(f"{name}: {job.metrics.summary()}", file=sys.stderr)
+    if sizer:
+        print(f"{name}: {job.chunk_summary()}", file=sys.stderr)
+    
+    if progress.state == Job.CANCELLED:
+        return EXIT_INTERRUPTED
+    return EXIT_OK if not job.errors else EXIT_FAILED
+
+def _results(ok_flags: Iterable[bool], db: DatabaseManager) -> List[Optional[str]]:
+    """Преобразование результатов методов DatabaseManager в ошибки задачи"""
+    return [None if ok else (db.last_error or "ошибка операции") for ok in ok_flags]
+
+# Команды: пользователи
+def cmd_users_list(db: DatabaseManager, args) -> int:
+    store = db.get_user_store()
+    rows = map(store.row_by_id, range(store.row_count()))
+    if args.group:
+        rows = (row for row in rows if row[1] == args.group)
+    if args.status:
+        status = 'Заблокирован' if args.status == 'blocked' else 'Активен'
+        rows = (row for row in rows if row[2] == status)
+    write_rows(rows, store.COLUMNS, args.format)
+    return EXIT_OK
+
+def cmd_users_add(db: DatabaseManager, args) -> int:
+    password = args.password
+    if password is None:
+        password = sys.stdin.readline().rstrip('\n')
+    if not password:
+        error("пароль не задан")
+        return EXIT_FAILED
+    
+    user = User(
+        username=args.username,
+        password=password,
+        group=args.group,
+        expiration=args.expiration or '',
+        simultaneous_use=args.simultaneous_use,
+        session_timeout=args.session_timeout,
+        idle_timeout=args.idle_timeout
+    )
+    extra_attributes = []
+    for attr_str in args.attr or []:
+        if '=' not in attr_str:
+            error(f"атрибут должен иметь вид Атрибут=Значение: {attr_str}")
+            return EXIT_FAILED
+        attr_name, attr_value = attr_str.split('=', 1)
+        extra_attributes.append(Attribute(attribute=attr_name.strip(), op='=', value=attr_value.strip()))
+    
+    if db.user_exists(user.username):
+        error(f"пользователь {user.username} уже существует")
+        return EXIT_FAILED
+    
+    if not db.add_user(user, extra_attributes):
+        error(db.last_error or "не удалось добавить пользователя")
+        return EXIT_FAILED
+    return EXIT_OK
+
+def cmd_users_passwd(db: DatabaseManager, args) -> int:
+    password = args.password
+    if password is None:
+        password = sys.stdin.readline().rstrip('\n')
+    if not password:
+        error("пароль не задан")
+        return EXIT_FAILED
+    
+    if not db.update_user_password(args.username, password):
+        error(db.last_error or "не удалось изменить пароль")
+        return EXIT_FAILED
+    return EXIT_OK
+
+def cmd_users_bulk(db: DatabaseManager, args) -> int:
+    names = read_names(args.usernames)
+    if not names:
+        return EXIT_OK
+    
+    if args.action == 'delete':
+        process = lambda worker, chunk: _results((worker.delete_user(name) for name in chunk), worker)
+    else:
+        block = args.action == 'block'
+        process = lambda worker, chunk: _results((worker.block_user(name, block) for name in chunk), worker)
+    
+    return run_job(db, f"users {args.action}", names, process,
+                   chunk_size=args.chunk_size, show_progress=args.verbose, writers=args.writers)
+
+def cmd_users_import(db: DatabaseManager, args) -> int:
+    if args.file == '-':
+        users, errors = read_users_csv(sys.stdin, args.group)
+    else:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            users, errors = read_users_csv(f, args.group)
+    
+    for message in errors:
+        print(message, file=sys.stderr)
+    if errors and not args.skip_invalid:
+        error(f"в файле {len(errors)} некорректных строк (используйте --skip-invalid)")
+        return EXIT_FAILED
+    
+    # Порция добавляется одной транзакцией; без --chunk-size размер подбирается
+    items = [(user, None) for user in users]
+    process = lambda worker, chunk: worker.add_users_batch(chunk)
+    sizer = ChunkSizer(rows_per_item=3) if args.chunk_size is None else None
+    result = run_job(db, "users import", items, process, label=lambda item: item[0].username,
+                     chunk_size=args.chunk_size or 100, show_progress=args.verbose, sizer=sizer,
+                     writers=args.writers)
+    return result if not errors else max(result, EXIT_FAILED)
+
+def cmd_users_export(db: DatabaseManager, args) -> int:
+    if args.file == '-':
+        count = db.write_users_csv(sys.stdout)
+    else:
+        with open(args.file, 'w', newline='', encoding='utf-8') as f:
+            count = db.write_users_csv(f)
+    print(f"Экспортировано пользователей: {count}", file=sys.stderr)
+    return EXIT_OK
+
+# Команды: группы
+def cmd_groups_list(db: DatabaseManager, args) -> int:
+    groups = db.get_groups()
+    rows = ((group.name, group.user_count, group.default_priority)
+            for group in groups if not group.name.startswith('_group_'))
+    write_rows(rows, ('name', 'user_count', 'default_priority'), args.format)
+    return EXIT_OK
+
+def cmd_groups_add(db: DatabaseManager, args) -> int:
+    if not db.add_group(Group(name=args.name, default_priority=args.priority)):
+        error("не удалось добавить группу")
+        return EXIT_FAILED
+    return EXIT_OK
+
+def cmd_groups_delete(db: DatabaseManager, args) -> int:
+    if not db.delete_group(args.name):
+        error("не удалось удалить группу")
+        return EXIT_FAILED
+    return EXIT_OK
+
+# Команды: атрибуты
+def cmd_attrs_list(db: DatabaseManager, args) -> int:
+    if args.owner == 'user':
+        check_attrs, reply_attrs = db.get_user_attributes(args.name)
+    else:
+        check_attrs, reply_attrs = db.get_group_attributes(args.name)
+    
+    rows = [('check', a.attribute, a.op, a.value) for a in check_attrs]
+    rows += [('reply', a.attribute, a.op, a.value) for a in reply_attrs]
+    write_rows(rows, ('type', 'attribute', 'op', 'value'), args.format)
+    return EXIT_OK
+
+def cmd_attrs_change(db: DatabaseManager, args) -> int:
+    attr = Attribute(attribute=args.attribute, op=args.op, value=args.value)
+    
+    if args.owner == 'user':
+        method = db.add_user_attribute if args.action == 'add' else db.delete_user_attribute
+    else:
+        method = db.add_group_attribute if args.action == 'add' else db.delete_group_attribute
+    
+    if not method(args.name, attr, args.type):
+        error("не удалось изменить атрибут")
+        return EXIT_FAILED
+    return EXIT_OK
+
+# Команды: квоты
+def cmd_quota_set(db: DatabaseManager, args) -> int:
+    counter = find_counter(args.limit)
+    if counter is None:
+        error(f"неизвестная квота {args.limit}; доступны: "
+              f"{', '.join(c.check_name for c in QUOTA_COUNTERS)}")
+        return EXIT_FAILED
+    if args.value is None and not args.clear:
+        error("укажите --value или --clear")
+        return EXIT_FAILED
+    
+    names = read_names(args.names)
+    if not names:
+        return EXIT_OK
+    
+    value = None if args.clear else counter.to_value(args.value)
+    
+    def process(worker, chunk):
+        # Порция - одна транзакция: результат общий для всех имен
+        return _results([worker.set_quota(chunk, counter.check_name, value, args.owner)] * len(chunk), worker)
+    
+    return run_job(db, f"quota set {counter.check_name}", names, process,
+                   chunk_size=args.chunk_size, show_progress=args.verbose)
+
+def cmd_quota_show(db: DatabaseManager, args) -> int:
+    rows = ((period, period_start.isoformat(), format_duration(session_time), octets_in, octets_out)
+            for period, period_start, session_time, octets_in, octets_out in db.get_quota_counters(args.username))
+    write_rows(rows, ('period', 'period_start', 'session_time', 'input_octets', 'output_octets'), args.format)
+    return EXIT_OK
+
+def cmd_quota_update(db: DatabaseManager, args) -> int:
+    db.last_error = ''
+    users = db.update_quota_counters()
+    print(f"users\t{users}")
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    return EXIT_OK
+
+def cmd_quota_sqlcounter(db: DatabaseManager, args) -> int:
+    sys.stdout.write(sqlcounter_config(args.sql_instance))
+    return EXIT_OK
+
+# Команды: таблицы
+def cmd_tables(db: DatabaseManager, args) -> int:
+    if args.action == 'create':
+        return EXIT_OK if db.create_radius_tables() else EXIT_FAILED
+    if args.action == 'procedures':
+        return EXIT_OK if db.install_procedures() else EXIT_FAILED
+    if args.action == 'indexes':
+        added, present, failed = db.tune_indexes()
+        for name in added:
+            print(f"added\t{name}")
+        for name in present:
+            print(f"present\t{name}")
+        for message in failed:
+            error(message)
+        return EXIT_FAILED if failed else EXIT_OK
+    if args.action == 'migrate':
+        return EXIT_OK if db.migrate() else EXIT_FAILED
+    print(f"schema_version\t{db.detect_schema()}\t{SCHEMA_VERSION}")
+    return EXIT_OK
+
+# Команды: учет сессий
+def cmd_acct_archive(db: DatabaseManager, args) -> int:
+    config = db.config
+    cancel = threading.Event()
+    result = []
+    
+    def show(moved: int):
+        if args.verbose:
+            print(f"\racct archive: перенесено {moved}", end='', file=sys.stderr, flush=True)
+    
+    worker = threading.Thread(target=lambda: result.append(db.archive_accounting(
+        args.days if args.days is not None else config.acct_retention_days,
+        mode=args.mode or config.acct_archive_mode,
+        directory=args.dir or config.acct_archive_dir,
+        batch_size=args.batch_size or config.acct_batch_size,
+        delay=args.delay if args.delay is not None else config.acct_batch_delay,
+        cancel=cancel,
+        progress=show
+    )), daemon=True)
+    worker.start()
+    
+    try:
+        while worker.is_alive():
+            worker.join(0.5)
+    except KeyboardInterrupt:
+        # Остановка на границе порции, повторный запуск продолжит
+        cancel.set()
+        worker.join()
+    
+    if args.verbose:
+        print(file=sys.stderr)
+    print(f"archived\t{result[0] if result else 0}")
+    
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    return EXIT_INTERRUPTED if cancel.is_set() else EXIT_OK
+
+def cmd_acct_cleanup(db: DatabaseManager, args) -> int:
+    config = db.config
+    window = None
+    if not args.ignore_window:
+        try:
+            window = parse_window(config.acct_cleanup_window)
+        except ValueError:
+            error(f"некорректное окно обслуживания: {config.acct_cleanup_window}")
+            return EXIT_FAILED
+        if not in_window(window):
+            error(f"вне окна обслуживания {config.acct_cleanup_window}")
+            return EXIT_FAILED
+    
+    print(f"pending_users\t{db.pending_acct_cleanup()}")
+    
+    def show(deleted: int, total: int):
+        if args.verbose:
+            print(f"\racct cleanup: {deleted}/{total}", end='', file=sys.stderr, flush=True)
+    
+    db.last_error = ''
+    try:
+        deleted = db.cleanup_accounting(
+            batch_size=args.batch_size or config.acct_batch_size,
+            delay=args.delay if args.delay is not None else config.acct_batch_delay,
+            archive=args.archive or config.acct_cleanup_archive,
+            allowed=lambda: in_window(window),
+            progress=show
+        )
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    
+    if args.verbose:
+        print(file=sys.stderr)
+    print(f"deleted\t{deleted}")
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    return EXIT_OK
+
+def cmd_acct_close_stale(db: DatabaseManager, args) -> int:
+    config = db.config
+    factor = args.factor or config.acct_stale_factor
+    interval = args.interval or config.acct_stale_interval
+    
+    db.last_error = ''
+    by_nas = db.stale_sessions(factor, interval, nas=args.nas)
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    
+    # Разбивка по NAS: адрес, количество, самое старое обновление
+    for nas, count, oldest in by_nas:
+        print(f"{nas or ''}\t{count}\t{oldest.isoformat(sep=' ') if oldest else ''}")
+    print(f"stale\t{sum(count for _, count, _ in by_nas)}")
+    if args.dry_run or not by_nas:
+        return EXIT_OK
+    
+    def show(closed: int, total: int):
+        if args.verbose:
+            print(f"\racct close-stale: {closed}/{total}", end='', file=sys.stderr, flush=True)
+    
+    try:
+        closed = db.close_stale_sessions(
+            factor, interval, nas=args.nas,
+            batch_size=args.batch_size or config.acct_batch_size,
+            delay=args.delay if args.delay is not None else config.acct_batch_delay,
+            progress=show
+        )
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    
+    if args.verbose:
+        print(file=sys.stderr)
+    print(f"closed\t{closed}")
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    return EXIT_OK
+
+def cmd_acct_load_detail(db: DatabaseManager, args) -> int:
+    failed = False
+    for path in args.files:
+        def show(position: int, size: int):
+            if args.verbose:
+                print(f"\racct load-detail {path}: {position * 100 // max(size, 1)}%",
+                      end='', file=sys.stderr, flush=True)
+        
+        db.last_error = ''
+        try:
+            records, sessions, skipped = db.load_detail(path, batch_size=args.batch_size,
+                                                        restart=args.restart, progress=show)
+        except KeyboardInterrupt:
+            return EXIT_INTERRUPTED
+        
+        if args.verbose:
+            print(file=sys.stderr)
+        # файл, записей, сессий, пропущено записей
+        print(f"{path}\t{records}\t{sessions}\t{skipped}")
+        if db.last_error:
+            error(f"{path}: {db.last_error}")
+            failed = True
+    return EXIT_FAILED if failed else EXIT_OK
+
+def cmd_acct_rollup(db: DatabaseManager, args) -> int:
+    def show(high_water: int, last_id: int):
+        if args.verbose:
+            print(f"\racct rollup: {high_water}/{last_id}", end='', file=sys.stderr, flush=True)
+    
+    db.last_error = ''
+    try:
+        sessions = db.update_rollups(span=args.span, progress=show)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    
+    if args.verbose:
+        print(file=sys.stderr)
+    print(f"sessions\t{sessions}")
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    high_water, last_id, pending = db.rollup_status()
+    print(f"high_water\t{high_water}\t{last_id}")
+    print(f"pending\t{pending}")
+    return EXIT_OK
+
+def cmd_acct_top(db: DatabaseManager, args) -> int:
+    if args.month:
+        try:
+            start = datetime.strptime(args.month, '%Y-%m').date()
+        except ValueError:
+            error(f"ожидается месяц ГГГГ-ММ: {args.month}")
+            return EXIT_FAILED
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        monthly = args.by == 'username'
+    else:
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=args.days)
+        monthly = False
+    
+    db.last_error = ''
+    rows = db.top_talkers(start, end, by=args.by, limit=args.limit, monthly=monthly)
+    if db.last_error:
+        error(db.last_error)
+        return EXIT_FAILED
+    
+    # ключ, сессий, время, входящий, исходящий (байт)
+    for key, sessions, session_time, octets_in, octets_out in rows:
+        print(f"{key}\t{sessions}\t{format_duration(session_time)}\t{octets_in}\t{octets_out}")
+    return EXIT_OK
+
+def build_parser() -> argparse.ArgumentParser:
+    """Описание аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description="RADIUS User Manager - консольный режим"
+    )
+    parser.add_argument('--config', default='radius_config_mssql.ini',
+                        help="файл конфигурации (по умолчанию radius_config_mssql.ini)")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="выводить журнал и прогресс в stderr")
+    
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    # users
+    users = commands.add_parser('users', help="пользователи").add_subparsers(dest='action', required=True)
+    
+    p = users.add_parser('list', help="список пользователей")
+    p.add_argument('--format', choices=('tsv', 'csv', 'json'), default='tsv')
+    p.add_argument('--group')
+    p.add_argument('--status', choices=('active', 'blocked'))
+    p.set_defaults(handler=cmd_users_list)
+    
+    p = users.add_parser('add', help="добавить пользователя (пароль из --password или stdin)")
+    p.add_argument('username')
+    p.add_argument('--password')
+    p.add_argument('--group', default='users')
+    p.add_argument('--expiration')
+    p.add_argument('--simultaneous-use', type=int, default=1)
+    p.add_argument('--session-timeout', type=int, default=3600)
+    p.add_argument('--idle-timeout', type=int, default=0)
+    p.add_argument('--attr', action='append', help="дополнительный reply атрибут Атрибут=Значение")
+    p.set_defaults(handler=cmd_users_add)
+    
+    p = users.add_parser('passwd', help="изменить пароль (из --password или stdin)")
+    p.add_argument('username')
+    p.add_argument('--password')
+    p.set_defaults(handler=cmd_users_passwd)
+    
+    for action in ('delete', 'block', 'unblock'):
+        p = users.add_parser(action, help=f"{action}: имена из аргументов или stdin ('-')")
+        p.add_argument('usernames', nargs='*')
+        p.add_argument('--chunk-size', type=int, default=100)
+        p.add_argument('--writers', type=int, default=None,
+                       help="параллельных подключений (по умолчанию bulk_writers из конфигурации)")
+        p.set_defaults(handler=cmd_users_bulk)
+    
+    p = users.add_parser('import', help="импорт CSV (Username,Password[,Group[,Expiration]])")
+    p.add_argument('file', nargs='?', default='-')
+    p.add_argument('--group', default='users', help="группа по умолчанию")
+    p.add_argument('--chunk-size', type=int, default=None,
+                   help="фиксированный размер порции (по умолчанию подбирается автоматически)")
+    p.add_argument('--writers', type=int, default=None,
+                   help="параллельных подключений (по умолчанию bulk_writers из конфигурации)")
+    p.add_argument('--skip-invalid', action='store_true', help="импортировать корректные строки")
+    p.set_defaults(handler=cmd_users_import)
+    
+    p = users.add_parser('export', help="экспорт в CSV")
+    p.add_argument('file', nargs='?', default='-')
+    p.set_defaults(handler=cmd_users_export)
+    
+    # groups
+    groups = commands.add_parser('groups', help="группы").add_subparsers(dest='action', required=True)
+    
+    p = groups.add_parser('list', help="список групп")
+    p.add_argument('--format', choices=('tsv', 'csv', 'json'), default='tsv')
+    p.set_defaults(handler=cmd_groups_list)
+    
+    p = groups.add_parser('add', help="добавить группу")
+    p.add_argument('name')
+    p.add_argument('--priority', type=int, default=10)
+    p.set_defaults(handler=cmd_groups_add)
+    
+    p = groups.add_parser('delete', help="удалить группу")
+    p.add_argument('name')
+    p.set_defaults(handler=cmd_groups_delete)
+    
+    # attrs
+    attrs = commands.add_parser('attrs', help="атрибуты").add_subparsers(dest='action', required=True)
+    
+    p = attrs.add_parser('list', help="атрибуты пользователя или группы")
+    p.add_argument('owner', choices=('user', 'group'))
+    p.add_argument('name')
+    p.add_argument('--format', choices=('tsv', 'csv', 'json'), default='tsv')
+    p.set_defaults(handler=cmd_attrs_list)
+    
+    for action in ('add', 'delete'):
+        p = attrs.add_parser(action, help=f"{action} атрибут")
+        p.add_argument('owner', choices=('user', 'group'))
+        p.add_argument('name')
+        p.add_argument('attribute')
+        p.add_argument('op')
+        p.add_argument('value')
+        p.add_argument('--type', choices=('check', 'reply'), default='check')
+        p.set_defaults(handler=cmd_attrs_change)
+    
+    # acct
+    acct = commands.add_parser('acct', help="учет сессий (radacct)").add_subparsers(dest='action', required=True)
+    
+    p = acct.add_parser('archive', help="перенос закрытых сессий старше --days в архив")
+    p.add_argument('--days', type=int, help="срок хранения (по умолчанию acct_retention_days)")
+    p.add_argument('--mode', choices=('table', 'csv'), help="radacct_archive или CSV по месяцам")
+    p.add_argument('--dir', help="каталог CSV-архива")
+    p.add_argument('--batch-size', type=int)
+    p.add_argument('--delay', type=float, help="пауза между порциями, секунд")
+    p.set_defaults(handler=cmd_acct_archive)
+    
+    p = acct.add_parser('cleanup', help="очистка сессий удаленных пользователей из очереди")
+    p.add_argument('--ignore-window', action='store_true', help="не учитывать окно обслуживания")
+    p.add_argument('--archive', action='store_true', help="переносить сессии в radacct_archive")
+    p.add_argument('--batch-size', type=int)
+    p.add_argument('--delay', type=float, help="пауза между порциями, секунд")
+    p.set_defaults(handler=cmd_acct_cleanup)
+    
+    p = acct.add_parser('close-stale', help="закрытие зависших сессий (нет Interim-Update)")
+    p.add_argument('--dry-run', action='store_true', help="только подсчет по NAS, без изменений")
+    p.add_argument('--factor', type=int, help="сколько интервалов без обновления (по умолчанию acct_stale_factor)")
+    p.add_argument('--interval', type=int, help="интервал, если NAS не передал acctinterval, секунд")
+    p.add_argument('--nas', help="только сессии этого NAS (nasipaddress)")
+    p.add_argument('--batch-size', type=int)
+    p.add_argument('--delay', type=float, help="пауза между порциями, секунд")
+    p.set_defaults(handler=cmd_acct_close_stale)
+    
+    p = acct.add_parser('load-detail', help="загрузка detail-файлов FreeRADIUS в radacct")
+    p.add_argument('files', nargs='+')
+    p.add_argument('--batch-size', type=int, default=1000, help="записей файла за одну транзакцию")
+    p.add_argument('--restart', action='store_true', help="загружать с начала, без контрольной точки")
+    p.set_defaults(handler=cmd_acct_load_detail)
+    
+    p = acct.add_parser('rollup', help="добавление закрытых сессий в таблицы агрегатов")
+    p.add_argument('--span', type=int, default=50000, help="radacctid за одну транзакцию")
+    p.set_defaults(handler=cmd_acct_rollup)
+    
+    p = acct.add_parser('top', help="топ по трафику из агрегатов")
+    p.add_argument('--by', choices=('username', 'groupname', 'nasipaddress'), default='username')
+    p.add_argument('--days', type=int, default=30, help="за последние N дней")
+    p.add_argument('--month', help="за месяц ГГГГ-ММ (вместо --days)")
+    p.add_argument('--limit', type=int, default=20)
+    p.set_defaults(handler=cmd_acct_top)
+    
+    # quota
+    quota = commands.add_parser('quota', help="квоты времени и трафика (sqlcounter)").add_subparsers(
+        dest='action', required=True)
+    
+    p = quota.add_parser('set', help="лимит квоты пользователям или группам (имена из аргументов или stdin)")
+    p.add_argument('owner', choices=('user', 'group'))
+    p.add_argument('names', nargs='*')
+    p.add_argument('--limit', required=True, help="check-атрибут квоты, например Max-Monthly-Traffic")
+    p.add_argument('--value', type=float, help="лимит в часах (время) или ГБ (трафик)")
+    p.add_argument('--clear', action='store_true', help="снять лимит")
+    p.add_argument('--chunk-size', type=int, default=500)
+    p.set_defaults(handler=cmd_quota_set)
+    
+    p = quota.add_parser('show', help="счетчики пользователя за текущие сутки и месяц")
+    p.add_argument('username')
+    p.add_argument('--format', choices=('tsv', 'csv', 'json'), default='tsv')
+    p.set_defaults(handler=cmd_quota_show)
+    
+    p = quota.add_parser('update', help="обновление счетчиков по новым данным radacct")
+    p.set_defaults(handler=cmd_quota_update)
+    
+    p = quota.add_parser('sqlcounter', help="конфигурация модуля sqlcounter для FreeRADIUS")
+    p.add_argument('--sql-instance', default='sql')
+    p.set_defaults(handler=cmd_quota_sqlcounter)
+    
+    # tables
+    p = commands.add_parser('tables', help="таблицы RADIUS")
+    p.add_argument('action', choices=('check', 'create', 'migrate', 'procedures', 'indexes'))
+    p.set_defaults(handler=cmd_tables)
+    
+    return parser
+
+def main(argv: List[str] = None) -> int:
+    """Точка входа консольного режима"""
+    args = build_parser().parse_args(argv)
+    
+    config_manager = ConfigManager(args.config)
+    app_config = config_manager.get_application_config()
+    
+    logger = Logger(console=sys.stderr if args.verbose else None)
+    if app_config.log_file:
+        logger.enable_file_log(
+            app_config.log_path(),
+            max_bytes=app_config.log_max_bytes,
+            backup_count=app_config.log_backup_count,
+            rotate_when=app_config.log_rotate_when,
+            json_lines=app_config.log_json
+        )
+    
+    db = DatabaseManager(logger=logger)
+    try:
+        if not db.connect(config_manager.get_database_config()):
+            error("не удалось подключиться к базе данных")
+            return EXIT_FAILED
+        
+        return args.handler(db, args)
+    
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # Вывод обрезан (например, '| head') - это не ошибка
+        return EXIT_OK
+    finally:
+        db.close()
+        logger.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
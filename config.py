@@ -20,10 +20,44 @@ class DatabaseConfig:
     trusted_connection: bool = False
     encrypt: bool = False
     autoconnect: bool = True
+    ping_interval: int = 30
+    reconnect_max_delay: int = 60
+    retry_attempts: int = 5
+    retry_budget: float = 30.0
+    read_replica: bool = False
+    read_server: str = ''
+    read_port: str = ''
+    replica_max_lag: int = 30
+    read_isolation: str = 'auto'
+    lock_wait_stats: bool = True
+    write_rate_limit: float = 0.0        # строк в секунду (0 - без ограничения)
+    write_max_concurrent: int = 0
+    write_adaptive: bool = False
+    write_latency_target_ms: int = 200   # на транзакцию до 100 строк (крупнее - пропорционально)
+    bulk_writers: int = 1
+    acct_retention_days: int = 365
+    acct_archive_mode: str = 'table'
+    acct_archive_dir: str = 'radacct_archive'
+    acct_batch_size: int = 1000
+    acct_batch_delay: float = 0.5
+    acct_cleanup_window: str = ''
+    acct_cleanup_archive: bool = False
+    acct_stale_factor: int = 3
+    acct_stale_interval: int = 600
+    acct_stale_close: bool = False
     
-    def build_connection_string(self) -> str:
-        """Построение строки подключения для MSSQL"""
-        conn_str = f"DRIVER={{{self.driver}}};SERVER={self.server},{self.port};DATABASE={self.database};"
+    def build_connection_string(self, read_only: bool = False) -> str:
+        """Построение строки подключения для MSSQL
+        
+        read_only - подключение к реплике для чтения (ApplicationIntent=ReadOnly)
+        через read_server/read_port или, если они не заданы, через основной адрес
+        (листенер группы доступности).
+        """
+        server, port = self.server, self.port
+        if read_only:
+            server = self.read_server or server
+            port = self.read_port or port
+        conn_str = f"DRIVER={{{self.driver}}};SERVER={server},{port};DATABASE={self.database};"
         
         if self.trusted_connection:
             conn_str += "Trusted_Connection=yes;"
@@ -35,8 +69,19 @@ class DatabaseConfig:
         else:
             conn_str += "Encrypt=no;"
         
+        if read_only:
+            conn_str += "ApplicationIntent=ReadOnly;"
+        
         return conn_str
 
+def log_directory() -> str:
+    """Каталог логов текущего пользователя (%LOCALAPPDATA% в Windows, XDG_STATE_HOME в остальных)"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(os.path.join('~', 'AppData', 'Local'))
+    else:
+        base = os.environ.get('XDG_STATE_HOME') or os.path.expanduser(os.path.join('~', '.local', 'state'))
+    return os.path.join(base, 'radius_manager')
+
 @dataclass
 class ApplicationConfig:
     """Конфигурация приложения"""
@@ -44,7 +89,18 @@ class ApplicationConfig:
     window_height: int = 650
     config_file: str = 'radius_config_mssql.ini'
     log_file: str = 'radius_manager.log'
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_rotate_when: str = ''
+    log_json: bool = False
     theme: str = 'clam'
+    
+    def log_path(self) -> str:
+        """Путь файла лога: относительный log_file - в каталоге логов пользователя, а не в текущем"""
+        if not self.log_file:
+            return ''
+        path = os.path.expanduser(self.log_file)
+        return path if os.path.isabs(path) else os.path.join(log_directory(), path)
 
 class ConfigManager:
     """Менеджер конфигурации"""
@@ -126,6 +182,31 @@ class ConfigManager:
         self.db_config.trusted_connection = section.getboolean('trusted_connection', False)
         self.db_config.encrypt = section.getboolean('encrypt', False)
         self.db_config.autoconnect = section.getboolean('autoconnect', True)
+        self.db_config.ping_interval = int(section.get('ping_interval', '30'))
+        self.db_config.reconnect_max_delay = int(section.get('reconnect_max_delay', '60'))
+        self.db_config.retry_attempts = int(section.get('retry_attempts', '5'))
+        self.db_config.retry_budget = float(section.get('retry_budget', '30'))
+        self.db_config.read_replica = section.getboolean('read_replica', False)
+        self.db_config.read_server = section.get('read_server', '')
+        self.db_config.read_port = section.get('read_port', '')
+        self.db_config.replica_max_lag = int(section.get('replica_max_lag', '30'))
+        self.db_config.read_isolation = section.get('read_isolation', 'auto')
+        self.db_config.lock_wait_stats = section.getboolean('lock_wait_stats', True)
+        self.db_config.write_rate_limit = float(section.get('write_rate_limit', '0'))
+        self.db_config.write_max_concurrent = int(section.get('write_max_concurrent', '0'))
+        self.db_config.write_adaptive = section.getboolean('write_adaptive', False)
+        self.db_config.write_latency_target_ms = int(section.get('write_latency_target_ms', '200'))
+        self.db_config.bulk_writers = int(section.get('bulk_writers', '1'))
+        self.db_config.acct_retention_days = int(section.get('acct_retention_days', '365'))
+        self.db_config.acct_archive_mode = section.get('acct_archive_mode', 'table')
+        self.db_config.acct_archive_dir = section.get('acct_archive_dir', 'radacct_archive')
+        self.db_config.acct_batch_size = int(section.get('acct_batch_size', '1000'))
+        self.db_config.acct_batch_delay = float(section.get('acct_batch_delay', '0.5'))
+        self.db_config.acct_cleanup_window = section.get('acct_cleanup_window', '')
+        self.db_config.acct_cleanup_archive = section.getboolean('acct_cleanup_archive', False)
+        self.db_config.acct_stale_factor = int(section.get('acct_stale_factor', '3'))
+        self.db_config.acct_stale_interval = int(section.get('acct_stale_interval', '600'))
+        self.db_config.acct_stale_close = section.getboolean('acct_stale_close', False)
     
     def _load_application_config(self):
         """Загрузка конфигурации приложения из ConfigParser"""
@@ -138,6 +219,10 @@ class ConfigManager:
         self.app_config.window_height = int(section.get('window_height', '650'))
         self.app_config.config_file = section.get('config_file', 'radius_config_mssql.ini')
         self.app_config.log_file = section.get('log_file', 'radius_manager.log')
+        self.app_config.log_max_bytes = int(section.get('log_max_bytes', str(10 * 1024 * 1024)))
+        self.app_config.log_backup_count = int(section.get('log_backup_count', '5'))
+        self.app_config.log_rotate_when = section.get('log_rotate_when', '')
+        self.app_config.log_json = section.getboolean('log_json', False)
         self.app_config.theme = section.get('theme', 'clam')
     
     def _save_database_config(self):
@@ -154,6 +239,31 @@ class ConfigManager:
         self.config['DATABASE']['trusted_connection'] = str(self.db_config.trusted_connection)
         self.config['DATABASE']['encrypt'] = str(self.db_config.encrypt)
         self.config['DATABASE']['autoconnect'] = str(self.db_config.autoconnect)
+        self.config['DATABASE']['ping_interval'] = str(self.db_config.ping_interval)
+        self.config['DATABASE']['reconnect_max_delay'] = str(self.db_config.reconnect_max_delay)
+        self.config['DATABASE']['retry_attempts'] = str(self.db_config.retry_attempts)
+        self.config['DATABASE']['retry_budget'] = str(self.db_config.retry_budget)
+        self.config['DATABASE']['read_replica'] = str(self.db_config.read_replica)
+        self.config['DATABASE']['read_server'] = self.db_config.read_server
+        self.config['DATABASE']['read_port'] = self.db_config.read_port
+        self.config['DATABASE']['replica_max_lag'] = str(self.db_config.replica_max_lag)
+        self.config['DATABASE']['read_isolation'] = self.db_config.read_isolation
+        self.config['DATABASE']['lock_wait_stats'] = str(self.db_config.lock_wait_stats)
+        self.config['DATABASE']['write_rate_limit'] = str(self.db_config.write_rate_limit)
+        self.config['DATABASE']['write_max_concurrent'] = str(self.db_config.write_max_concurrent)
+        self.config['DATABASE']['write_adaptive'] = str(self.db_config.write_adaptive)
+        self.config['DATABASE']['write_latency_target_ms'] = str(self.db_config.write_latency_target_ms)
+        self.config['DATABASE']['bulk_writers'] = str(self.db_config.bulk_writers)
+        self.config['DATABASE']['acct_retention_days'] = str(self.db_config.acct_retention_days)
+        self.config['DATABASE']['acct_archive_mode'] = self.db_config.acct_archive_mode
+        self.config['DATABASE']['acct_archive_dir'] = self.db_config.acct_archive_dir
+        self.config['DATABASE']['acct_batch_size'] = str(self.db_config.acct_batch_size)
+        self.config['DATABASE']['acct_batch_delay'] = str(self.db_config.acct_batch_delay)
+        self.config['DATABASE']['acct_cleanup_window'] = self.db_config.acct_cleanup_window
+        self.config['DATABASE']['acct_cleanup_archive'] = str(self.db_config.acct_cleanup_archive)
+        self.config['DATABASE']['acct_stale_factor'] = str(self.db_config.acct_stale_factor)
+        self.config['DATABASE']['acct_stale_interval'] = str(self.db_config.acct_stale_interval)
+        self.config['DATABASE']['acct_stale_close'] = str(self.db_config.acct_stale_close)
     
     def _save_application_config(self):
         """Сохранение конфигурации приложения в ConfigParser"""
@@ -164,6 +274,10 @@ class ConfigManager:
         self.config['APPLICATION']['window_height'] = str(self.app_config.window_height)
         self.config['APPLICATION']['config_file'] = self.app_config.config_file
         self.config['APPLICATION']['log_file'] = self.app_config.log_file
+        self.config['APPLICATION']['log_max_bytes'] = str(self.app_config.log_max_bytes)
+        self.config['APPLICATION']['log_backup_count'] = str(self.app_config.log_backup_count)
+        self.config['APPLICATION']['log_rotate_when'] = self.app_config.log_rotate_when
+        self.config['APPLICATION']['log_json'] = str(self.app_config.log_json)
         self.config['APPLICATION']['theme'] = self.app_config.theme
     
     def restore_defaults(self):
@@ -3,11 +3,30 @@
 Модуль для работы с базой данных MSSQL RADIUS
 """
 
+import csv
+import os
 import pyodbc
-from datetime import datetime
-from typing import List, Tuple, Dict, Any, Optional
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Tuple, Dict, Any, Optional, TextIO, Iterable, Callable, Sequence
 from dataclasses import dataclass
+from archive import MonthlyCsvArchive
 from config import DatabaseConfig
+from detail import COLUMN_NAMES, DetailFile, accounting_event, merge_session, stage_ddl
+from models import UserStore
+from procedures import (ATTRIBUTE_TYPE, ATTRIBUTE_TYPE_DDL, PROCEDURES, PROCEDURES_VERSION,
+                        attribute_rows, procedure_version)
+from quota import COUNTER_TABLE, DAILY, MONTHLY, PERIOD_START
+from schema import (ACCT_CLEANUP_VERSION, ACCT_UPDATES_VERSION, DETAIL_VERSION, MIGRATIONS,
+                    QUOTA_VERSION, RADIUS_TABLES, ROLLUP_PENDING, ROLLUP_PENDING_VERSION, ROLLUP_STATE, SCHEMA_VERSION, USAGE_ROLLUPS, USAGE_VERSION,
+                    VERSION_TABLE, VERSION_TABLE_DDL, Backfill, DropIndex, IndexSpec, Rollup,
+                    column_sql_type, schema_indexes)
+from throttle import WriteThrottle
 
 @dataclass
 class User:
@@ -36,30 +55,334 @@ class Attribute:
     op: str
     value: str
 
+CSV_HEADER = ['Username', 'Password', 'Group', 'Expiration']
+
+def read_users_csv(lines: Iterable[str], default_group: str = 'users') -> Tuple[List[User], List[str]]:
+    """Разбор CSV (Username,Password[,Group[,Expiration]]) в список пользователей и ошибок"""
+    reader = csv.reader(lines)
+    users = []
+    errors = []
+    
+    # Пропускаем заголовок, если есть
+    try:
+        header = next(reader)
+    except StopIteration:
+        header = []
+    
+    for i, row in enumerate(reader, 2 if header else 1):
+        if len(row) < 2:
+            errors.append(f"Строка {i}: недостаточно данных")
+            continue
+        
+        username = row[0].strip()
+        password = row[1].strip()
+        group = row[2].strip() if len(row) > 2 else default_group
+        
+        if not username or not password:
+            errors.append(f"Строка {i}: отсутствует имя пользователя или пароль")
+            continue
+        
+        user = User(
+            username=username,
+            password=password,
+            group=group
+        )
+        
+        # Дополнительные поля
+        if len(row) > 3 and row[3].strip():
+            user.expiration = row[3].strip()
+        
+        users.append(user)
+    
+    return users, errors
+
+# Классификация ошибок для повтора транзакций
+ERROR_FATAL = 'fatal'
+ERROR_RETRY = 'retry'
+ERROR_RECONNECT = 'reconnect'
+
+# Временные ошибки SQL Server: транзакцию можно повторить
+RETRYABLE_NATIVE_ERRORS = {
+    -2,      # тайм-аут запроса
+    1205,    # транзакция выбрана жертвой взаимоблокировки
+    1222,    # превышено время ожидания блокировки
+    40501,   # сервер перегружен
+    40613,   # база данных временно недоступна
+    49918, 49919, 49920,  # слишком много операций
+}
+RETRYABLE_SQLSTATES = {'40001', 'HYT00', 'HYT01'}
+
+# Обрыв соединения: повтор после переподключения
+CONNECTION_NATIVE_ERRORS = {64, 233, 10053, 10054, 10060}
+CONNECTION_SQLSTATES = {'08S01', '08001', '08003', '08007'}
+
+# Нарушение уникальности: повтор не поможет, даже если в сообщении есть другие коды
+FATAL_NATIVE_ERRORS = {2601, 2627}
+
+# Записи диагностики pyodbc: "[SQLSTATE] [драйвер]текст (код) (SQLФункция); [SQLSTATE] ..."
+DIAG_RECORD_SEPARATOR = re.compile(r'; (?=\[[0-9A-Z]{5}\])')
+NATIVE_ERROR_FIELD = re.compile(r'\((-?\d+)\)\s*(?:\(SQL\w+\))?\s*$')
+
+def error_codes(error: Exception) -> Tuple[str, List[int]]:
+    """SQLSTATE и коды ошибок SQL Server из исключения pyodbc
+    
+    Код берется только из завершающего поля каждой записи диагностики,
+    числа в скобках внутри текста (данные пользователя) не учитываются.
+    """
+    sqlstate = str(error.args[0]) if error.args else ''
+    message = str(error.args[1]) if len(error.args) > 1 else str(error)
+    codes = []
+    for record in DIAG_RECORD_SEPARATOR.split(message):
+        match = NATIVE_ERROR_FIELD.search(record)
+        if match:
+            codes.append(int(match.group(1)))
+    return sqlstate, codes
+
+def classify_error(error: Exception) -> str:
+    """Классификация ошибки: ERROR_RETRY, ERROR_RECONNECT или ERROR_FATAL"""
+    sqlstate, codes = error_codes(error)
+    if FATAL_NATIVE_ERRORS.intersection(codes):
+        return ERROR_FATAL
+    if sqlstate in CONNECTION_SQLSTATES or CONNECTION_NATIVE_ERRORS.intersection(codes):
+        return ERROR_RECONNECT
+    if sqlstate in RETRYABLE_SQLSTATES or RETRYABLE_NATIVE_ERRORS.intersection(codes):
+        return ERROR_RETRY
+    return ERROR_FATAL
+
+def error_label(error: Exception) -> str:
+    """Краткое обозначение ошибки для счетчиков: код SQL Server или SQLSTATE"""
+    sqlstate, codes = error_codes(error)
+    return str(codes[0]) if codes else (sqlstate or 'unknown')
+
+@dataclass
+class RetryPolicy:
+    """Политика повтора транзакций при временных ошибках"""
+    max_attempts: int = 5
+    base_delay: float = 0.1
+    max_delay: float = 5.0
+    budget: float = 30.0
+    
+    def delay(self, attempt: int) -> float:
+        """Задержка перед повтором: экспоненциальная со случайным разбросом"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class DatabaseMetrics:
+    """Счетчики операций с БД (потокобезопасно)
+    
+    Счетчики фоновых подключений (spawn) передаются и в родительский объект.
+    """
+    
+    def __init__(self, parent: 'DatabaseMetrics' = None):
+        self.parent = parent
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+        self.fatal = 0
+        self.reconnects = 0
+        self.replica_fallbacks = 0
+        self.lock_waits = 0
+        self.lock_wait_ms = 0
+        self.errors = Counter()
+        self._lock = threading.Lock()
+    
+    def record(self, counter: str, error: Exception = None, amount: int = 1):
+        """Увеличение счетчика (и счетчика кода ошибки)"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+            if error is not None:
+                self.errors[error_label(error)] += 1
+        if self.parent:
+            self.parent.record(counter, error, amount)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущие значения счетчиков"""
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'recovered': self.recovered,
+                'exhausted': self.exhausted,
+                'fatal': self.fatal,
+                'reconnects': self.reconnects,
+                'replica_fallbacks': self.replica_fallbacks,
+                'lock_waits': self.lock_waits,
+                'lock_wait_ms': self.lock_wait_ms,
+                'errors': dict(self.errors),
+            }
+    
+    def summary(self) -> str:
+        """Краткая строка для лога и отчетов"""
+        data = self.snapshot()
+        text = (f"повторов {data['retries']}, восстановлено {data['recovered']}, "
+                f"исчерпано {data['exhausted']}, переподключений {data['reconnects']}")
+        if data['errors']:
+            text += " (коды: " + ", ".join(f"{code}: {count}" for code, count in sorted(data['errors'].items())) + ")"
+        return text
+
+class ReplicaCursor:
+    """Курсор чтения с реплики с однократным повтором на основном сервере
+    
+    При ошибке pyodbc на реплике failover(error) выдает курсор основного
+    сервера, и последний запрос выполняется на нем заново. Повтор возможен,
+    пока из результата ничего не прочитано: если часть строк уже отдана
+    вызывающему, ошибка пробрасывается.
+    """
+    
+    def __init__(self, cursor, failover: Callable[[Exception], Any]):
+        self._cursor = cursor
+        self._failover = failover
+        self._query = None
+        self._fetched = False
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+    
+    def execute(self, query: str, *params):
+        self._query = (query, params)
+        self._fetched = False
+        try:
+            self._cursor.execute(query, *params)
+        except pyodbc.Error as e:
+            if not self._switch(e):
+                raise
+            self._cursor.execute(query, *params)
+        return self
+    
+    def fetchone(self):
+        return self._fetch('fetchone')
+    
+    def fetchall(self):
+        return self._fetch('fetchall')
+    
+    def fetchmany(self, size: int = None):
+        return self._fetch('fetchmany', *(() if size is None else (size,)))
+    
+    def close(self):
+        try:
+            self._cursor.close()
+        except pyodbc.Error:
+            pass
+    
+    def _fetch(self, method: str, *args):
+        try:
+            rows = getattr(self._cursor, method)(*args)
+        except pyodbc.Error as e:
+            if self._fetched or self._query is None or not self._switch(e):
+                raise
+            self._cursor.execute(self._query[0], *self._query[1])
+            rows = getattr(self._cursor, method)(*args)
+        self._fetched = True
+        return rows
+    
+    def _switch(self, error: Exception) -> bool:
+        """Переход на основной сервер (один раз)"""
+        if self._failover is None:
+            return False
+        failover, self._failover = self._failover, None
+        try:
+            self._cursor.close()
+        except pyodbc.Error:
+            pass
+        self._cursor = failover(error)
+        return True
+
 class DatabaseManager:
     """Менеджер базы данных MSSQL RADIUS"""
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, metrics: DatabaseMetrics = None, throttle: WriteThrottle = None):
         self.conn = None
         self.connection_status = False
         self.logger = logger
         self.config = None
+        self.last_error = ''
+        self.retry_policy = RetryPolicy()
+        self.metrics = metrics or DatabaseMetrics()
+        self.throttle = throttle or WriteThrottle(logger=logger)
+        
+        # Уведомление о потере основного соединения (ConnectionSupervisor.connection_lost)
+        self.on_connection_lost: Optional[Callable[[str], None]] = None
+    
+        # Реплика для чтения (ApplicationIntent=ReadOnly), открывается по требованию
+        self.read_conn = None
+        self._replica_ok: Optional[bool] = None
+        self._replica_checked_at = 0.0
+    
+        # Поддержка SNAPSHOT по соединениям и доступность статистики ожиданий
+        self._snapshot_support: Dict[int, bool] = {}
+        self._wait_stats_available = True
+        
+        # Вложенность транзакций записи (_transaction) на основном соединении:
+        # только в них есть незафиксированные изменения
+        self._write_depth = 0
+    
+        # Установленные хранимые процедуры текущей версии (общий набор с spawn)
+        self.procedures = set()
+    
+        # Версия схемы по таблице миграций (0 - таблицы версий нет)
+        self.schema_version = 0
+        self._online_ddl: Optional[bool] = None
     
     def connect(self, config: DatabaseConfig) -> bool:
         """Подключение к базе данных"""
+        if self.logger:
+            self.logger.log(f"Подключаемся к: {config.server}:{config.port}")
+            self.logger.log(f"База данных: {config.database}")
+        
         try:
-            if self.conn:
-                self.disconnect()
-            
-            self.config = config
-            conn_str = config.build_connection_string()
-            
+            conn = self.open_connection(config)
+        except pyodbc.Error as e:
+            self.connection_status = False
+            error_msg = str(e).replace('\n', ' ')
+            self.last_error = error_msg
             if self.logger:
-                self.logger.log(f"Подключаемся к: {config.server}:{config.port}")
-                self.logger.log(f"База данных: {config.database}")
-            
-            self.conn = pyodbc.connect(conn_str, timeout=10)
-            
+                self.logger.log(f"Ошибка подключения: {error_msg}")
+            return False
+        return self.attach(config, conn)
+    
+    @staticmethod
+    def open_connection(config: DatabaseConfig):
+        """Новое соединение без изменения состояния менеджера
+        
+        Может выполняться в любом потоке: соединение еще ни с кем не разделено
+        и передается владельцу (attach) целиком. pyodbc не допускает
+        одновременного использования одного соединения из разных потоков.
+        """
+        return pyodbc.connect(config.build_connection_string(), timeout=10)
+    
+    @staticmethod
+    def ping_connection(conn) -> Optional[str]:
+        """Проверка соединения запросом SELECT 1 (None - соединение живо, иначе текст ошибки)"""
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return None
+        except pyodbc.Error as e:
+            return str(e).replace('\n', ' ')
+    
+    def attach(self, config: DatabaseConfig, conn) -> bool:
+        """Переход на соединение, открытое open_connection (вызывается в потоке-владельце)
+        
+        Прежнее соединение закрывается, состояние менеджера сбрасывается.
+        """
+        if self.conn:
+            self.disconnect()
+        
+        self.config = config
+        self._reset_replica()
+        self._online_ddl = None
+        self._snapshot_support = {}
+        self._wait_stats_available = True
+        self.retry_policy = RetryPolicy(max_attempts=config.retry_attempts, budget=config.retry_budget)
+        self.throttle.configure(
+            rate=config.write_rate_limit,
+            max_concurrent=config.write_max_concurrent,
+            adaptive=config.write_adaptive,
+            latency_target=config.write_latency_target_ms / 1000.0
+        )
+        self.conn = conn
+        
+        try:
             # Тестируем подключение
             cursor = self.conn.cursor()
             cursor.execute("SELECT @@VERSION")
@@ -72,20 +395,38 @@ class DatabaseManager:
                 self.logger.log("Успешное подключение к MSSQL")
                 self.logger.log(f"Версия сервера: {version_info[:100]}...")
             
-            # Проверяем наличие таблиц
-            self.check_radius_tables()
+            # Проверяем схему и наличие хранимых процедур
+            self.detect_schema()
+            self.detect_procedures()
             
             return True
             
         except pyodbc.Error as e:
             self.connection_status = False
             error_msg = str(e).replace('\n', ' ')
+            self.last_error = error_msg
             if self.logger:
                 self.logger.log(f"Ошибка подключения: {error_msg}")
             return False
     
+    def ping(self) -> bool:
+        """Проверка основного соединения легким запросом SELECT 1 (только из потока-владельца)"""
+        if not self.conn or not self.connection_status:
+            return False
+        
+        error = self.ping_connection(self.conn)
+        if error is None:
+            return True
+        self.connection_status = False
+        self.last_error = error
+        if self.logger:
+            self.logger.log(f"Проверка подключения не прошла: {self.last_error}")
+        self._report_connection_lost(error)
+        return False
+    
     def disconnect(self) -> bool:
         """Отключение от базы данных"""
+        self._close_replica()
         if self.conn:
             try:
                 self.conn.close()
@@ -99,6 +440,358 @@ class DatabaseManager:
                 return False
         return True
     
+    def spawn(self, metrics: DatabaseMetrics = None) -> Optional['DatabaseManager']:
+        """Отдельное подключение с той же конфигурацией (для фоновых задач)
+        
+        metrics - общие счетчики нескольких подключений одной задачи;
+        по умолчанию создаются свои, передающие значения в счетчики менеджера.
+        """
+        if not self.config:
+            return None
+        
+        worker = DatabaseManager(logger=self.logger, metrics=metrics or DatabaseMetrics(parent=self.metrics),
+                                 throttle=self.throttle)
+        try:
+            worker.conn = pyodbc.connect(self.config.build_connection_string(), timeout=10)
+            worker.config = self.config
+            worker.retry_policy = self.retry_policy
+            worker.procedures = self.procedures
+            worker.schema_version = self.schema_version
+            worker.connection_status = True
+            return worker
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка подключения фоновой задачи: {str(e)}")
+            return None
+    
+    def close(self):
+        """Закрытие подключения без записи в лог (для фоновых подключений)"""
+        self._close_replica()
+        if self.conn:
+            try:
+                self.conn.close()
+            except pyodbc.Error:
+                pass
+        self.conn = None
+        self.connection_status = False
+    
+    # Маршрутизация чтения на реплику
+    REPLICA_CHECK_INTERVAL = 15.0
+    
+    def _reader(self):
+        """Соединение для административного чтения
+        
+        Если в конфигурации включена реплика, запросы на чтение идут на нее;
+        при недоступности реплики или отставании больше replica_max_lag секунд
+        используется основной сервер. Состояние реплики перепроверяется не чаще
+        раза в REPLICA_CHECK_INTERVAL секунд.
+        """
+        if not (self.config and self.config.read_replica):
+            return self.conn
+        
+        now = time.monotonic()
+        if self._replica_ok is None or now - self._replica_checked_at >= self.REPLICA_CHECK_INTERVAL:
+            self._replica_checked_at = now
+            replica_ok = self._check_replica()
+            if replica_ok != self._replica_ok and self.logger:
+                self.logger.log("Чтение выполняется на реплике" if replica_ok
+                                else "Чтение переключено на основной сервер")
+            self._replica_ok = replica_ok
+        
+        if self._replica_ok:
+            return self.read_conn
+        self.metrics.record('replica_fallbacks')
+        return self.conn
+    
+    def _read_cursor(self):
+        """Курсор для чтения без настройки изоляции (реплика с переходом на основной сервер)"""
+        conn = self._reader()
+        if conn is self.conn:
+            return conn.cursor()
+        return ReplicaCursor(conn.cursor(), lambda error: self._replica_failed(error).cursor())
+    
+    def _replica_failed(self, error: Exception):
+        """Ошибка чтения с реплики: соединение закрывается, чтение - на основном сервере
+        
+        Реплика перепроверяется через REPLICA_CHECK_INTERVAL. Возвращает
+        основное соединение для повтора запроса.
+        """
+        self._close_replica()
+        self._replica_ok = False
+        self._replica_checked_at = time.monotonic()
+        self.metrics.record('replica_fallbacks', error)
+        if self.logger:
+            self.logger.log(f"Ошибка чтения с реплики, повтор на основном сервере: {str(error)}")
+        return self.conn
+    
+    def _check_replica(self) -> bool:
+        """Подключение к реплике и проверка ее отставания"""
+        try:
+            if self.read_conn is None:
+                self.read_conn = pyodbc.connect(
+                    self.config.build_connection_string(read_only=True), timeout=5, autocommit=True
+                )
+            lag = self._replica_lag()
+        except pyodbc.Error as e:
+            self._close_replica()
+            if self.logger and self._replica_ok is not False:
+                self.logger.log(f"Реплика для чтения недоступна: {str(e)}")
+            return False
+        
+        if lag is not None and lag > self.config.replica_max_lag:
+            if self.logger and self._replica_ok is not False:
+                self.logger.log(f"Реплика отстает на {lag:.0f} с (допустимо {self.config.replica_max_lag} с)")
+            return False
+        return True
+    
+    def _replica_lag(self) -> Optional[float]:
+        """Отставание реплики в секундах (None - неизвестно)"""
+        cursor = self.read_conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT secondary_lag_seconds
+                FROM sys.dm_hadr_database_replica_states
+                WHERE database_id = DB_ID() AND is_local = 1
+            """)
+            row = cursor.fetchone()
+        except pyodbc.Error as e:
+            # Нет прав VIEW SERVER STATE или старая версия сервера - отставание неизвестно
+            if error_codes(e)[0] in ('42000', '42S22'):
+                return None
+            raise
+        finally:
+            cursor.close()
+        return float(row[0]) if row and row[0] is not None else None
+    
+    def _close_replica(self):
+        """Закрытие соединения с репликой"""
+        if self.read_conn:
+            try:
+                self.read_conn.close()
+            except pyodbc.Error:
+                pass
+        self.read_conn = None
+    
+    def _reset_replica(self):
+        """Сброс состояния реплики (при смене конфигурации)"""
+        self._close_replica()
+        self._replica_ok = None
+        self._replica_checked_at = 0.0
+    
+    # Уровень изоляции административного чтения
+    ISOLATION_LEVELS = {
+        'snapshot': 'SNAPSHOT',
+        'read_uncommitted': 'READ UNCOMMITTED',
+        'read_committed': 'READ COMMITTED',
+    }
+    
+    def _read_isolation(self, conn, listing: bool) -> Optional[str]:
+        """Уровень изоляции для чтения согласно read_isolation (None - по умолчанию)
+        
+        'auto' - SNAPSHOT, если он включен в базе, иначе READ UNCOMMITTED,
+        но только для списков (listing); выгрузка в этом случае читает
+        с уровнем по умолчанию, чтобы не получить неподтвержденные данные.
+        """
+        mode = self.config.read_isolation if self.config else 'read_committed'
+        if mode == 'auto':
+            if self._snapshot_enabled(conn):
+                return 'SNAPSHOT'
+            return 'READ UNCOMMITTED' if listing else None
+        if mode == 'read_uncommitted' and not listing:
+            return None
+        level = self.ISOLATION_LEVELS.get(mode)
+        return None if level == 'READ COMMITTED' else level
+    
+    def _snapshot_enabled(self, conn) -> bool:
+        """Включена ли в базе изоляция SNAPSHOT (ALLOW_SNAPSHOT_ISOLATION)"""
+        supported = self._snapshot_support.get(id(conn))
+        if supported is None:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT snapshot_isolation_state FROM sys.databases WHERE database_id = DB_ID()")
+                row = cursor.fetchone()
+                supported = bool(row and row[0] == 1)
+            except pyodbc.Error:
+                supported = False
+            finally:
+                cursor.close()
+            self._snapshot_support[id(conn)] = supported
+        return supported
+    
+    def _lock_wait_totals(self, cursor) -> Optional[Tuple[int, int]]:
+        """Ожидания блокировок сессии этого курсора: (количество, мс)
+        
+        sys.dm_exec_session_wait_stats считает только свою сессию, поэтому
+        чужие ожидания на сервере к чтению не примешиваются. При ошибке
+        (старый сервер, нет прав) статистика отключается.
+        """
+        if not (self._wait_stats_available and self.config and self.config.lock_wait_stats):
+            return None
+        try:
+            cursor.execute("""
+                SELECT SUM(waiting_tasks_count), SUM(wait_time_ms)
+                FROM sys.dm_exec_session_wait_stats
+                WHERE session_id = @@SPID AND wait_type LIKE 'LCK[_]M[_]%'
+            """)
+            row = cursor.fetchone()
+            return int(row[0] or 0), int(row[1] or 0)
+        except pyodbc.Error as e:
+            self._wait_stats_available = False
+            if self.logger:
+                self.logger.log(f"Статистика ожиданий блокировок недоступна: {str(e)}")
+            return None
+    
+    def _set_read_isolation(self, conn, cursor, level: Optional[str]) -> Optional[str]:
+        """Установка уровня изоляции для чтения (None - уровень не менялся)
+        
+        Уровень меняется только вне транзакции (SNAPSHOT нельзя включить
+        посреди нее). Соединение без autocommit открывает неявную транзакцию
+        любым запросом, в том числе служебным (проверка SNAPSHOT, версия
+        схемы), поэтому перед сменой уровня она завершается - если это не
+        транзакция записи (_transaction), чьи изменения фиксировать здесь
+        нельзя: тогда чтение идет с текущим уровнем.
+        """
+        if not level:
+            return None
+        if conn is self.conn:
+            if self._write_depth:
+                if self.logger:
+                    self.logger.log(f"Идет транзакция записи, чтение без смены изоляции на {level}")
+                return None
+            conn.commit()
+        cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {level}")
+        return level
+    
+    @contextmanager
+    def _isolated_read(self, operation: str, listing: bool = True):
+        """Курсор для административного чтения с настроенным уровнем изоляции
+        
+        После чтения уровень изоляции сессии возвращается к READ COMMITTED,
+        а прирост ожиданий блокировок сессии, выполнившей запрос, попадает
+        в метрики (lock_waits, lock_wait_ms) и в лог.
+        """
+        conn = self._reader()
+        cursor = conn.cursor()
+        level = self._set_read_isolation(conn, cursor, self._read_isolation(conn, listing))
+        waits_before = self._lock_wait_totals(cursor)
+        
+        if conn is not self.conn:
+            def failover(error):
+                # Реплика отказала: тот же запрос с той же изоляцией на основном сервере,
+                # ожидания считаются по сессии, которая выполнит запрос
+                nonlocal conn, level, waits_before
+                conn = self._replica_failed(error)
+                primary = conn.cursor()
+                level = self._set_read_isolation(conn, primary, self._read_isolation(conn, listing))
+                waits_before = self._lock_wait_totals(primary)
+                return primary
+            
+            cursor = ReplicaCursor(cursor, failover)
+        try:
+            yield cursor
+        finally:
+            if waits_before is not None:
+                waits_after = self._lock_wait_totals(cursor)
+                if waits_after is not None:
+                    waits = waits_after[0] - waits_before[0]
+                    wait_ms = waits_after[1] - waits_before[1]
+                    if waits > 0:
+                        self.metrics.record('lock_waits', amount=waits)
+                        self.metrics.record('lock_wait_ms', amount=wait_ms)
+                        if self.logger:
+                            self.logger.log(f"Ожидания блокировок во время чтения: {waits} "
+                                            f"({wait_ms} мс, изоляция {level or 'READ COMMITTED'})",
+                                            operation=operation)
+            
+            # Транзакция чтения завершается (следующее чтение сможет сменить
+            # уровень), уровень сессии возвращается к READ COMMITTED
+            if conn is not self.conn or not self._write_depth:
+                try:
+                    conn.commit()
+                    if level:
+                        cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+                except pyodbc.Error:
+                    pass
+            cursor.close()
+    
+    def _rollback(self):
+        """Откат транзакции без исключений (соединение может быть разорвано)"""
+        try:
+            self.conn.rollback()
+        except pyodbc.Error:
+            pass
+    
+    def _reconnect(self) -> bool:
+        """Повторное открытие соединения после обрыва"""
+        try:
+            self.close()
+            self.conn = pyodbc.connect(self.config.build_connection_string(), timeout=10)
+            self.connection_status = True
+            self.metrics.record('reconnects')
+            return True
+        except pyodbc.Error as e:
+            self.connection_status = False
+            self.last_error = str(e).replace('\n', ' ')
+            if self.logger:
+                self.logger.log(f"Не удалось переподключиться: {str(e)}")
+            self._report_connection_lost(self.last_error)
+            return False
+    
+    def _report_connection_lost(self, message: str):
+        """Передача потери соединения контролю подключения (если он назначен)"""
+        if self.on_connection_lost:
+            self.on_connection_lost(message)
+    
+    def _transaction(self, operation: str, work: Callable[[Any], Any], rows: int = 1) -> Any:
+        """Выполнение транзакции с повтором при временных ошибках
+        
+        work(cursor) выполняет запросы, фиксация и откат - здесь. Взаимоблокировки,
+        тайм-ауты и обрывы соединения повторяются по retry_policy; фатальные
+        ошибки и ошибки после исчерпания попыток пробрасываются вызывающему.
+        Каждая попытка проходит через ограничитель записи (throttle) с весом
+        rows - числом записываемых строк.
+        """
+        policy = self.retry_policy
+        deadline = time.monotonic() + policy.budget
+        attempt = 0
+        
+        while True:
+            try:
+                with self.throttle.slot(rows):
+                    self._write_depth += 1
+                    try:
+                        cursor = self.conn.cursor()
+                        result = work(cursor)
+                        self.conn.commit()
+                        cursor.close()
+                    finally:
+                        self._write_depth -= 1
+                if attempt:
+                    self.metrics.record('recovered')
+                return result
+            
+            except pyodbc.Error as e:
+                self._rollback()
+                kind = classify_error(e)
+                if kind == ERROR_FATAL:
+                    self.metrics.record('fatal', e)
+                    raise
+                
+                attempt += 1
+                delay = policy.delay(attempt)
+                if attempt >= policy.max_attempts or time.monotonic() + delay > deadline:
+                    self.metrics.record('exhausted', e)
+                    raise
+                
+                self.metrics.record('retries', e)
+                if self.logger:
+                    self.logger.log(f"Временная ошибка {error_label(e)} ({operation}), "
+                                    f"повтор {attempt} через {delay:.2f} с", operation=operation)
+                time.sleep(delay)
+                
+                if kind == ERROR_RECONNECT:
+                    self._reconnect()
+    
     def test_connection(self, config: DatabaseConfig) -> Tuple[bool, str]:
         """Тестирование подключения"""
         try:
@@ -120,161 +813,340 @@ class DatabaseManager:
             error_msg = str(e).replace('\n', ' ')
             return False, error_msg
     
-    def check_radius_tables(self):
-        """Проверка наличия необходимых таблиц RADIUS"""
+    def detect_schema(self) -> int:
+        """Определение версии схемы и отсутствующих таблиц RADIUS
+        
+        Наличие таблиц проверяется одним запросом к sys.tables, версия
+        читается из таблицы миграций, если она есть.
+        """
+        names = RADIUS_TABLES + (VERSION_TABLE,)
         try:
             cursor = self.conn.cursor()
+            cursor.execute(
+                f"SELECT name FROM sys.tables WHERE name IN ({', '.join('?' * len(names))})",
+                names
+            )
+            existing = {row[0] for row in cursor.fetchall()}
             
-            tables_to_check = ['radcheck', 'radreply', 'radusergroup', 'radacct', 'radgroupcheck', 'radgroupreply']
-            missing_tables = []
-            
-            for table in tables_to_check:
-                cursor.execute(f"""
-                    SELECT COUNT(*) 
-                    FROM INFORMATION_SCHEMA.TABLES 
-                    WHERE TABLE_NAME = '{table}'
-                """)
-                if cursor.fetchone()[0] == 0:
-                    missing_tables.append(table)
-            
+            self.schema_version = 0
+            if VERSION_TABLE in existing:
+                cursor.execute(f"SELECT MAX(version) FROM {VERSION_TABLE}")
+                self.schema_version = cursor.fetchone()[0] or 0
             cursor.close()
             
-            if missing_tables:
-                if self.logger:
-                    self.logger.log(f"ВНИМАНИЕ: Отсутствуют таблицы: {', '.join(missing_tables)}")
-            
         except pyodbc.Error as e:
             if self.logger:
                 self.logger.log(f"Ошибка проверки таблиц: {str(e)}")
+            return self.schema_version
+        
+        if self.logger:
+            missing_tables = [table for table in RADIUS_TABLES if table not in existing]
+            if missing_tables:
+                self.logger.log(f"ВНИМАНИЕ: Отсутствуют таблицы: {', '.join(missing_tables)}")
+            if self.schema_version < SCHEMA_VERSION:
+                self.logger.log(f"Версия схемы {self.schema_version}, доступна {SCHEMA_VERSION}: "
+                                f"требуется обновление (создание таблиц или cli.py tables migrate)")
+            elif self.schema_version > SCHEMA_VERSION:
+                self.logger.log(f"ВНИМАНИЕ: версия схемы {self.schema_version} новее программы ({SCHEMA_VERSION})")
+        
+        return self.schema_version
     
     def create_radius_tables(self):
-        """Создание стандартных таблиц RADIUS"""
+        """Создание таблиц RADIUS и обновление схемы до текущей версии"""
+        if not self.migrate():
+            return False
+        
+        # Без процедур все операции работают обычными запросами
+        self.install_procedures()
+        return True
+    
+    # Миграции схемы
+    def migrate(self) -> bool:
+        """Применение недостающих миграций схемы по порядку номеров
+        
+        Каждая миграция записывается в таблицу версий с контрольной суммой.
+        Если уже примененная миграция изменилась, обновление прерывается.
+        """
         try:
             cursor = self.conn.cursor()
-            
-            # Таблица radcheck
-            cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radcheck')
-                CREATE TABLE radcheck (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    username NVARCHAR(64) NOT NULL,
-                    attribute NVARCHAR(64) NOT NULL,
-                    op CHAR(2) DEFAULT ':=' NOT NULL,
-                    value NVARCHAR(253) NOT NULL
-                )
-            """)
-            
-            # Таблица radreply
-            cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radreply')
-                CREATE TABLE radreply (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    username NVARCHAR(64) NOT NULL,
-                    attribute NVARCHAR(64) NOT NULL,
-                    op CHAR(2) DEFAULT '=' NOT NULL,
-                    value NVARCHAR(253) NOT NULL
-                )
-            """)
-            
-            # Таблица radusergroup
-            cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radusergroup')
-                CREATE TABLE radusergroup (
-                    username NVARCHAR(64) NOT NULL,
-                    groupname NVARCHAR(64) NOT NULL,
-                    priority INT DEFAULT 10
-                )
-            """)
-            
-            # Таблица radacct
-            cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radacct')
-                CREATE TABLE radacct (
-                    radacctid BIGINT IDENTITY(1,1) PRIMARY KEY,
-                    acctsessionid NVARCHAR(64) NOT NULL,
-                    acctuniqueid NVARCHAR(32) NOT NULL,
-                    username NVARCHAR(64),
-                    groupname NVARCHAR(64),
-                    realm NVARCHAR(64),
-                    nasipaddress NVARCHAR(15) NOT NULL,
-                    nasportid NVARCHAR(15),
-                    nasporttype NVARCHAR(32),
-                    acctstarttime DATETIME,
-                    acctstoptime DATETIME,
-                    acctsessiontime INT,
-                    acctauthentic NVARCHAR(32),
-                    connectinfo_start NVARCHAR(50),
-                    connectinfo_stop NVARCHAR(50),
-                    acctinputoctets BIGINT,
-                    acctoutputoctets BIGINT,
-                    calledstationid NVARCHAR(50),
-                    callingstationid NVARCHAR(50),
-                    acctterminatecause NVARCHAR(32),
-                    servicetype NVARCHAR(32),
-                    framedprotocol NVARCHAR(32),
-                    framedipaddress NVARCHAR(15)
+            cursor.execute(VERSION_TABLE_DDL)
+            self.conn.commit()
+            cursor.execute(f"SELECT version, checksum FROM {VERSION_TABLE}")
+            applied = {row[0]: row[1].strip() for row in cursor.fetchall()}
+            cursor.close()
+        except pyodbc.Error as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка чтения версии схемы: {str(e)}")
+            return False
+        
+        for migration in MIGRATIONS:
+            checksum = migration.checksum
+            if migration.version in applied:
+                if applied[migration.version] != checksum:
+                    self.last_error = f"миграция {migration.version} ({migration.name}) изменена после применения"
+                    if self.logger:
+                        self.logger.log(f"ВНИМАНИЕ: контрольная сумма миграции {migration.version} "
+                                        f"({migration.name}) не совпадает, обновление схемы остановлено")
+                    return False
+                continue
+            
+            started = time.perf_counter()
+            try:
+                cursor = self.conn.cursor()
+                for step in migration.steps:
+                    self._apply_step(cursor, step)
+                cursor.execute(
+                    f"INSERT INTO {VERSION_TABLE} (version, name, checksum) VALUES (?, ?, ?)",
+                    (migration.version, migration.name, checksum)
                 )
-            """)
+                self.conn.commit()
+                cursor.close()
+            except pyodbc.Error as e:
+                self._rollback()
+                self.last_error = str(e)
+                if self.logger:
+                    self.logger.log(f"Ошибка миграции {migration.version} ({migration.name}): {str(e)}",
+                                    operation='migrate')
+                return False
             
-            # Таблица radgroupcheck
-            cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radgroupcheck')
-                CREATE TABLE radgroupcheck (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    groupname NVARCHAR(64) NOT NULL,
-                    attribute NVARCHAR(64) NOT NULL,
-                    op CHAR(2) DEFAULT ':=' NOT NULL,
-                    value NVARCHAR(253) NOT NULL
-                )
-            """)
+            self.schema_version = max(self.schema_version, migration.version)
+            if self.logger:
+                self.logger.log(f"Применена миграция {migration.version} ({migration.name})",
+                                operation='migrate', duration=time.perf_counter() - started)
+        
+        if self.logger:
+            self.logger.log(f"Схема базы данных версии {SCHEMA_VERSION}")
+        return True
+    
+    def _apply_step(self, cursor, step):
+        """Выполнение шага миграции"""
+        if isinstance(step, IndexSpec):
+            duplicates = self._unique_conflicts(cursor, step)
+            if duplicates:
+                # Дубликаты из старых версий не блокируют остальные миграции:
+                # индекс создаст tables indexes после их удаления
+                if self.logger:
+                    self.logger.log(f"ВНИМАНИЕ: индекс {step.name} не создан - {duplicates} повторяющихся "
+                                    f"значений ({', '.join(step.columns)}) в {step.table}; удалите дубликаты "
+                                    f"и выполните tables indexes", operation='migrate')
+                return
+            if self._create_index(cursor, step) is None:
+                raise pyodbc.Error('42S02', f"Нет таблицы {step.table} для индекса {step.name}")
+        elif isinstance(step, Backfill):
+            # Порции фиксируются по отдельности, блокировки не копятся
+            while True:
+                cursor.execute(step.sql())
+                updated = cursor.rowcount
+                self.conn.commit()
+                if updated < step.batch_size:
+                    break
+        elif isinstance(step, DropIndex):
+            cursor.execute(step.sql())
+        else:
+            cursor.execute(step)
+    
+    def _online_index_builds(self) -> bool:
+        """Поддержка ONLINE = ON (Enterprise/Developer, Azure SQL)"""
+        if self._online_ddl is None:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT CAST(SERVERPROPERTY('EngineEdition') AS INT)")
+                self._online_ddl = cursor.fetchone()[0] in (3, 5, 8)
+                cursor.close()
+            except pyodbc.Error:
+                self._online_ddl = False
+        return self._online_ddl
+    
+    def _unique_conflicts(self, cursor, index: IndexSpec) -> int:
+        """Число повторяющихся ключей, мешающих создать уникальный индекс (0 - нет)"""
+        if not index.unique:
+            return 0
+        cursor.execute(
+            "SELECT OBJECT_ID(?, 'U'), "
+            "(SELECT COUNT(*) FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?, 'U'))",
+            (index.table, index.name, index.table)
+        )
+        table_id, exists = cursor.fetchone()
+        if table_id is None or exists:
+            return 0
+        columns = ', '.join(index.columns)
+        cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 AS k FROM {index.table} "
+                       f"GROUP BY {columns} HAVING COUNT(*) > 1) d")
+        return cursor.fetchone()[0]
+    
+    def _create_index(self, cursor, index: IndexSpec) -> Optional[bool]:
+        """Создание индекса, если его нет
+        
+        True - создан, False - уже был, None - нет таблицы.
+        """
+        cursor.execute(
+            "SELECT OBJECT_ID(?, 'U'), "
+            "(SELECT COUNT(*) FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?, 'U'))",
+            (index.table, index.name, index.table)
+        )
+        table_id, exists = cursor.fetchone()
+        if table_id is None:
+            return None
+        if exists:
+            return False
+        cursor.execute(index.ddl(online=self._online_index_builds()))
+        self.conn.commit()
+        return True
+    
+    def tune_indexes(self) -> Tuple[List[str], List[str], List[str]]:
+        """Создание недостающих индексов схемы без записи версии
+        
+        Каждый индекс создается в своей транзакции, так что ошибка одного
+        (например, дубликаты для уникального индекса) не мешает остальным.
+        Возвращает списки добавленных, уже существующих и не созданных
+        индексов (последние - с текстом ошибки).
+        """
+        added, present, failed = [], [], []
+        
+        for index in schema_indexes():
+            try:
+                cursor = self.conn.cursor()
+                duplicates = self._unique_conflicts(cursor, index)
+                if duplicates:
+                    failed.append(f"{index.name}: {duplicates} повторяющихся значений "
+                                  f"({', '.join(index.columns)}) в {index.table}")
+                    cursor.close()
+                    self.conn.commit()
+                    continue
+                created = self._create_index(cursor, index)
+                if created is None:
+                    failed.append(f"{index.name}: нет таблицы {index.table}")
+                elif created:
+                    added.append(index.name)
+                else:
+                    present.append(index.name)
+                cursor.close()
+                
+            except pyodbc.Error as e:
+                self._rollback()
+                failed.append(f"{index.name}: {str(e)}")
+        
+        if self.logger:
+            self.logger.log(f"Индексы: добавлено {len(added)}, уже были {len(present)}, "
+                            f"ошибок {len(failed)}")
+            for name in added:
+                self.logger.log(f"Создан индекс {name}")
+            for message in failed:
+                self.logger.log(f"Не удалось создать индекс {message}")
+        
+        return added, present, failed
+    
+    # Хранимые процедуры
+    def detect_procedures(self) -> set:
+        """Поиск установленных хранимых процедур текущей версии"""
+        names = list(PROCEDURES)
+        found = {}
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                f"SELECT name, OBJECT_DEFINITION(object_id) FROM sys.procedures "
+                f"WHERE name IN ({', '.join('?' * len(names))})",
+                names
+            )
+            found = {row[0]: procedure_version(row[1]) for row in cursor.fetchall()}
+            cursor.close()
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка проверки хранимых процедур: {str(e)}")
+        
+        current = {name for name, version in found.items() if version == PROCEDURES_VERSION}
+        self.procedures.clear()
+        self.procedures.update(current)
+        
+        if self.logger:
+            if len(current) == len(names):
+                self.logger.log(f"Хранимые процедуры версии {PROCEDURES_VERSION} установлены")
+            elif found:
+                self.logger.log(f"Хранимые процедуры устарели или установлены не все "
+                                f"(нужна версия {PROCEDURES_VERSION}), используются обычные запросы")
+        
+        return current
+    
+    def install_procedures(self) -> bool:
+        """Установка (обновление) хранимых процедур и табличного типа атрибутов
+        
+        Процедуры пересоздаются целиком: сначала удаляются старые версии, затем
+        тип параметров (его нельзя изменить, пока на него ссылаются процедуры).
+        """
+        try:
+            cursor = self.conn.cursor()
             
-            # Таблица radgroupreply
-            cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radgroupreply')
-                CREATE TABLE radgroupreply (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    groupname NVARCHAR(64) NOT NULL,
-                    attribute NVARCHAR(64) NOT NULL,
-                    op CHAR(2) DEFAULT '=' NOT NULL,
-                    value NVARCHAR(253) NOT NULL
-                )
-            """)
+            for name in PROCEDURES:
+                cursor.execute(f"IF OBJECT_ID('{name}', 'P') IS NOT NULL DROP PROCEDURE {name}")
+            cursor.execute(f"IF TYPE_ID('{ATTRIBUTE_TYPE}') IS NOT NULL DROP TYPE {ATTRIBUTE_TYPE}")
+            cursor.execute(ATTRIBUTE_TYPE_DDL)
             
-            # Создаем индексы
-            try:
-                cursor.execute("CREATE INDEX idx_radcheck_username ON radcheck(username)")
-                cursor.execute("CREATE INDEX idx_radreply_username ON radreply(username)")
-                cursor.execute("CREATE INDEX idx_radusergroup_username ON radusergroup(username)")
-                cursor.execute("CREATE INDEX idx_radacct_username ON radacct(username)")
-                cursor.execute("CREATE INDEX idx_radacct_acctstarttime ON radacct(acctstarttime)")
-                cursor.execute("CREATE INDEX idx_radgroupcheck_groupname ON radgroupcheck(groupname)")
-                cursor.execute("CREATE INDEX idx_radgroupreply_groupname ON radgroupreply(groupname)")
-            except:
-                pass  # Индексы уже могут существовать
+            # CREATE PROCEDURE должен быть единственным оператором пакета
+            for definition in PROCEDURES.values():
+                cursor.execute(definition)
             
             self.conn.commit()
             cursor.close()
             
+        except pyodbc.Error as e:
+            self._rollback()
+            self.last_error = str(e)
             if self.logger:
-                self.logger.log("Таблицы RADIUS успешно созданы")
-            
-            return True
-            
+                self.logger.log(f"Ошибка установки хранимых процедур: {str(e)}")
+            return False
+        
+        if self.logger:
+            self.logger.log(f"Установлены хранимые процедуры версии {PROCEDURES_VERSION}")
+        self.detect_procedures()
+        return True
+    
+    def _call_procedure(self, cursor, name: str, *params) -> bool:
+        """Вызов хранимой процедуры, если она установлена
+        
+        Списки передаются как табличные параметры (пустой список - DEFAULT,
+        т.е. пустая таблица). False - процедуры нет, вызывающий выполняет
+        обычные запросы.
+        """
+        if name not in self.procedures:
+            return False
+        
+        arguments = ', '.join('DEFAULT' if param == [] else '?' for param in params)
+        values = [param for param in params if param != []]
+        try:
+            cursor.execute(f"EXEC {name} {arguments}", values)
         except pyodbc.Error as e:
-            self.conn.rollback()
+            # 2812 - процедура не найдена (удалена после подключения)
+            if 2812 not in error_codes(e)[1]:
+                raise
+            self.procedures.discard(name)
             if self.logger:
-                self.logger.log(f"Ошибка создания таблиц: {str(e)}")
+                self.logger.log(f"Хранимая процедура {name} не найдена, используются обычные запросы")
             return False
+        return True
     
     # Методы для работы с пользователями
     def get_users(self) -> List[User]:
         """Получение списка всех пользователей"""
+        store = self.get_user_store()
+        return [
+            User(username=username, group=group, status=status, last_login=last_login)
+            for username, group, status, last_login in map(store.row_by_id, range(store.row_count()))
+        ]
+    
+    def get_user_store(self, store: UserStore = None, batch_size: int = 5000) -> UserStore:
+        """Загрузка пользователей в компактное колоночное хранилище"""
+        if store is None:
+            store = UserStore()
+        store.clear()
+        
         if not self.connection_status:
-            return []
+            return store
         
         try:
-            cursor = self.conn.cursor()
-            
+            # Время последнего входа - минутами от UserStore.EPOCH,
+            # чтобы не разбирать строки дат на стороне клиента
             query = """
             SELECT 
                 rc.username,
@@ -288,10 +1160,7 @@ class DatabaseManager:
                     ) THEN 'Заблокирован'
                     ELSE 'Активен'
                 END as status,
-                COALESCE(
-                    CONVERT(VARCHAR(16), MAX(ra.acctstarttime), 120),
-                    'Никогда'
-                ) as last_login
+                DATEDIFF(MINUTE, '20000101', MAX(ra.acctstarttime)) as last_login_minutes
             FROM radcheck rc
             LEFT JOIN radusergroup rug ON rc.username = rug.username
             LEFT JOIN radacct ra ON rc.username = ra.username
@@ -300,25 +1169,21 @@ class DatabaseManager:
             ORDER BY rc.username
             """
             
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            cursor.close()
-            
-            users = []
-            for row in rows:
-                users.append(User(
-                    username=row[0] if row[0] else '',
-                    group=row[1] if row[1] else 'default',
-                    status=row[2] if row[2] else 'Активен',
-                    last_login=row[3] if row[3] else 'Никогда'
-                ))
-            
-            return users
+            with self._isolated_read('get_users') as cursor:
+                cursor.execute(query)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    store.extend(rows)
             
         except pyodbc.Error as e:
+            store.clear()
             if self.logger:
                 self.logger.log(f"Ошибка получения пользователей: {str(e)}")
-            return []
+        
+        store.commit()
+        return store
     
     def user_exists(self, username: str) -> bool:
         """Проверка существования пользователя"""
@@ -334,77 +1199,134 @@ class DatabaseManager:
         except:
             return False
     
-    def add_user(self, user: User, extra_attributes: List[Attribute] = None) -> bool:
-        """Добавление нового пользователя"""
-        try:
-            cursor = self.conn.cursor()
-            
-            # Добавляем пароль (правильный порядок: UserName, Attribute, Value, op)
-            cursor.execute(
+    @staticmethod
+    def _user_rows(user: User, extra_attributes: List[Attribute] = None) -> Tuple[list, list, list]:
+        """Строки radcheck, radusergroup и radreply для нового пользователя"""
+        # Пароль (правильный порядок: UserName, Attribute, Value, op)
+        check_rows = [(user.username, 'Cleartext-Password', user.password, ':=')]
+        
+        # Группа
+        group_rows = [(user.username, user.group, 10)]
+        reply_rows = []
+        
+        # Срок действия
+        if user.expiration:
+            check_rows.append((user.username, 'Expiration', user.expiration, ':='))
+        
+        # Ограничение одновременных сессий
+        if user.simultaneous_use and int(user.simultaneous_use) > 1:
+            check_rows.append((user.username, 'Simultaneous-Use', str(user.simultaneous_use), ':='))
+        
+        # Session-Timeout
+        if user.session_timeout and int(user.session_timeout) != 3600:
+            reply_rows.append((user.username, 'Session-Timeout', str(user.session_timeout), '='))
+        
+        # Idle-Timeout
+        if user.idle_timeout and int(user.idle_timeout) != 0:
+            reply_rows.append((user.username, 'Idle-Timeout', str(user.idle_timeout), '='))
+        
+        # Дополнительные атрибуты
+        for attr in extra_attributes or []:
+            reply_rows.append((user.username, str(attr.attribute), str(attr.value), attr.op))
+        
+        return check_rows, group_rows, reply_rows
+    
+    @staticmethod
+    def _insert_user_rows(cursor, check_rows: list, group_rows: list, reply_rows: list):
+        """Вставка строк пользователей (пакетно через executemany)"""
+        if check_rows:
+            cursor.executemany(
                 "INSERT INTO radcheck (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
-                (user.username, 'Cleartext-Password', user.password, ':=')
+                check_rows
             )
-            
-            # Добавляем в группу
-            cursor.execute(
+        if group_rows:
+            cursor.executemany(
                 "INSERT INTO radusergroup (username, groupname, priority) VALUES (?, ?, ?)",
-                (user.username, user.group, 10)
+                group_rows
             )
+        if reply_rows:
+            cursor.executemany(
+                "INSERT INTO radreply (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
+                reply_rows
+            )
+    
+    def add_user(self, user: User, extra_attributes: List[Attribute] = None) -> bool:
+        """Добавление нового пользователя"""
+        started = time.perf_counter()
             
-            # Срок действия
-            if user.expiration:
-                cursor.execute(
-                    "INSERT INTO radcheck (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
-                    (user.username, 'Expiration', user.expiration, ':=')
-                )
+        def work(cursor):
+            check_rows, group_rows, reply_rows = self._user_rows(user, extra_attributes)
+            if not self._call_procedure(cursor, 'rm_add_user', user.username, user.group,
+                                        attribute_rows(check_rows), attribute_rows(reply_rows)):
+                self._insert_user_rows(cursor, check_rows, group_rows, reply_rows)
             
-            # Ограничение одновременных сессий
-            if user.simultaneous_use and int(user.simultaneous_use) > 1:
-                cursor.execute(
-                    "INSERT INTO radcheck (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
-                    (user.username, 'Simultaneous-Use', user.simultaneous_use, ':=')
-                )
-            
-            # Session-Timeout (для radreply тоже проверяем порядок)
-            if user.session_timeout and int(user.session_timeout) != 3600:
-                cursor.execute(
-                    "INSERT INTO radreply (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
-                    (user.username, 'Session-Timeout', user.session_timeout, '=')
-                )
+        try:
+            self._transaction('add_user', work)
             
-            # Idle-Timeout
-            if user.idle_timeout and int(user.idle_timeout) != 0:
-                cursor.execute(
-                    "INSERT INTO radreply (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
-                    (user.username, 'Idle-Timeout', user.idle_timeout, '=')
-                )
+            if self.logger:
+                self.logger.log(f"Добавлен пользователь: {user.username}", operation='add_user',
+                                username=user.username, duration=time.perf_counter() - started)
             
-            # Дополнительные атрибуты
-            if extra_attributes:
-                for attr in extra_attributes:
-                    cursor.execute(
-                        "INSERT INTO radreply (UserName, Attribute, Value, op) VALUES (?, ?, ?, ?)",
-                        (user.username, attr.attribute, attr.value, attr.op)
-                    )
+            return True
             
-            self.conn.commit()
-            cursor.close()
+        except pyodbc.Error as e:
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка добавления пользователя: {str(e)}", operation='add_user',
+                                username=user.username, duration=time.perf_counter() - started)
+            return False
+    
+    def add_users_batch(self, items: List[Tuple[User, Optional[List[Attribute]]]]) -> List[Optional[str]]:
+        """Добавление порции пользователей одной транзакцией
+        
+        items - пары (пользователь, дополнительные reply-атрибуты). Возвращает
+        список ошибок той же длины (None - успешно). Если транзакция порции
+        не прошла, пользователи добавляются по одному, чтобы ошибка досталась
+        только виновным.
+        """
+        started = time.perf_counter()
+        check_rows, group_rows, reply_rows = [], [], []
+        for user, extra_attributes in items:
+            user_check, user_group, user_reply = self._user_rows(user, extra_attributes)
+            check_rows.extend(user_check)
+            group_rows.extend(user_group)
+            reply_rows.extend(user_reply)
+        
+        def work(cursor):
+            cursor.fast_executemany = True
+            self._insert_user_rows(cursor, check_rows, group_rows, reply_rows)
+        
+        try:
+            self._transaction('add_users_batch', work,
+                              rows=len(check_rows) + len(group_rows) + len(reply_rows))
             
             if self.logger:
-                self.logger.log(f"Добавлен пользователь: {user.username}")
+                self.logger.log(f"Добавлена порция пользователей: {len(items)}", operation='add_users_batch',
+                                duration=time.perf_counter() - started)
             
-            return True
+            return [None] * len(items)
             
         except pyodbc.Error as e:
-            self.conn.rollback()
             if self.logger:
-                self.logger.log(f"Ошибка добавления пользователя: {str(e)}")
-            return False
+                self.logger.log(f"Ошибка пакетного добавления ({len(items)} польз.), "
+                                f"добавляем по одному: {str(e)}", operation='add_users_batch')
+        
+        results = []
+        for user, extra_attributes in items:
+            if self.add_user(user, extra_attributes):
+                results.append(None)
+            else:
+                results.append(self.last_error or "ошибка добавления")
+        return results
     
     def update_user_password(self, username: str, new_password: str) -> bool:
         """Обновление пароля пользователя"""
-        try:
-            cursor = self.conn.cursor()
+        started = time.perf_counter()
+            
+        def work(cursor):
+            if self._call_procedure(cursor, 'rm_set_attributes', username,
+                                    [('Cleartext-Password', ':=', new_password)], []):
+                return
             
             # Удаляем старые пароли
             cursor.execute(
@@ -418,24 +1340,28 @@ class DatabaseManager:
                 (username, 'Cleartext-Password', new_password, ':=')
             )
             
-            self.conn.commit()
-            cursor.close()
+        try:
+            self._transaction('update_password', work)
             
             if self.logger:
-                self.logger.log(f"Изменен пароль для: {username}")
+                self.logger.log(f"Изменен пароль для: {username}", operation='update_password',
+                                username=username, duration=time.perf_counter() - started)
             
             return True
             
         except pyodbc.Error as e:
-            self.conn.rollback()
+            self.last_error = str(e)
             if self.logger:
                 self.logger.log(f"Ошибка изменения пароля: {str(e)}")
             return False
     
     def block_user(self, username: str, block: bool = True) -> bool:
         """Блокировка/разблокировка пользователя"""
-        try:
-            cursor = self.conn.cursor()
+        started = time.perf_counter()
+            
+        def work(cursor):
+            if self._call_procedure(cursor, 'rm_block_user', username, block):
+                return
             
             if block:
                 # Добавляем атрибут блокировки
@@ -450,44 +1376,71 @@ class DatabaseManager:
                     (username,)
                 )
             
-            self.conn.commit()
-            cursor.close()
+        try:
+            self._transaction('block_user', work)
             
             action = "заблокирован" if block else "разблокирован"
             if self.logger:
-                self.logger.log(f"Пользователь {username} {action}")
+                self.logger.log(f"Пользователь {username} {action}",
+                                operation='block_user' if block else 'unblock_user',
+                                username=username, duration=time.perf_counter() - started)
             
             return True
             
         except pyodbc.Error as e:
-            self.conn.rollback()
+            self.last_error = str(e)
             if self.logger:
                 self.logger.log(f"Ошибка блокировки: {str(e)}")
             return False
     
+    # Очередь очистки radacct: удаляет сессии, записанные до удаления пользователя
+    ENQUEUE_ACCT_CLEANUP = """
+        UPDATE rm_acct_cleanup
+            SET upto_id = (SELECT ISNULL(MAX(radacctid), 0) FROM radacct), queued_at = SYSUTCDATETIME()
+            WHERE username = ?;
+        IF @@ROWCOUNT = 0
+            INSERT INTO rm_acct_cleanup (username, upto_id)
+                SELECT ?, ISNULL(MAX(radacctid), 0) FROM radacct;
+    """
+    
     def delete_user(self, username: str) -> bool:
-        """Удаление пользователя"""
-        try:
-            cursor = self.conn.cursor()
+        """Удаление пользователя
+        
+        Строки авторизации удаляются сразу; сессии radacct (их может быть
+        много) ставятся в очередь фоновой очистки, если схема ее поддерживает.
+        """
+        started = time.perf_counter()
+            
+        def work(cursor):
+            if self._call_procedure(cursor, 'rm_delete_user', username):
+                return
             
             # Удаляем из всех таблиц RADIUS
-            tables = ['radcheck', 'radreply', 'radusergroup', 'radacct']
+            tables = ['radcheck', 'radreply', 'radusergroup']
+            if self.schema_version >= ACCT_CLEANUP_VERSION:
+                cursor.execute(self.ENQUEUE_ACCT_CLEANUP, (username, username))
+            else:
+                tables.append('radacct')
             for table in tables:
                 try:
                     cursor.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
-                except:
-                    pass  # Игнорируем ошибки если таблицы не существует
+                except pyodbc.Error as e:
+                    # Игнорируем ошибки если таблицы не существует
+                    # (остальные - в _transaction, чтобы не зафиксировать часть удаления)
+                    if error_codes(e)[0] != '42S02':
+                        raise
             
-            self.conn.commit()
-            cursor.close()
+        try:
+            self._transaction('delete_user', work)
             
             if self.logger:
-                self.logger.log(f"Удален пользователь: {username}")
+                self.logger.log(f"Удален пользователь: {username}", operation='delete_user',
+                                username=username, duration=time.perf_counter() - started)
             
             return True
             
         except pyodbc.Error as e:
-            self.conn.rollback()
+            self.last_error = str(e)
             if self.logger:
                 self.logger.log(f"Ошибка удаления: {str(e)}")
             return False
@@ -499,8 +1452,6 @@ class DatabaseManager:
             return []
         
         try:
-            cursor = self.conn.cursor()
-            
             query = """
             SELECT 
                 groupname,
@@ -511,9 +1462,9 @@ class DatabaseManager:
             ORDER BY groupname
             """
             
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            cursor.close()
+            with self._isolated_read('get_groups') as cursor:
+                cursor.execute(query)
+                rows = cursor.fetchall()
             
             groups = []
             for row in rows:
@@ -591,7 +1542,7 @@ class DatabaseManager:
             return check_attrs, reply_attrs
         
         try:
-            cursor = self.conn.cursor()
+            cursor = self._read_cursor()
             
             # Check атрибуты
             cursor.execute("""
@@ -714,10 +1665,28 @@ class DatabaseManager:
         
         return added, errors
     
-    def export_users_to_csv(self, filename: str) -> int:
-        """Экспорт пользователей в CSV"""
-        try:
-            cursor = self.conn.cursor()
+    def export_users_to_csv(self, filename: str) -> int:
+        """Экспорт пользователей в CSV"""
+        try:
+            with open(filename, 'w', newline='', encoding='utf-8') as f:
+                count = self.write_users_csv(f)
+            
+            if self.logger:
+                self.logger.log(f"Экспорт CSV: {count} пользователей")
+            
+            return count
+            
+        except Exception as e:
+            if self.logger:
+                self.logger.log(f"Ошибка экспорта CSV: {str(e)}")
+            return 0
+    
+    def write_users_csv(self, f: TextIO, batch_size: int = 5000) -> int:
+        """Потоковая запись пользователей в CSV (файл или stdout)"""
+        writer = csv.writer(f)
+        count = 0
+        
+        with self._isolated_read('export_users', listing=False) as cursor:
             cursor.execute("""
                 SELECT DISTINCT rc.username, rc.value as password, 
                        COALESCE(rug.groupname, 'default') as groupname,
@@ -728,31 +1697,15 @@ class DatabaseManager:
                 ORDER BY rc.username
             """)
             
-            users = cursor.fetchall()
-            cursor.close()
-            
-            import csv
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Username', 'Password', 'Group', 'Expiration'])
-                
-                for user in users:
-                    writer.writerow([
-                        user[0] if user[0] else '',
-                        user[1] if user[1] else '',
-                        user[2] if user[2] else '',
-                        user[3] if user[3] else ''
-                    ])
-            
-            if self.logger:
-                self.logger.log(f"Экспорт CSV: {len(users)} пользователей")
-            
-            return len(users)
-            
-        except Exception as e:
-            if self.logger:
-                self.logger.log(f"Ошибка экспорта CSV: {str(e)}")
-            return 0
+            writer.writerow(CSV_HEADER)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.writerows([value if value else '' for value in row] for row in rows)
+                count += len(rows)
+        
+        return count
        
         # Методы для работы с атрибутами пользователя
     def get_user_attributes(self, username: str) -> Tuple[List[Attribute], List[Attribute]]:
@@ -764,7 +1717,7 @@ class DatabaseManager:
             return check_attrs, reply_attrs
         
         try:
-            cursor = self.conn.cursor()
+            cursor = self._read_cursor()
             
             # Check атрибуты (исключаем пароль из списка)
             # Исправленный порядок: Attribute, op, Value
@@ -854,15 +1807,6 @@ class DatabaseManager:
             attribute_str = str(attr.attribute)
             value_str = str(attr.value)
             
-            # Отладочная информация
-            print(f"DEBUG delete_user_attribute:")
-            print(f"  Username: {username}")
-            print(f"  Attribute (orig): {attr.attribute}, type: {type(attr.attribute)}")
-            print(f"  Attribute (str): {attribute_str}, type: {type(attribute_str)}")
-            print(f"  Value (orig): {attr.value}, type: {type(attr.value)}")
-            print(f"  Value (str): {value_str}, type: {type(value_str)}")
-            print(f"  Op: {attr.op}")
-            
             # Выполняем DELETE с преобразованными строками
             cursor.execute(
                 f"DELETE FROM {table} WHERE UserName = ? AND Attribute = ? AND Value = ? AND op = ?",
@@ -870,7 +1814,6 @@ class DatabaseManager:
             )
             
             rows_deleted = cursor.rowcount
-            print(f"  Rows deleted: {rows_deleted}")
             
             self.conn.commit()
             cursor.close()
@@ -923,4 +1866,1049 @@ class DatabaseManager:
             self.conn.rollback()
             if self.logger:
                 self.logger.log(f"Ошибка обновления атрибута пользователя: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    # Обслуживание radacct
+    def archive_accounting(self, days: int, mode: str = 'table', directory: str = 'radacct_archive',
+                           batch_size: int = 1000, delay: float = 0.5,
+                           cancel: threading.Event = None,
+                           progress: Callable[[int], None] = None) -> int:
+        """Перенос закрытых сессий старше days дней из radacct в архив
+        
+        mode 'table' - в таблицу radacct_archive (DELETE ... OUTPUT INTO, перенос
+        порции атомарен), 'csv' - в сжатые CSV-файлы по месяцам в directory.
+        Порции - диапазоны radacctid не больше batch_size строк, каждая в своей
+        короткой транзакции, между порциями пауза delay секунд, чтобы вставки
+        FreeRADIUS не ждали блокировок. Повторный запуск продолжает с места
+        остановки. Если ведутся агрегаты, переносятся только учтенные в них
+        сессии (_rollup_guard). Возвращает число перенесенных строк; при
+        ошибке она записывается в last_error.
+        """
+        started = time.perf_counter()
+        cutoff = datetime.now() - timedelta(days=max(1, days))
+        archive = None
+        output = ''
+        moved = 0
+        self.last_error = ''
+        
+        def work(cursor):
+            cursor.execute(
+                f"SELECT TOP (?) radacctid FROM radacct "
+                f"WHERE radacctid > ? AND radacctid <= ? AND acctstoptime < ?{guard} ORDER BY radacctid",
+                [batch_size, last, upper, cutoff] + guard_params
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return None, 0
+            cursor.execute(
+                f"DELETE FROM radacct {output}"
+                f"WHERE radacctid BETWEEN ? AND ? AND acctstoptime < ?{guard}",
+                [ids[0], ids[-1], cutoff] + guard_params
+            )
+            return ids[-1], cursor.rowcount
+        
+        try:
+            # Сессии, еще не учтенные в агрегатах, не переносятся
+            guard, guard_params = self._rollup_guard()
+            columns = self._archive_columns(table=mode != 'csv')
+            if mode == 'csv':
+                archive = MonthlyCsvArchive(directory, columns)
+            else:
+                output = self._archive_output(columns)
+            
+            if archive:
+                # Порция записана в файлы, но удаление не зафиксировано
+                checkpoint = archive.load_checkpoint()
+                if checkpoint:
+                    moved += self._delete_acct_range(checkpoint['lo'], checkpoint['hi'],
+                                                     datetime.fromisoformat(checkpoint['cutoff']))
+                    archive.clear_checkpoint()
+            
+            # Закрытая до cutoff сессия и началась до cutoff: граница диапазона ключей
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT MAX(radacctid) FROM radacct WHERE acctstarttime < ?", (cutoff,))
+            upper = cursor.fetchone()[0]
+            cursor.close()
+            self.conn.commit()
+            
+            last = 0
+            while upper is not None and last < upper:
+                if cancel and cancel.is_set():
+                    break
+                
+                if archive:
+                    hi, count = self._archive_acct_batch(archive, columns, batch_size, last, upper, cutoff,
+                                                         (guard, guard_params))
+                else:
+                    hi, count = self._transaction('archive_accounting', work, rows=batch_size)
+                if hi is None:
+                    break
+                
+                last = hi
+                moved += count
+                if progress:
+                    progress(moved)
+                
+                if delay > 0:
+                    if cancel:
+                        cancel.wait(delay)
+                    else:
+                        time.sleep(delay)
+        
+        except (pyodbc.Error, OSError) as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка архивации radacct: {str(e)}", operation='archive_accounting')
+        
+        if self.logger:
+            self.logger.log(f"Архивировано сессий radacct: {moved} (закрытые до {cutoff:%Y-%m-%d})",
+                            operation='archive_accounting', duration=time.perf_counter() - started)
+        return moved
+    
+    def _archive_acct_batch(self, archive: MonthlyCsvArchive, columns: Sequence[str], batch_size: int,
+                            last: int, upper: int, cutoff: datetime,
+                            guard: Tuple[str, list] = ('', [])) -> Tuple[Optional[int], int]:
+        """Порция архивации в CSV: удаление с OUTPUT, запись в файлы, фиксация
+        
+        Контрольная точка сохраняется до фиксации: если после записи файлов
+        фиксация не дошла, следующий запуск удалит эти строки без повторной записи.
+        guard - условие _rollup_guard и его параметры.
+        """
+        condition, params = guard
+        with self.throttle.slot(batch_size):
+            cursor = self.conn.cursor()
+            cursor.execute(
+                f"SELECT TOP (?) radacctid FROM radacct "
+                f"WHERE radacctid > ? AND radacctid <= ? AND acctstoptime < ?{condition} ORDER BY radacctid",
+                [batch_size, last, upper, cutoff] + params
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                cursor.close()
+                self.conn.commit()
+                return None, 0
+            
+            cursor.execute(
+                f"DELETE FROM radacct "
+                f"OUTPUT {', '.join(f'DELETED.[{column}]' for column in columns)} "
+                f"WHERE radacctid BETWEEN ? AND ? AND acctstoptime < ?{condition}",
+                [ids[0], ids[-1], cutoff] + params
+            )
+            key = columns.index('radacctid')
+            rows = sorted(cursor.fetchall(), key=lambda row: row[key])
+            
+            archive.write(rows)
+            archive.save_checkpoint(ids[0], ids[-1], cutoff)
+            self.conn.commit()
+            archive.clear_checkpoint()
+            cursor.close()
+        
+        return ids[-1], len(rows)
+    
+    def _delete_acct_range(self, lo: int, hi: int, cutoff: datetime) -> int:
+        """Удаление закрытых сессий из диапазона radacctid"""
+        def work(cursor):
+            cursor.execute(
+                "DELETE FROM radacct WHERE radacctid BETWEEN ? AND ? AND acctstoptime < ?",
+                (lo, hi, cutoff)
+            )
+            return cursor.rowcount
+        
+        return self._transaction('archive_accounting', work, rows=hi - lo + 1)
+    
+    def _archive_columns(self, table: bool = True) -> Tuple[str, ...]:
+        """Колонки radacct для переноса в архив (в порядке таблицы, по sys.columns)
+        
+        Вместе со стандартными переносятся колонки, добавленные в radacct
+        вручную или новыми версиями FreeRADIUS. table - архив в таблице:
+        недостающие колонки добавляются в radacct_archive (NULL, тип как
+        в radacct), чтобы перенос не терял их значения.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT c.name, t.name, c.max_length, c.precision, c.scale FROM sys.columns c "
+            "JOIN sys.types t ON t.user_type_id = c.user_type_id "
+            "WHERE c.object_id = OBJECT_ID('radacct') AND c.is_computed = 0 ORDER BY c.column_id"
+        )
+        source = cursor.fetchall()
+        
+        if table:
+            cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID('radacct_archive')")
+            archived = {row[0].lower() for row in cursor.fetchall()}
+            for name, type_name, max_length, precision, scale in source:
+                if name.lower() in archived:
+                    continue
+                sql_type = column_sql_type(type_name, max_length, precision, scale)
+                cursor.execute(f"ALTER TABLE radacct_archive ADD [{name}] {sql_type} NULL")
+                if self.logger:
+                    self.logger.log(f"В radacct_archive добавлена колонка {name} {sql_type}",
+                                    operation='archive_accounting')
+        
+        cursor.close()
+        self.conn.commit()
+        return tuple(row[0] for row in source)
+    
+    @staticmethod
+    def _archive_output(columns: Sequence[str]) -> str:
+        """OUTPUT ... INTO radacct_archive для DELETE из radacct"""
+        names = ', '.join(f"[{column}]" for column in columns)
+        deleted = ', '.join(f"DELETED.[{column}]" for column in columns)
+        return f"OUTPUT {deleted} INTO radacct_archive ({names}) "
+    
+    def pending_acct_cleanup(self) -> int:
+        """Число удаленных пользователей, чьи сессии radacct ждут очистки"""
+        if self.schema_version < ACCT_CLEANUP_VERSION:
+            return 0
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM rm_acct_cleanup")
+            count = cursor.fetchone()[0]
+            cursor.close()
+            self.conn.commit()
+            return count
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка чтения очереди очистки radacct: {str(e)}")
+            return 0
+    
+    def cleanup_accounting(self, batch_size: int = 1000, delay: float = 0.5, archive: bool = False,
+                           allowed: Callable[[], bool] = None, cancel: threading.Event = None,
+                           progress: Callable[[int, int], None] = None) -> int:
+        """Удаление сессий radacct удаленных пользователей из очереди порциями
+        
+        Каждая порция (DELETE TOP (batch_size)) - отдельная транзакция, между
+        порциями пауза delay секунд. archive - переносить сессии в
+        radacct_archive вместо удаления. allowed() проверяется перед каждой
+        порцией (окно обслуживания): вне окна работа прерывается и
+        продолжается при следующем запуске. Закрытые сессии, еще не учтенные
+        в агрегатах (_rollup_guard), остаются до следующего запуска.
+        progress(удалено, всего).
+        """
+        if self.schema_version < ACCT_CLEANUP_VERSION:
+            return 0
+        
+        started = time.perf_counter()
+        deleted = 0
+        output = ''
+        
+        try:
+            guard, guard_params = self._rollup_guard(open_sessions=True)
+            if archive:
+                output = self._archive_output(self._archive_columns())
+            
+            # Оценка объема для прогресса (по индексу username + radacctid)
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT COUNT_BIG(*) FROM radacct r "
+                "JOIN rm_acct_cleanup c ON r.username = c.username AND r.radacctid <= c.upto_id"
+            )
+            total = cursor.fetchone()[0]
+            cursor.close()
+            self.conn.commit()
+            
+            while not (cancel and cancel.is_set()):
+                if allowed and not allowed():
+                    break
+                
+                def work(cursor):
+                    cursor.execute("SELECT TOP (1) username, upto_id FROM rm_acct_cleanup ORDER BY queued_at")
+                    row = cursor.fetchone()
+                    if row is None:
+                        return None
+                    username, upto_id = row
+                    cursor.execute(
+                        f"DELETE TOP (?) FROM radacct {output}WHERE username = ? AND radacctid <= ?{guard}",
+                        [batch_size, username, upto_id] + guard_params
+                    )
+                    count = cursor.rowcount
+                    if count < batch_size:
+                        # Пользователь очищен (если его не удалили повторно за это время);
+                        # иначе остались сессии, ждущие агрегатов
+                        cursor.execute(
+                            "DELETE FROM rm_acct_cleanup WHERE username = ? AND upto_id = ? AND NOT EXISTS "
+                            "(SELECT * FROM radacct WHERE username = ? AND radacctid <= ?)",
+                            (username, upto_id, username, upto_id)
+                        )
+                        return count, cursor.rowcount == 0
+                    return count, False
+                
+                result = self._transaction('cleanup_accounting', work, rows=batch_size)
+                if result is None:
+                    break
+                
+                count, waiting = result
+                deleted += count
+                if progress:
+                    progress(deleted, max(total, deleted))
+                if waiting:
+                    # Первый в очереди ждет агрегатов - продолжение при следующем запуске
+                    break
+                
+                if delay > 0 and count:
+                    if cancel:
+                        cancel.wait(delay)
+                    else:
+                        time.sleep(delay)
+        
+        except pyodbc.Error as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка очистки radacct: {str(e)}", operation='cleanup_accounting')
+        
+        if deleted and self.logger:
+            self.logger.log(f"Очистка radacct удаленных пользователей: {deleted} сессий",
+                            operation='cleanup_accounting', duration=time.perf_counter() - started)
+        return deleted
+    
+    # Открытые сессии
+    ONLINE_COLUMNS = ('radacctid', 'username', 'nasipaddress', 'framedipaddress', 'acctstarttime',
+                      'acctinputoctets', 'acctoutputoctets', 'acctstoptime')
+    
+    # Запас по acctupdatetime для обновлений, зафиксированных позже более новых
+    # (метка берется из самих строк, расхождение часов NAS и БД не важно)
+    ONLINE_UPDATE_OVERLAP = 5
+    
+    def _online_mark(self, cursor) -> tuple:
+        """Метка опроса: последний radacctid и последний acctupdatetime в radacct
+        
+        Оба максимума - поиск последнего ключа индекса; без acctupdatetime в
+        схеме (или пока он не заполнен) - время сервера БД.
+        """
+        if self.schema_version >= ACCT_UPDATES_VERSION:
+            cursor.execute("SELECT ISNULL((SELECT MAX(radacctid) FROM radacct), 0), "
+                           "ISNULL((SELECT MAX(acctupdatetime) FROM radacct), GETDATE())")
+        else:
+            cursor.execute("SELECT ISNULL(MAX(radacctid), 0), GETDATE() FROM radacct")
+        max_id, since = cursor.fetchone()
+        return max_id, since
+    
+    def get_online_sessions(self) -> Tuple[List[tuple], Optional[tuple]]:
+        """Все открытые сессии (acctstoptime IS NULL) и метка для get_session_changes
+        
+        Запрос обслуживается фильтрованным индексом idx_radacct_open.
+        Строки - в порядке ONLINE_COLUMNS.
+        """
+        try:
+            with self._isolated_read('online_sessions') as cursor:
+                max_id, since = self._online_mark(cursor)
+                cursor.execute(
+                    f"SELECT {', '.join(self.ONLINE_COLUMNS)} FROM radacct "
+                    f"WHERE acctstoptime IS NULL AND radacctid <= ?",
+                    (max_id,)
+                )
+                rows = cursor.fetchall()
+            return rows, (max_id, since)
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка получения открытых сессий: {str(e)}")
+            return [], None
+    
+    def get_session_changes(self, mark: tuple) -> Tuple[List[tuple], Optional[tuple]]:
+        """Сессии, начатые или обновленные после метки mark, и новая метка
+        
+        Новые сессии выбираются по radacctid (поиск по первичному ключу),
+        обновленные и закрытые - по acctupdatetime (покрывающий индекс
+        idx_radacct_updates), если в схеме есть эта колонка. Закрытые сессии
+        возвращаются с acctstoptime, чтобы вызывающий убрал их из списка.
+        """
+        last_id, since = mark
+        columns = ', '.join(self.ONLINE_COLUMNS)
+        try:
+            with self._isolated_read('online_sessions') as cursor:
+                max_id, latest = self._online_mark(cursor)
+                
+                query = f"SELECT {columns} FROM radacct WHERE radacctid > ? AND radacctid <= ?"
+                params = [last_id, max_id]
+                if self.schema_version >= ACCT_UPDATES_VERSION:
+                    query += (f" UNION ALL SELECT {columns} FROM radacct "
+                              f"WHERE acctupdatetime >= ? AND radacctid <= ?")
+                    params += [since - timedelta(seconds=self.ONLINE_UPDATE_OVERLAP), last_id]
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            return rows, (max_id, latest)
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка обновления открытых сессий: {str(e)}")
+            return [], None
+    
+    # Зависшие сессии (NAS перезагрузился и не прислал Stop)
+    STALE_TERMINATE_CAUSE = 'Stale-Session'
+    
+    # Последнее известное время сессии: acctupdatetime, а для строк, записанных
+    # до его появления (обновленная схема), - начало плюс acctsessiontime
+    LAST_SEEN = "ISNULL(acctupdatetime, DATEADD(second, ISNULL(acctsessiontime, 0), acctstarttime))"
+    
+    # Сессия зависла, если последнее обновление старше factor интервалов
+    # Interim-Update (acctinterval; если NAS его не передал - interval секунд)
+    STALE_CONDITION = (f"acctstoptime IS NULL AND {LAST_SEEN} < "
+                       f"DATEADD(second, -? * ISNULL(NULLIF(acctinterval, 0), ?), GETDATE())")
+    
+    def _stale_check(self, cursor, nas: str = None) -> bool:
+        """Можно ли искать зависшие сессии: FreeRADIUS заполняет acctupdatetime
+        
+        Если открытые сессии есть, но ни у одной нет acctupdatetime (запросы
+        FreeRADIUS не обновлены после миграции), время последнего обновления
+        неизвестно и живые сессии без промежуточных обновлений выглядели бы
+        зависшими - поиск отказывается работать (текст в last_error).
+        """
+        query = ("SELECT COUNT_BIG(*), COUNT_BIG(acctupdatetime) FROM radacct WHERE acctstoptime IS NULL"
+                 + (" AND nasipaddress = ?" if nas else ""))
+        cursor.execute(query, [nas] if nas else [])
+        open_count, updated = cursor.fetchone()
+        if open_count and not updated:
+            self.last_error = ("Ни у одной открытой сессии нет acctupdatetime: обновите запросы "
+                               "FreeRADIUS (acctupdatetime в Start и Interim-Update)")
+            if self.logger:
+                self.logger.log(f"Поиск зависших сессий пропущен: {self.last_error}")
+            return False
+        return True
+    
+    def stale_sessions(self, factor: int = 3, interval: int = 600,
+                       nas: str = None) -> List[Tuple[str, int, Optional[datetime]]]:
+        """Зависшие сессии по NAS: (nasipaddress, количество, самое старое обновление)
+        
+        Ничего не изменяет (пробный запуск close_stale_sessions).
+        """
+        if self.schema_version < ACCT_UPDATES_VERSION:
+            self.last_error = "В radacct нет acctupdatetime: выполните миграцию схемы (tables migrate)"
+            return []
+        
+        query = (f"SELECT nasipaddress, COUNT_BIG(*), MIN({self.LAST_SEEN}) "
+                 f"FROM radacct WHERE {self.STALE_CONDITION}")
+        params = [factor, interval]
+        if nas:
+            query += " AND nasipaddress = ?"
+            params.append(nas)
+        query += " GROUP BY nasipaddress ORDER BY COUNT_BIG(*) DESC"
+        
+        try:
+            with self._isolated_read('stale_sessions') as cursor:
+                if not self._stale_check(cursor, nas):
+                    return []
+                cursor.execute(query, params)
+                return [tuple(row) for row in cursor.fetchall()]
+        except pyodbc.Error as e:
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка поиска зависших сессий: {str(e)}")
+            return []
+    
+    def close_stale_sessions(self, factor: int = 3, interval: int = 600, nas: str = None,
+                             batch_size: int = 1000, delay: float = 0.5, cancel: threading.Event = None,
+                             progress: Callable[[int, int], None] = None) -> int:
+        """Закрытие зависших сессий порциями (UPDATE TOP (batch_size))
+        
+        Сессия закрывается временем последнего обновления, acctterminatecause
+        = 'Stale-Session'. Закрываются только сессии, начатые до запуска:
+        порции идут до radacctid, максимального на момент старта, поэтому
+        работа конечна и не задевает новые сессии. progress(закрыто, всего).
+        """
+        if self.schema_version < ACCT_UPDATES_VERSION:
+            self.last_error = "В radacct нет acctupdatetime: выполните миграцию схемы (tables migrate)"
+            return 0
+        
+        started = time.perf_counter()
+        closed = 0
+        condition = self.STALE_CONDITION + " AND radacctid <= ?"
+        if nas:
+            condition += " AND nasipaddress = ?"
+        
+        try:
+            cursor = self.conn.cursor()
+            if not self._stale_check(cursor, nas):
+                cursor.close()
+                self.conn.commit()
+                return 0
+            cursor.execute("SELECT ISNULL(MAX(radacctid), 0) FROM radacct")
+            upto_id = cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT_BIG(*) FROM radacct WHERE {condition}",
+                           [factor, interval, upto_id] + ([nas] if nas else []))
+            total = cursor.fetchone()[0]
+            cursor.close()
+            self.conn.commit()
+            
+            params = [batch_size, self.STALE_TERMINATE_CAUSE, factor, interval, upto_id] + ([nas] if nas else [])
+            
+            def work(cursor):
+                cursor.execute(
+                    f"UPDATE TOP (?) radacct SET "
+                    f"acctstoptime = {self.LAST_SEEN}, "
+                    f"acctsessiontime = ISNULL(acctsessiontime, DATEDIFF(second, acctstarttime, {self.LAST_SEEN})), "
+                    f"acctterminatecause = ? WHERE {condition}",
+                    params
+                )
+                return cursor.rowcount
+            
+            while total and not (cancel and cancel.is_set()):
+                count = self._transaction('close_stale_sessions', work, rows=batch_size)
+                closed += count
+                if progress:
+                    progress(closed, max(total, closed))
+                if count < batch_size:
+                    break
+                
+                if delay > 0:
+                    if cancel:
+                        cancel.wait(delay)
+                    else:
+                        time.sleep(delay)
+        
+        except pyodbc.Error as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка закрытия зависших сессий: {str(e)}", operation='close_stale_sessions')
+        
+        if closed and self.logger:
+            self.logger.log(f"Закрыто зависших сессий: {closed}",
+                            operation='close_stale_sessions', duration=time.perf_counter() - started)
+        return closed
+    
+    # Агрегаты radacct (отчеты по трафику и времени)
+    ROLLUP_NAME = 'radacct'
+    
+    def rollup_status(self) -> Tuple[int, int, int]:
+        """(обработано до radacctid, последний radacctid, открытых сессий в ожидании)"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT high_water FROM {ROLLUP_STATE} WHERE name = ?", (self.ROLLUP_NAME,))
+            row = cursor.fetchone()
+            cursor.execute(f"SELECT ISNULL((SELECT MAX(radacctid) FROM radacct), 0), "
+                           f"(SELECT COUNT_BIG(*) FROM {ROLLUP_PENDING})")
+            max_id, pending = cursor.fetchone()
+        finally:
+            cursor.close()
+            self.conn.commit()
+        return (row[0] if row else 0), max_id, pending
+    
+    def update_rollups(self, span: int = 50000, cancel: threading.Event = None,
+                       progress: Callable[[int, int], None] = None) -> int:
+        """Добавление закрытых сессий в таблицы агрегатов (USAGE_ROLLUPS)
+        
+        Порция - диапазон span новых radacctid после сохраненной отметки и
+        сессии из rm_rollup_pending, закрывшиеся с прошлого раза. Открытые
+        сессии диапазона записываются в rm_rollup_pending и учитываются при
+        закрытии, так что долгая или зависшая сессия не задерживает отметку,
+        а каждая сессия учитывается ровно один раз. Отметка читается под
+        блокировкой (UPDLOCK, HOLDLOCK) в транзакции порции: параллельные
+        запуски обрабатывают порции по очереди. progress(обработано до
+        radacctid, последний radacctid). Возвращает число сессий.
+        """
+        if self.schema_version < ROLLUP_PENDING_VERSION:
+            self.last_error = "Нет таблиц агрегатов: выполните миграцию схемы (tables migrate)"
+            return 0
+        
+        started = time.perf_counter()
+        sessions = 0
+        try:
+            while not (cancel and cancel.is_set()):
+                high_water, last_id, count, more = self._transaction(
+                    'update_rollups', lambda cursor: self._rollup_batch(cursor, span))
+                # Строки агрегатов известны только после MERGE
+                self.throttle.charge(count)
+                sessions += count
+                if progress:
+                    progress(high_water, last_id)
+                if not more:
+                    break
+        
+        except pyodbc.Error as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка обновления агрегатов radacct: {str(e)}", operation='update_rollups')
+        
+        if sessions and self.logger:
+            self.logger.log(f"Агрегаты radacct: добавлено {sessions} сессий",
+                            operation='update_rollups', duration=time.perf_counter() - started)
+        return sessions
+    
+    def _rollup_batch(self, cursor, span: int) -> Tuple[int, int, int, bool]:
+        """Порция агрегирования: (отметка, последний radacctid, сессий, есть ли еще работа)"""
+        cursor.execute(f"SELECT high_water FROM {ROLLUP_STATE} WITH (UPDLOCK, HOLDLOCK) WHERE name = ?",
+                       (self.ROLLUP_NAME,))
+        row = cursor.fetchone()
+        low = row[0] if row else 0
+        cursor.execute("SELECT ISNULL(MAX(radacctid), 0) FROM radacct")
+        last_id = cursor.fetchone()[0]
+        high = max(low, min(low + span, last_id))
+        
+        cursor.execute("IF OBJECT_ID('tempdb..#rm_rollup_ids') IS NOT NULL DROP TABLE #rm_rollup_ids")
+        # Закрывшиеся отложенные сессии
+        cursor.execute(
+            f"SELECT TOP (?) p.radacctid, CAST(1 AS BIT) AS closed INTO #rm_rollup_ids FROM {ROLLUP_PENDING} p "
+            f"JOIN radacct r ON r.radacctid = p.radacctid WHERE r.acctstoptime IS NOT NULL",
+            (span,)
+        )
+        closed_pending = cursor.rowcount
+        cursor.execute(f"DELETE p FROM {ROLLUP_PENDING} p JOIN #rm_rollup_ids i ON i.radacctid = p.radacctid")
+        # Открытые сессии, удаленные без закрытия (очистка удаленных пользователей)
+        cursor.execute(f"DELETE p FROM {ROLLUP_PENDING} p "
+                       f"WHERE NOT EXISTS (SELECT * FROM radacct r WHERE r.radacctid = p.radacctid)")
+        
+        # Новый диапазон: состояние каждой строки читается один раз, поэтому
+        # сессия, закрывшаяся во время порции, попадает ровно в одно место
+        cursor.execute(
+            "INSERT INTO #rm_rollup_ids (radacctid, closed) "
+            "SELECT radacctid, IIF(acctstoptime IS NULL, 0, 1) FROM radacct "
+            "WHERE radacctid > ? AND radacctid <= ?",
+            (low, high)
+        )
+        cursor.execute(f"INSERT INTO {ROLLUP_PENDING} (radacctid) SELECT radacctid FROM #rm_rollup_ids "
+                       f"WHERE closed = 0")
+        
+        cursor.execute("IF OBJECT_ID('tempdb..#rm_usage') IS NOT NULL DROP TABLE #rm_usage")
+        # Группа - из записи учета или основная группа пользователя (меньший priority)
+        cursor.execute(
+            "SELECT r.username, ISNULL(r.groupname, g.groupname) AS groupname, r.nasipaddress, "
+            "CAST(ISNULL(r.acctstarttime, r.acctstoptime) AS DATE) AS day, COUNT(*) AS sessions, "
+            "SUM(CAST(ISNULL(r.acctsessiontime, 0) AS BIGINT)) AS session_time, "
+            "SUM(ISNULL(r.acctinputoctets, 0)) AS input_octets, "
+            "SUM(ISNULL(r.acctoutputoctets, 0)) AS output_octets "
+            "INTO #rm_usage FROM #rm_rollup_ids i JOIN radacct r ON r.radacctid = i.radacctid "
+            "OUTER APPLY (SELECT TOP (1) groupname FROM radusergroup "
+            "WHERE username = r.username ORDER BY priority) g "
+            "WHERE i.closed = 1 "
+            "GROUP BY r.username, ISNULL(r.groupname, g.groupname), r.nasipaddress, "
+            "CAST(ISNULL(r.acctstarttime, r.acctstoptime) AS DATE)"
+        )
+        cursor.execute("SELECT ISNULL(SUM(sessions), 0) FROM #rm_usage")
+        sessions = cursor.fetchone()[0]
+        
+        if sessions:
+            for rollup in USAGE_ROLLUPS:
+                cursor.execute(rollup.merge_sql('#rm_usage'))
+        cursor.execute("DROP TABLE #rm_usage")
+        cursor.execute("DROP TABLE #rm_rollup_ids")
+        
+        if row is None:
+            cursor.execute(f"INSERT INTO {ROLLUP_STATE} (name, high_water) VALUES (?, ?)",
+                           (self.ROLLUP_NAME, high))
+        else:
+            cursor.execute(f"UPDATE {ROLLUP_STATE} SET high_water = ?, updated_at = SYSUTCDATETIME() "
+                           f"WHERE name = ?", (high, self.ROLLUP_NAME))
+        return high, last_id, sessions, high < last_id or closed_pending >= span
+    
+    def _rollup_guard(self, open_sessions: bool = False) -> Tuple[str, list]:
+        """Условие для удаления из radacct, не теряющее сессии из агрегатов
+        
+        Если агрегаты ведутся, сначала они обновляются, затем удаление
+        ограничивается учтенными сессиями: radacctid не больше отметки и не
+        в rm_rollup_pending. open_sessions - открытые сессии удалять можно
+        (в агрегаты попадают только закрытые). Возвращает (фрагмент
+        " AND ..." для WHERE по radacct, параметры).
+        """
+        if self.schema_version < ROLLUP_PENDING_VERSION:
+            return '', []
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {ROLLUP_STATE} WHERE name = ?", (self.ROLLUP_NAME,))
+        in_use = cursor.fetchone()[0]
+        cursor.close()
+        self.conn.commit()
+        if not in_use:
+            return '', []
+        
+        self.update_rollups()
+        high_water = self.rollup_status()[0]
+        condition = (f"radacctid <= ? AND NOT EXISTS "
+                     f"(SELECT * FROM {ROLLUP_PENDING} p WHERE p.radacctid = radacct.radacctid)")
+        if open_sessions:
+            condition = f"(acctstoptime IS NULL OR {condition})"
+        return f" AND {condition}", [high_water]
+    
+    def _usage_rollup(self, key: str, monthly: bool) -> Rollup:
+        for rollup in USAGE_ROLLUPS:
+            if rollup.key == key and rollup.monthly == monthly:
+                return rollup
+        raise ValueError(f"Нет агрегатов по {key} ({'месяц' if monthly else 'день'})")
+    
+    def get_user_usage(self, username: str, monthly: bool = False, limit: int = 90) -> List[tuple]:
+        """История использования: (период, сессий, время, входящий, исходящий), новые первыми"""
+        if self.schema_version < USAGE_VERSION:
+            return []
+        rollup = self._usage_rollup('username', monthly)
+        try:
+            with self._isolated_read('user_usage') as cursor:
+                cursor.execute(
+                    f"SELECT TOP (?) period, {', '.join(Rollup.SUMS)} FROM {rollup.table} "
+                    f"WHERE username = ? ORDER BY period DESC",
+                    (limit, username)
+                )
+                return [tuple(row) for row in cursor.fetchall()]
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка получения статистики пользователя {username}: {str(e)}")
+            return []
+    
+    # Сессии пользователя: страницы по индексу (username, acctstarttime DESC)
+    SESSION_COLUMNS = ('radacctid', 'acctstarttime', 'acctstoptime', 'nasipaddress', 'framedipaddress',
+                       'acctsessiontime', 'acctinputoctets', 'acctoutputoctets', 'acctterminatecause')
+    
+    def get_user_sessions(self, username: str, limit: int = 100,
+                          after: Tuple[datetime, int] = None) -> List[tuple]:
+        """Страница истории сессий пользователя (SESSION_COLUMNS), новые первыми
+        
+        Постраничный просмотр по ключу: after - (acctstarttime, radacctid)
+        последней строки предыдущей страницы. Каждая страница - поиск по
+        idx_radacct_username_starttime и limit строк, без OFFSET и подсчета
+        всех сессий пользователя.
+        """
+        query = (f"SELECT TOP (?) {', '.join(self.SESSION_COLUMNS)} FROM radacct "
+                 f"WHERE username = ? AND acctstarttime IS NOT NULL")
+        params = [limit, username]
+        if after is not None:
+            query += " AND (acctstarttime < ? OR (acctstarttime = ? AND radacctid > ?))"
+            params += [after[0], after[0], after[1]]
+        # radacctid по возрастанию - как ключ кластерного индекса в конце индекса,
+        # иначе при равном времени начала SQL Server сортирует весь диапазон
+        query += " ORDER BY acctstarttime DESC, radacctid"
+        
+        try:
+            with self._isolated_read('user_sessions') as cursor:
+                cursor.execute(query, params)
+                return [tuple(row) for row in cursor.fetchall()]
+        except pyodbc.Error as e:
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка получения сессий пользователя {username}: {str(e)}")
+            return []
+    
+    def top_talkers(self, start: date, end: date, by: str = 'username', limit: int = 20,
+                    monthly: bool = False) -> List[tuple]:
+        """Топ по трафику за периоды [start, end): (ключ, сессий, время, входящий, исходящий)
+        
+        by - username, groupname или nasipaddress; monthly - по месячным
+        агрегатам (start и end - первые числа месяцев).
+        """
+        if self.schema_version < USAGE_VERSION:
+            self.last_error = "Нет таблиц агрегатов: выполните миграцию схемы (tables migrate)"
+            return []
+        rollup = self._usage_rollup(by, monthly)
+        sums = ', '.join(f"SUM({column})" for column in Rollup.SUMS)
+        try:
+            with self._isolated_read('top_talkers') as cursor:
+                cursor.execute(
+                    f"SELECT TOP (?) {by}, {sums} FROM {rollup.table} "
+                    f"WHERE period >= ? AND period < ? GROUP BY {by} "
+                    f"ORDER BY SUM(input_octets) + SUM(output_octets) DESC",
+                    (limit, start, end)
+                )
+                return [tuple(row) for row in cursor.fetchall()]
+        except pyodbc.Error as e:
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка построения топа по трафику: {str(e)}")
+            return []
+    
+    # Счетчики квот (sqlcounter)
+    QUOTA_STATE = 'quota'
+    QUOTA_KEEP_DAYS = 62
+    QUOTA_KEEP_MONTHS = 13
+    
+    # Сессии, которые могли измениться с прошлого обновления: открытые,
+    # новые (radacctid после отметки) и учтенные открытыми ранее
+    QUOTA_COLUMNS = ("r.radacctid, ISNULL(r.username, '') AS username, CAST(r.acctstarttime AS DATE) AS day, "
+                     "IIF(r.acctstoptime IS NULL, 0, 1) AS closed, "
+                     "CAST(ISNULL(r.acctsessiontime, 0) AS BIGINT) AS session_time, "
+                     "ISNULL(r.acctinputoctets, 0) AS input_octets, ISNULL(r.acctoutputoctets, 0) AS output_octets")
+    
+    MONTH_START = PERIOD_START[MONTHLY]
+    
+    def update_quota_counters(self) -> int:
+        """Обновление счетчиков rm_quota_counter по новым данным radacct
+        
+        В счетчики текущих суток и месяца прибавляется прирост времени и
+        трафика с прошлого обновления - к периоду, в котором он замечен, так
+        что сессия через полночь или начало месяца учитывается в обоих
+        периодах. Для открытых сессий учтенные значения хранятся в
+        rm_quota_session, закрытые сессии учитываются один раз. Объем работы
+        пропорционален числу открытых и новых сессий, а не размеру radacct.
+        Возвращает число пользователей, счетчики которых изменились.
+        """
+        if self.schema_version < QUOTA_VERSION:
+            self.last_error = "Нет таблиц квот: выполните миграцию схемы (tables migrate)"
+            return 0
+        
+        started = time.perf_counter()
+        try:
+            users = self._transaction('update_quota_counters', self._update_quota)
+            self.throttle.charge(users)
+        
+        except pyodbc.Error as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка обновления счетчиков квот: {str(e)}", operation='update_quota_counters')
+            return 0
+        
+        if users and self.logger:
+            self.logger.log(f"Счетчики квот: обновлено пользователей {users}",
+                            operation='update_quota_counters', duration=time.perf_counter() - started)
+        return users
+    
+    def _update_quota(self, cursor) -> int:
+        # Отметка под блокировкой до конца транзакции: параллельное обновление ждет
+        cursor.execute(f"SELECT high_water, updated_at FROM {ROLLUP_STATE} WITH (UPDLOCK, HOLDLOCK) "
+                       f"WHERE name = ?", (self.QUOTA_STATE,))
+        state = cursor.fetchone()
+        cursor.execute("SELECT ISNULL(MAX(radacctid), 0) FROM radacct")
+        upto = cursor.fetchone()[0]
+        if state is None:
+            # Первый запуск: сессии текущего месяца (по индексу acctstarttime) -
+            # в дни своего начала, более ранние открытые только запоминаются
+            cursor.execute(f"SELECT ISNULL(MIN(radacctid), ? + 1) - 1 FROM radacct "
+                           f"WHERE acctstarttime >= {self.MONTH_START}", (upto,))
+            high_water = cursor.fetchone()[0]
+            bucket = f"ISNULL(q.day, {PERIOD_START[DAILY]})"
+        else:
+            high_water = state[0]
+            bucket = PERIOD_START[DAILY]
+        
+        cursor.execute("IF OBJECT_ID('tempdb..#rm_quota') IS NOT NULL DROP TABLE #rm_quota")
+        cursor.execute("IF OBJECT_ID('tempdb..#rm_quota_delta') IS NOT NULL DROP TABLE #rm_quota_delta")
+        cursor.execute(
+            f"SELECT * INTO #rm_quota FROM ("
+            f"SELECT {self.QUOTA_COLUMNS} FROM radacct r WHERE r.acctstoptime IS NULL AND r.radacctid <= ? "
+            f"UNION SELECT {self.QUOTA_COLUMNS} FROM radacct r WHERE r.radacctid > ? AND r.radacctid <= ? "
+            f"UNION SELECT {self.QUOTA_COLUMNS} FROM rm_quota_session s JOIN radacct r ON r.radacctid = s.radacctid"
+            f") q",
+            (upto, high_water, upto)
+        )
+        # Прирост с прошлого обновления (отрицательный - сброс счетчиков NAS - не учитывается).
+        # Старая сессия, которой нет в rm_quota_session, только запоминается: ее
+        # накопленные значения не относятся к текущему периоду
+        deltas = ', '.join(
+            f"SUM(IIF(s.radacctid IS NULL AND q.radacctid <= ?, 0, "
+            f"IIF(q.{column} > ISNULL(s.{column}, 0), q.{column} - ISNULL(s.{column}, 0), 0))) AS {column}"
+            for column in ('session_time', 'input_octets', 'output_octets'))
+        cursor.execute(
+            f"SELECT q.username, {bucket} AS day, {deltas} INTO #rm_quota_delta FROM #rm_quota q "
+            f"LEFT JOIN rm_quota_session s ON s.radacctid = q.radacctid GROUP BY q.username, {bucket}",
+            (high_water,) * 3
+        )
+        cursor.execute("SELECT COUNT(DISTINCT username) FROM #rm_quota_delta "
+                       "WHERE session_time > 0 OR input_octets > 0 OR output_octets > 0")
+        users = cursor.fetchone()[0]
+        for period, period_start in ((DAILY, "day"), (MONTHLY, "DATEFROMPARTS(YEAR(day), MONTH(day), 1)")):
+            cursor.execute(
+                f"MERGE {COUNTER_TABLE} WITH (HOLDLOCK) AS t "
+                f"USING (SELECT username, {period_start} AS period_start, SUM(session_time) AS session_time, "
+                f"SUM(input_octets) AS input_octets, SUM(output_octets) AS output_octets "
+                f"FROM #rm_quota_delta GROUP BY username, {period_start}) AS d "
+                f"ON t.username = d.username AND t.period = ? AND t.period_start = d.period_start "
+                f"WHEN MATCHED THEN UPDATE SET t.session_time = t.session_time + d.session_time, "
+                f"t.input_octets = t.input_octets + d.input_octets, t.output_octets = t.output_octets + d.output_octets "
+                f"WHEN NOT MATCHED THEN INSERT (username, period, period_start, session_time, input_octets, output_octets) "
+                f"VALUES (d.username, ?, d.period_start, d.session_time, d.input_octets, d.output_octets);",
+                (period, period)
+            )
+        
+        # Учтенные значения: открытые запоминаются (и после смены суток или месяца -
+        # прирост идет в новый период), закрытые и удаленные из radacct забываются
+        cursor.execute(
+            "MERGE rm_quota_session AS t USING (SELECT * FROM #rm_quota WHERE closed = 0) AS s "
+            "ON t.radacctid = s.radacctid "
+            "WHEN MATCHED THEN UPDATE SET "
+            "t.session_time = IIF(s.session_time > t.session_time, s.session_time, t.session_time), "
+            "t.input_octets = IIF(s.input_octets > t.input_octets, s.input_octets, t.input_octets), "
+            "t.output_octets = IIF(s.output_octets > t.output_octets, s.output_octets, t.output_octets) "
+            "WHEN NOT MATCHED THEN INSERT (radacctid, day, session_time, input_octets, output_octets) "
+            "VALUES (s.radacctid, ISNULL(s.day, CAST(GETDATE() AS DATE)), s.session_time, s.input_octets, "
+            "s.output_octets);"
+        )
+        cursor.execute("DELETE t FROM rm_quota_session t JOIN #rm_quota q ON q.radacctid = t.radacctid "
+                       "WHERE q.closed = 1")
+        cursor.execute("DELETE t FROM rm_quota_session t "
+                       "WHERE NOT EXISTS (SELECT 1 FROM radacct r WHERE r.radacctid = t.radacctid)")
+        cursor.execute("DROP TABLE #rm_quota")
+        cursor.execute("DROP TABLE #rm_quota_delta")
+        
+        # Старые периоды удаляются раз в сутки
+        if state is None or state[1].date() != datetime.utcnow().date():
+            cursor.execute(f"DELETE FROM {COUNTER_TABLE} WHERE period_start < DATEADD(month, ?, {self.MONTH_START})",
+                           (-self.QUOTA_KEEP_MONTHS,))
+            cursor.execute(f"DELETE FROM {COUNTER_TABLE} WHERE period = ? "
+                           f"AND period_start < DATEADD(day, ?, CAST(GETDATE() AS DATE))",
+                           (DAILY, -self.QUOTA_KEEP_DAYS))
+        
+        if state is None:
+            cursor.execute(f"INSERT INTO {ROLLUP_STATE} (name, high_water) VALUES (?, ?)",
+                           (self.QUOTA_STATE, upto))
+        else:
+            cursor.execute(f"UPDATE {ROLLUP_STATE} SET high_water = ?, updated_at = SYSUTCDATETIME() "
+                           f"WHERE name = ?", (upto, self.QUOTA_STATE))
+        return users
+    
+    def get_quota_counters(self, username: str) -> List[tuple]:
+        """Счетчики текущих суток и месяца: (период, начало, время, входящий, исходящий)"""
+        if self.schema_version < QUOTA_VERSION:
+            return []
+        try:
+            with self._isolated_read('quota_counters', listing=False) as cursor:
+                cursor.execute(
+                    f"SELECT period, period_start, session_time, input_octets, output_octets FROM {COUNTER_TABLE} "
+                    f"WHERE username = ? AND ((period = ? AND period_start = {PERIOD_START[DAILY]}) "
+                    f"OR (period = ? AND period_start = {PERIOD_START[MONTHLY]}))",
+                    (username, DAILY, MONTHLY)
+                )
+                return [tuple(row) for row in cursor.fetchall()]
+        except pyodbc.Error as e:
+            if self.logger:
+                self.logger.log(f"Ошибка получения счетчиков квот {username}: {str(e)}")
+            return []
+    
+    def set_quota(self, names: List[str], check_name: str, value: Optional[str], owner: str = 'user') -> bool:
+        """Установка лимита квоты (check-атрибута) пользователям или группам одной транзакцией
+        
+        value=None - снять лимит. Прежнее значение атрибута заменяется.
+        """
+        table, key = ('radcheck', 'username') if owner == 'user' else ('radgroupcheck', 'groupname')
+        started = time.perf_counter()
+        
+        def work(cursor):
+            cursor.fast_executemany = True
+            cursor.executemany(f"DELETE FROM {table} WHERE {key} = ? AND attribute = ?",
+                               [(name, check_name) for name in names])
+            if value is not None:
+                cursor.executemany(f"INSERT INTO {table} ({key}, attribute, op, value) VALUES (?, ?, ':=', ?)",
+                                   [(name, check_name, value) for name in names])
+        
+        try:
+            self._transaction('set_quota', work, rows=len(names) * (2 if value is not None else 1))
+            
+            if self.logger:
+                action = f"= {value}" if value is not None else "снят"
+                self.logger.log(f"Квота {check_name} {action}: {len(names)} ({owner})", operation='set_quota',
+                                duration=time.perf_counter() - started)
+            return True
+            
+        except pyodbc.Error as e:
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка установки квоты {check_name}: {str(e)}")
+            return False
+    
+    # Загрузка detail-файлов FreeRADIUS (учет, накопленный при недоступной БД)
+    NAS_REBOOT_CAUSE = 'NAS-Reboot'
+    DETAIL_COLUMNS = tuple(column for column in COLUMN_NAMES if column != 'has_start')
+    
+    # Слияние порции с radacct по acctuniqueid - как запросы FreeRADIUS к radacct:
+    # Start задает время начала, Interim-Update/Stop обновляют счетчики (большие
+    # значения выигрывают, так что порядок файлов и повторная загрузка не важны)
+    DETAIL_MERGE = (
+        "MERGE radacct WITH (HOLDLOCK) AS t USING #rm_detail AS s ON t.acctuniqueid = s.acctuniqueid "
+        "WHEN MATCHED THEN UPDATE SET "
+        "t.acctstarttime = IIF(s.has_start = 1 OR t.acctstarttime IS NULL, s.acctstarttime, t.acctstarttime), "
+        "t.acctinterval = IIF(s.acctupdatetime > t.acctupdatetime, "
+        "DATEDIFF(second, t.acctupdatetime, s.acctupdatetime), ISNULL(t.acctinterval, s.acctinterval)), "
+        "t.acctupdatetime = IIF(t.acctupdatetime IS NULL OR s.acctupdatetime > t.acctupdatetime, "
+        "s.acctupdatetime, t.acctupdatetime), "
+        "t.acctstoptime = ISNULL(s.acctstoptime, t.acctstoptime), "
+        "t.acctsessiontime = IIF(s.acctsessiontime > ISNULL(t.acctsessiontime, -1), s.acctsessiontime, t.acctsessiontime), "
+        "t.acctinputoctets = IIF(s.acctinputoctets > ISNULL(t.acctinputoctets, -1), s.acctinputoctets, t.acctinputoctets), "
+        "t.acctoutputoctets = IIF(s.acctoutputoctets > ISNULL(t.acctoutputoctets, -1), s.acctoutputoctets, t.acctoutputoctets), "
+        "t.acctterminatecause = ISNULL(s.acctterminatecause, t.acctterminatecause), "
+        "t.connectinfo_start = ISNULL(t.connectinfo_start, s.connectinfo_start), "
+        "t.connectinfo_stop = ISNULL(s.connectinfo_stop, t.connectinfo_stop), "
+        "t.framedipaddress = ISNULL(s.framedipaddress, t.framedipaddress) "
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(DETAIL_COLUMNS)}) "
+        f"VALUES ({', '.join('s.' + column for column in DETAIL_COLUMNS)});"
+    )
+    
+    def load_detail(self, path: str, batch_size: int = 1000, restart: bool = False,
+                    cancel: threading.Event = None,
+                    progress: Callable[[int, int], None] = None) -> Tuple[int, int, int]:
+        """Загрузка detail-файла в radacct порциями по batch_size записей
+        
+        События одной сессии (acctuniqueid) внутри порции сливаются, порция
+        применяется одним MERGE через временную таблицу, Accounting-On/Off
+        закрывают открытые сессии NAS. После каждой порции смещение в файле
+        сохраняется в контрольной точке (<файл>.checkpoint): прерванная
+        загрузка продолжается с нее, restart - загрузка с начала файла.
+        progress(прочитано байт, размер файла).
+        Возвращает (записей, сессий, пропущено записей).
+        """
+        if self.schema_version < DETAIL_VERSION:
+            self.last_error = "Нет индекса radacct по acctuniqueid: выполните миграцию схемы (tables migrate)"
+            return 0, 0, 0
+        
+        started = time.perf_counter()
+        detail = DetailFile(path)
+        records = sessions = skipped = 0
+        batch: Dict[str, tuple] = {}
+        nas_events: List[tuple] = []
+        pending = 0
+        
+        try:
+            if restart:
+                detail.clear_checkpoint()
+            offset = detail.load_checkpoint()
+            size = os.path.getsize(path)
+            
+            for position, header, attributes in detail.records(offset):
+                records += 1
+                pending += 1
+                event = accounting_event(header, attributes)
+                if event is None:
+                    skipped += 1
+                elif event[0] == 'nas':
+                    nas_events.append(event[1])
+                else:
+                    row = event[1]
+                    batch[row[0]] = merge_session(batch.get(row[0]), row)
+                
+                if pending >= batch_size:
+                    sessions += self._load_detail_batch(list(batch.values()), nas_events)
+                    detail.save_checkpoint(position)
+                    batch, nas_events, pending = {}, [], 0
+                    if progress:
+                        progress(position, size)
+                    if cancel and cancel.is_set():
+                        break
+            
+            if pending:
+                sessions += self._load_detail_batch(list(batch.values()), nas_events)
+                detail.save_checkpoint(position)
+                if progress:
+                    progress(position, size)
+        
+        except (OSError, pyodbc.Error) as e:
+            self._rollback()
+            self.last_error = str(e)
+            if self.logger:
+                self.logger.log(f"Ошибка загрузки detail-файла {path}: {str(e)}", operation='load_detail')
+        
+        if records and self.logger:
+            self.logger.log(f"Загружен detail-файл {path}: записей {records}, сессий {sessions}, "
+                            f"пропущено {skipped}", operation='load_detail',
+                            duration=time.perf_counter() - started)
+        return records, sessions, skipped
+    
+    def _load_detail_batch(self, rows: List[tuple], nas_events: List[tuple]) -> int:
+        """Одна порция detail-файла одной транзакцией"""
+        def work(cursor):
+            cursor.execute("IF OBJECT_ID('tempdb..#rm_detail') IS NOT NULL DROP TABLE #rm_detail")
+            cursor.execute(stage_ddl('#rm_detail'))
+            if rows:
+                cursor.fast_executemany = True
+                cursor.executemany(
+                    f"INSERT INTO #rm_detail ({', '.join(COLUMN_NAMES)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMN_NAMES)})",
+                    rows
+                )
+                cursor.execute(self.DETAIL_MERGE)
+            
+            # Перезагрузка NAS: открытые сессии, начатые до нее, закрываются ее временем
+            for nas, moment, _status in nas_events:
+                cursor.execute(
+                    "UPDATE radacct SET acctstoptime = ?, "
+                    "acctsessiontime = DATEDIFF(second, acctstarttime, ?), acctterminatecause = ? "
+                    "WHERE nasipaddress = ? AND acctstoptime IS NULL AND acctstarttime <= ?",
+                    (moment, moment, self.NAS_REBOOT_CAUSE, nas, moment)
+                )
+            cursor.execute("DROP TABLE #rm_detail")
+            return len(rows)
+        
+        return self._transaction('load_detail', work, rows=len(rows) + len(nas_events))
\ No newline at end of file
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Разбор detail-файлов FreeRADIUS (буфер учета на время недоступности БД)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+# Колонки промежуточной таблицы загрузки (типы как в radacct) и признак
+# того, что время начала взято из записи Start (а не вычислено)
+STAGE_COLUMNS = (
+    ('acctuniqueid', 'NVARCHAR(32) NOT NULL PRIMARY KEY'),
+    ('acctsessionid', 'NVARCHAR(64) NOT NULL'),
+    ('username', 'NVARCHAR(64)'),
+    ('realm', 'NVARCHAR(64)'),
+    ('nasipaddress', 'NVARCHAR(15) NOT NULL'),
+    ('nasportid', 'NVARCHAR(15)'),
+    ('nasporttype', 'NVARCHAR(32)'),
+    ('acctstarttime', 'DATETIME'),
+    ('acctupdatetime', 'DATETIME'),
+    ('acctstoptime', 'DATETIME'),
+    ('acctsessiontime', 'INT'),
+    ('acctinterval', 'INT'),
+    ('acctauthentic', 'NVARCHAR(32)'),
+    ('connectinfo_start', 'NVARCHAR(50)'),
+    ('connectinfo_stop', 'NVARCHAR(50)'),
+    ('acctinputoctets', 'BIGINT'),
+    ('acctoutputoctets', 'BIGINT'),
+    ('calledstationid', 'NVARCHAR(50)'),
+    ('callingstationid', 'NVARCHAR(50)'),
+    ('acctterminatecause', 'NVARCHAR(32)'),
+    ('servicetype', 'NVARCHAR(32)'),
+    ('framedprotocol', 'NVARCHAR(32)'),
+    ('framedipaddress', 'NVARCHAR(15)'),
+    ('has_start', 'BIT NOT NULL'),
+)
+
+COLUMN_NAMES = tuple(name for name, _ in STAGE_COLUMNS)
+
+# Длины строковых колонок: длинные значения обрезаются, а не ломают порцию
+TEXT_SIZES = {name: int(re.search(r'\((\d+)\)', sql_type).group(1))
+              for name, sql_type in STAGE_COLUMNS if sql_type.startswith('NVARCHAR')}
+
+# Счетчики: при слиянии событий одной сессии берется большее значение
+COUNTERS = ('acctsessiontime', 'acctinputoctets', 'acctoutputoctets')
+
+HEADER_FORMAT = '%a %b %d %H:%M:%S %Y'
+
+# Атрибуты RADIUS -> колонки radacct (строковые значения как есть)
+TEXT_ATTRIBUTES = {
+    'User-Name': 'username',
+    'Realm': 'realm',
+    'NAS-Port-Id': 'nasportid',
+    'NAS-Port-Type': 'nasporttype',
+    'Acct-Authentic': 'acctauthentic',
+    'Called-Station-Id': 'calledstationid',
+    'Calling-Station-Id': 'callingstationid',
+    'Service-Type': 'servicetype',
+    'Framed-Protocol': 'framedprotocol',
+    'Framed-IP-Address': 'framedipaddress',
+}
+
+class DetailFile:
+    """detail-файл с контрольной точкой рядом (<файл>.checkpoint)
+    
+    Файл читается через mmap построчно, в памяти - только текущая запись,
+    поэтому размер файла не ограничен. Контрольная точка хранит смещение
+    после последней загруженной записи и inode файла: после сбоя чтение
+    продолжается с нее, замененный файл читается с начала. Незавершенная
+    запись в конце (FreeRADIUS еще пишет файл) не читается.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+    
+    def records(self, offset: int = 0) -> Iterator[Tuple[int, Optional[str], Dict[str, str]]]:
+        """Записи файла с offset: (смещение после записи, заголовок-дата, атрибуты)"""
+        size = os.path.getsize(self.path)
+        if offset >= size:
+            return
+        
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = offset
+            header, attributes = None, {}
+            while pos < size:
+                start = pos
+                end = mm.find(b'\n', pos, size)
+                if end < 0:
+                    # Последняя строка без перевода строки - запись не дописана
+                    return
+                line = mm[pos:end].rstrip(b'\r')
+                pos = end + 1
+                
+                if not line.strip():
+                    if header is not None or attributes:
+                        yield pos, header, attributes
+                        header, attributes = None, {}
+                elif line[:1] in (b'\t', b' '):
+                    name, sep, value = line.strip().partition(b' = ')
+                    if sep:
+                        attributes[name.decode('utf-8', 'replace')] = parse_value(value.decode('utf-8', 'replace'))
+                else:
+                    # Заголовок следующей записи без пустой строки перед ним
+                    if header is not None or attributes:
+                        yield start, header, attributes
+                        attributes = {}
+                    header = line.decode('utf-8', 'replace')
+    
+    def load_checkpoint(self) -> int:
+        """Смещение для продолжения чтения (0 - с начала)"""
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        
+        stat = os.stat(self.path)
+        if checkpoint.get('inode') != stat.st_ino or checkpoint.get('offset', 0) > stat.st_size:
+            return 0
+        return checkpoint['offset']
+    
+    def save_checkpoint(self, offset: int):
+        """Запись контрольной точки (атомарно, через временный файл)"""
+        with open(self.checkpoint_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset, 'inode': os.stat(self.path).st_ino}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+    
+    def clear_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+def stage_ddl(table: str) -> str:
+    """CREATE TABLE промежуточной таблицы (временной, #...)"""
+    columns = ',\n'.join(f"    {name} {sql_type}" for name, sql_type in STAGE_COLUMNS)
+    return f"CREATE TABLE {table} (\n{columns}\n)"
+
+def parse_value(raw: str) -> str:
+    """Значение атрибута: строка в кавычках с экранированием или как есть"""
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return raw
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _octets(attributes: Dict[str, str], direction: str) -> Optional[int]:
+    octets = _int(attributes.get(f'Acct-{direction}-Octets'))
+    if octets is None:
+        return None
+    return ((_int(attributes.get(f'Acct-{direction}-Gigawords')) or 0) << 32) + octets
+
+def unique_id(attributes: Dict[str, str]) -> str:
+    """acctuniqueid как в политике acct_unique FreeRADIUS (md5 ключевых атрибутов)"""
+    if attributes.get('Acct-Unique-Session-Id'):
+        return attributes['Acct-Unique-Session-Id'][:32]
+    key = ','.join((
+        attributes.get('User-Name', ''),
+        attributes.get('Acct-Session-Id', ''),
+        attributes.get('NAS-IPv6-Address') or attributes.get('NAS-IP-Address', ''),
+        attributes.get('NAS-Identifier', ''),
+        attributes.get('NAS-Port-Id', ''),
+        attributes.get('NAS-Port', ''),
+    ))
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+def event_time(header: Optional[str], attributes: Dict[str, str]) -> Optional[datetime]:
+    """Время события по местным часам (как GETDATE() в запросах к radacct)"""
+    timestamp = _int(attributes.get('Timestamp'))
+    if timestamp is not None:
+        moment = datetime.fromtimestamp(timestamp)
+    elif header:
+        try:
+            moment = datetime.strptime(' '.join(header.split()), HEADER_FORMAT)
+        except ValueError:
+            return None
+    else:
+        return None
+    return moment - timedelta(seconds=_int(attributes.get('Acct-Delay-Time')) or 0)
+
+def accounting_event(header: Optional[str], attributes: Dict[str, str]) -> Optional[Tuple[str, tuple]]:
+    """Запись учета -> ('session', строка COLUMN_NAMES) или ('nas', (NAS, время, тип))
+    
+    None - запись не относится к сессиям, неполна или адрес NAS (IPv6)
+    не помещается в nasipaddress.
+    """
+    status = attributes.get('Acct-Status-Type')
+    moment = event_time(header, attributes)
+    nas = attributes.get('NAS-IP-Address') or attributes.get('NAS-IPv6-Address')
+    if status is None or moment is None or nas is None:
+        return None
+    # Адрес IPv6 длиннее nasipaddress radacct: обрезанный адрес
+    # совпал бы с чужим NAS, поэтому запись пропускается
+    if len(nas) > TEXT_SIZES['nasipaddress']:
+        return None
+    
+    if status in ('Accounting-On', 'Accounting-Off'):
+        return 'nas', (nas, moment, status)
+    if status not in ('Start', 'Interim-Update', 'Alive', 'Stop') or 'Acct-Session-Id' not in attributes:
+        return None
+    
+    row = dict.fromkeys(COLUMN_NAMES)
+    for attribute, column in TEXT_ATTRIBUTES.items():
+        row[column] = attributes.get(attribute)
+    row.update(
+        acctuniqueid=unique_id(attributes),
+        acctsessionid=attributes['Acct-Session-Id'],
+        nasipaddress=nas,
+        acctupdatetime=moment,
+        has_start=0,
+    )
+    
+    if status == 'Start':
+        row.update(acctstarttime=moment, acctinterval=0, has_start=1,
+                   connectinfo_start=attributes.get('Connect-Info'))
+    else:
+        session_time = _int(attributes.get('Acct-Session-Time'))
+        row.update(
+            acctsessiontime=session_time,
+            acctinputoctets=_octets(attributes, 'Input'),
+            acctoutputoctets=_octets(attributes, 'Output'),
+            acctstarttime=moment - timedelta(seconds=session_time or 0),
+        )
+        if status == 'Stop':
+            row.update(acctstoptime=moment, acctterminatecause=attributes.get('Acct-Terminate-Cause'),
+                       connectinfo_stop=attributes.get('Connect-Info'))
+    
+    for column, size in TEXT_SIZES.items():
+        if row[column] is not None:
+            row[column] = row[column][:size]
+    return 'session', tuple(row[column] for column in COLUMN_NAMES)
+
+def merge_session(current: Optional[tuple], event: tuple) -> tuple:
+    """Слияние событий одной сессии внутри порции (порядок событий любой)"""
+    if current is None:
+        return event
+    merged = dict(zip(COLUMN_NAMES, current))
+    new = dict(zip(COLUMN_NAMES, event))
+    
+    for column, value in new.items():
+        if value is None:
+            continue
+        if column in COUNTERS:
+            merged[column] = max(value, merged[column] or 0)
+        elif column == 'acctstarttime':
+            if new['has_start'] or not merged['has_start']:
+                merged[column] = value if new['has_start'] or merged[column] is None else min(value, merged[column])
+        elif column == 'acctupdatetime':
+            if value > merged[column]:
+                merged['acctinterval'] = int((value - merged[column]).total_seconds())
+                merged[column] = value
+        elif column == 'has_start':
+            merged[column] = max(value, merged[column])
+        elif column != 'acctinterval':
+            merged[column] = value
+    return tuple(merged[column] for column in COLUMN_NAMES)
@@ -6,6 +6,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from typing import Optional, Tuple
+from quota import QUOTA_COUNTERS, QuotaCounter
 
 class PasswordDialog:
     """Диалог для изменения пароля"""
@@ -261,4 +262,71 @@ class BulkPasswordDialog:
     def show(self) -> Optional[str]:
         """Показать диалог и вернуть результат"""
         self.parent.wait_window(self.dialog)
+        return self.result
+
+class QuotaDialog:
+    """Диалог установки квоты (лимита sqlcounter) для пользователей или групп"""
+    
+    def __init__(self, parent, title: str, target: str):
+        self.parent = parent
+        self.result = None
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title(title)
+        self.dialog.geometry("400x230")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        
+        ttk.Label(self.dialog, text=target, font=('Arial', 10, 'bold')).pack(pady=10)
+        
+        ttk.Label(self.dialog, text="Квота:").pack(anchor=tk.W, padx=20)
+        self.counter_var = tk.StringVar(value=QUOTA_COUNTERS[0].title)
+        ttk.Combobox(self.dialog, textvariable=self.counter_var,
+                     values=[counter.title for counter in QUOTA_COUNTERS],
+                     width=30, state="readonly").pack(anchor=tk.W, padx=20, pady=(5, 0))
+        
+        ttk.Label(self.dialog, text="Лимит (пусто - снять лимит):").pack(anchor=tk.W, padx=20, pady=(10, 0))
+        self.value_var = tk.StringVar()
+        self.value_entry = ttk.Entry(self.dialog, textvariable=self.value_var, width=20)
+        self.value_entry.pack(anchor=tk.W, padx=20, pady=(5, 0))
+        
+        btn_frame = ttk.Frame(self.dialog)
+        btn_frame.pack(pady=20)
+        
+        ttk.Button(btn_frame, text="Сохранить", command=self._save, width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Отмена", command=self.dialog.destroy, width=15).pack(side=tk.LEFT, padx=5)
+        
+        self._center_dialog()
+        self.value_entry.focus_set()
+    
+    def _center_dialog(self):
+        """Центрирование диалогового окна"""
+        self.dialog.update_idletasks()
+        x = self.parent.winfo_x() + (self.parent.winfo_width() // 2) - (self.dialog.winfo_width() // 2)
+        y = self.parent.winfo_y() + (self.parent.winfo_height() // 2) - (self.dialog.winfo_height() // 2)
+        self.dialog.geometry(f"+{x}+{y}")
+    
+    def _save(self):
+        """Проверка и сохранение лимита"""
+        counter = next(c for c in QUOTA_COUNTERS if c.title == self.counter_var.get())
+        text = self.value_var.get().strip().replace(',', '.')
+        
+        value = None
+        if text:
+            try:
+                amount = float(text)
+            except ValueError:
+                messagebox.showerror("Ошибка", "Лимит должен быть числом!")
+                return
+            if amount <= 0:
+                messagebox.showerror("Ошибка", "Лимит должен быть больше нуля!")
+                return
+            value = counter.to_value(amount)
+        
+        self.result = (counter, value)
+        self.dialog.destroy()
+    
+    def show(self) -> Optional[Tuple[QuotaCounter, Optional[str]]]:
+        """Показать диалог и вернуть (квота, значение атрибута или None)"""
+        self.parent.wait_window(self.dialog)
         return self.result
\ No newline at end of file
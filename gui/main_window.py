@@ -3,10 +3,14 @@
 Главное окно приложения
 """
 
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk
 from config import ConfigManager
 from database import DatabaseManager
+from maintenance import AccountingCleaner
+from supervisor import ConnectionSupervisor
 from utils.logger import Logger
 from gui.widgets import ToolBar, StatusBar
 from gui.tabs.connection_tab import ConnectionTab
@@ -14,21 +18,75 @@ from gui.tabs.users_tab import UsersTab
 from gui.tabs.add_user_tab import AddUserTab
 from gui.tabs.groups_tab import GroupsTab
 from gui.tabs.bulk_tab import BulkTab
+from gui.tabs.online_tab import OnlineTab
 
 class RadiusManagerMainWindow:
     """Главное окно управления RADIUS пользователями"""
     
+    # Вкладки, которые создаются при первом открытии: атрибут -> заголовок
+    LAZY_TABS = (
+        ('users_tab', "Пользователи"),
+        ('add_user_tab', "Добавить пользователя"),
+        ('groups_tab', "Группы"),
+        ('bulk_tab', "Массовые операции"),
+        ('online_tab', "Онлайн"),
+    )
+    
+    # Данные, необходимые каждой вкладке
+    TAB_DATA = {
+        'users_tab': ('users', 'groups'),
+        'add_user_tab': ('groups',),
+        'groups_tab': ('groups',),
+        'bulk_tab': ('groups',),
+        'online_tab': (),
+    }
+    
+    FETCH_POLL_MS = 50
+    CONNECTION_POLL_MS = 200
+    CLEANUP_POLL_MS = 1000
+    
     def __init__(self, root):
+        started = time.perf_counter()
         self.root = root
         self.root.title("RADIUS User Manager v2.0 - MSSQL")
         
+        # Время этапов запуска (выводится в лог)
+        self.startup_timings = {}
+        
         # Инициализация компонентов
         self.config_manager = ConfigManager()
         self.logger = Logger()
         self.db = DatabaseManager(logger=self.logger)
         
+        # Подключение и переподключение выполняются в фоновом потоке
+        self.supervisor = ConnectionSupervisor(self.db, self.logger)
+        self.db.on_connection_lost = self.supervisor.connection_lost
+        self._select_users_on_connect = False
+        
+        # Очистка radacct удаленных пользователей в окне обслуживания
+        self.cleaner = AccountingCleaner(self.db, self.logger)
+        self._cleanup_active = False
+        
+        # Фоновая загрузка данных: пользователи и группы параллельно
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch")
+        self._futures = {}
+        self._fetched = {}
+        self._stale_tabs = set()
+        self._fetch_started = None
+        
         # Получаем конфигурацию
         self.config = self.config_manager.get_application_config()
+        self.startup_timings['конфигурация'] = time.perf_counter() - started
+        
+        # Запись лога в файл (фоновым потоком)
+        if self.config.log_file:
+            self.logger.enable_file_log(
+                self.config.log_path(),
+                max_bytes=self.config.log_max_bytes,
+                backup_count=self.config.log_backup_count,
+                rotate_when=self.config.log_rotate_when,
+                json_lines=self.config.log_json
+            )
         
         # Устанавливаем размер окна
         self.root.geometry(f"{self.config.window_width}x{self.config.window_height}")
@@ -38,10 +96,21 @@ class RadiusManagerMainWindow:
         self.setup_styles()
         
         # Создаем интерфейс
+        step = time.perf_counter()
         self.create_widgets()
+        self.startup_timings['интерфейс'] = time.perf_counter() - step
         
-        # Автоподключение
+        # Автоподключение (в фоне, окно не блокируется)
+        step = time.perf_counter()
         self.auto_connect()
+        self.startup_timings['автоподключение'] = time.perf_counter() - step
+        self.startup_timings['всего'] = time.perf_counter() - started
+        self.logger.log("Запуск: " + self._format_timings(self.startup_timings))
+        
+        # Прием изменений состояния подключения и прогресса очистки
+        self.root.after(self.CONNECTION_POLL_MS, self._poll_connection)
+        self.root.after(int(self.supervisor.ping_interval * 1000), self._ping_connection)
+        self.root.after(self.CLEANUP_POLL_MS, self._poll_cleanup)
         
         # Обработка закрытия окна
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -97,6 +166,7 @@ class RadiusManagerMainWindow:
         
         # Устанавливаем первую вкладку активной
         self.notebook.select(0)
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
     
     def create_toolbar(self, parent):
         """Панель инструментов"""
@@ -115,7 +185,11 @@ class RadiusManagerMainWindow:
             toolbar.add_button(**button_info)
     
     def create_tabs(self):
-        """Создание всех вкладок"""
+        """Создание вкладок
+        
+        Сразу создается только вкладка подключения, для остальных добавляются
+        пустые фреймы, а сама вкладка строится при первом открытии.
+        """
         # Вкладка подключения
         self.connection_tab = ConnectionTab(
             self.notebook, 
@@ -125,38 +199,159 @@ class RadiusManagerMainWindow:
         )
         self.notebook.add(self.connection_tab.frame, text="Подключение")
         
-        # Вкладка пользователей
-        self.users_tab = UsersTab(
-            self.notebook,
-            self.db,
-            self.logger,
-            self.status_bar
-        )
-        self.notebook.add(self.users_tab.frame, text="Пользователи")
+        self.users_tab = None
+        self.add_user_tab = None
+        self.groups_tab = None
+        self.bulk_tab = None
+        self.online_tab = None
         
-        # Вкладка добавления пользователя
-        self.add_user_tab = AddUserTab(
-            self.notebook,
-            self.db,
-            self.logger
-        )
-        self.notebook.add(self.add_user_tab.frame, text="Добавить пользователя")
+        # Заглушки остальных вкладок: путь фрейма -> атрибут вкладки
+        self._placeholders = {}
+        self._tab_frames = {}
+        for attribute, title in self.LAZY_TABS:
+            placeholder = ttk.Frame(self.notebook)
+            self.notebook.add(placeholder, text=title)
+            self._placeholders[str(placeholder)] = attribute
+            self._tab_frames[attribute] = placeholder
         
-        # Вкладка групп
-        self.groups_tab = GroupsTab(
-            self.notebook,
-            self.db,
-            self.logger
-        )
-        self.notebook.add(self.groups_tab.frame, text="Группы")
+    def _build_tab(self, attribute: str):
+        """Создание вкладки при первом открытии"""
+        if getattr(self, attribute) is not None:
+            return getattr(self, attribute)
         
-        # Вкладка массовых операций
-        self.bulk_tab = BulkTab(
-            self.notebook,
-            self.db,
-            self.logger
-        )
-        self.notebook.add(self.bulk_tab.frame, text="Массовые операции")
+        placeholder = self._tab_frames[attribute]
+        
+        started = time.perf_counter()
+        if attribute == 'users_tab':
+            tab = UsersTab(placeholder, self.db, self.logger, self.status_bar)
+        elif attribute == 'add_user_tab':
+            tab = AddUserTab(placeholder, self.db, self.logger)
+        elif attribute == 'groups_tab':
+            tab = GroupsTab(placeholder, self.db, self.logger)
+        elif attribute == 'online_tab':
+            tab = OnlineTab(placeholder, self.db, self.logger)
+        else:
+            tab = BulkTab(placeholder, self.db, self.logger,
+                          selected_users=self._selected_users,
+                          users_changed=self._on_users_changed)
+        tab.frame.pack(fill=tk.BOTH, expand=True)
+        setattr(self, attribute, tab)
+        
+        self.logger.log(f"Вкладка '{self.notebook.tab(placeholder, 'text')}' создана "
+                        f"за {time.perf_counter() - started:.3f} с")
+        return tab
+    
+    def _selected_users(self) -> list:
+        """Пользователи, выбранные на вкладке "Пользователи" (для массовых действий)"""
+        return self.users_tab.get_selected_users() if self.users_tab is not None else []
+    
+    def _on_users_changed(self):
+        """Перезагрузка списка пользователей после массовой операции"""
+        if self.users_tab is not None and self.db.connection_status:
+            self.users_tab.load_users()
+    
+    def _visible_tab(self):
+        """Атрибут открытой вкладки (None - вкладка подключения)"""
+        return self._placeholders.get(self.notebook.select())
+    
+    def _on_tab_changed(self, event=None):
+        """Создание и заполнение вкладки при ее открытии"""
+        attribute = self._visible_tab()
+        if attribute is None:
+            return
+        self._build_tab(attribute)
+        self._fill_visible_tab()
+    
+    def _fill_visible_tab(self):
+        """Заполнение открытой вкладки данными, если они устарели
+        
+        Используются данные фоновой загрузки; если загрузка не удалась,
+        вкладка загружает данные сама.
+        """
+        attribute = self._visible_tab()
+        if attribute not in self._stale_tabs or getattr(self, attribute) is None:
+            return
+        
+        needed = self.TAB_DATA[attribute]
+        if any(name in self._futures for name in needed):
+            # Дождемся фоновой загрузки
+            return
+        
+        self._stale_tabs.discard(attribute)
+        tab = getattr(self, attribute)
+        groups = self._fetched.get('groups')
+        
+        if attribute == 'users_tab':
+            store = self._fetched.pop('users', None)
+            if store is not None:
+                tab.show_users(store, groups)
+            else:
+                tab.load_users()
+        elif attribute == 'groups_tab':
+            tab.load_groups(groups)
+        elif attribute == 'online_tab':
+            tab.refresh(full=True)
+        else:
+            tab.update_groups(groups)
+    
+    def start_background_fetch(self):
+        """Параллельная загрузка пользователей и групп в фоновых потоках
+        
+        Каждый поток использует отдельное подключение; результаты передаются
+        вкладкам в потоке Tk при их открытии.
+        """
+        if self._futures:
+            return
+        
+        self._fetched = {}
+        self._stale_tabs = set(self.TAB_DATA)
+        self._fetch_started = time.perf_counter()
+        self._futures = {
+            'users': self.executor.submit(self._fetch, lambda db: db.get_user_store()),
+            'groups': self.executor.submit(self._fetch, lambda db: db.get_groups()),
+        }
+        self.root.after(self.FETCH_POLL_MS, self._poll_fetch)
+    
+    def _fetch(self, load):
+        """Загрузка данных через отдельное подключение (выполняется в фоновом потоке)"""
+        started = time.perf_counter()
+        worker = self.db.spawn()
+        if worker is None:
+            raise RuntimeError("Не удалось открыть подключение для загрузки данных")
+        try:
+            return load(worker), time.perf_counter() - started
+        finally:
+            worker.close()
+    
+    def _poll_fetch(self):
+        """Прием результатов фоновой загрузки в потоке Tk"""
+        timings = {}
+        for name, future in list(self._futures.items()):
+            if not future.done():
+                continue
+            del self._futures[name]
+            try:
+                self._fetched[name], timings[name] = future.result()
+            except Exception as e:
+                self.logger.log(f"Ошибка фоновой загрузки ({name}): {str(e)}")
+        
+        self._fill_visible_tab()
+        
+        if timings:
+            labels = {'users': 'пользователи', 'groups': 'группы'}
+            self.logger.log("Загрузка данных: " + self._format_timings(
+                {labels[name]: duration for name, duration in timings.items()}
+            ))
+        
+        if self._futures:
+            self.root.after(self.FETCH_POLL_MS, self._poll_fetch)
+        else:
+            self.logger.log(f"Данные обновлены за {time.perf_counter() - self._fetch_started:.3f} с")
+    
+    @staticmethod
+    def _format_timings(timings: dict) -> str:
+        """Форматирование времени этапов: 'этап 0.123 с, ...'"""
+        return ", ".join(f"{name} {duration:.3f} с" for name, duration in timings.items())
     
     def auto_connect(self):
         """Автоподключение к БД при запуске"""
@@ -165,40 +360,112 @@ class RadiusManagerMainWindow:
             self.connect_db()
     
     def connect_db(self):
-        """Подключение к базе данных"""
-        if self.connection_tab.connect():
+        """Подключение к базе данных
+        
+        Соединение открывает ConnectionSupervisor в фоновом потоке: при
+        неудаче он повторяет попытки с экспоненциальной задержкой, а после
+        подключения периодически проверяет связь через свое соединение.
+        Основное соединение подключается здесь, в потоке Tk.
+        """
+        try:
+            config = self.connection_tab.apply_settings()
+        except Exception as e:
+            self.logger.log(f"Ошибка подключения: {str(e)}")
+            return
+        
+        self.supervisor.ping_interval = max(1, config.ping_interval)
+        self.supervisor.max_delay = max(self.supervisor.initial_delay, config.reconnect_max_delay)
+        self._select_users_on_connect = True
+        
+        self.status_bar.set_connection_status(False, reconnecting=True)
+        self.logger.log("Подключение к базе данных...")
+        self.supervisor.start(config)
+    
+    def _poll_connection(self):
+        """Обработка изменений состояния подключения в потоке Tk"""
+        for event in self.supervisor.poll_events():
+            self._on_connection_event(event)
+        self.root.after(self.CONNECTION_POLL_MS, self._poll_connection)
+    
+    def _ping_connection(self):
+        """Проверка основного соединения в потоке Tk (при обрыве - переподключение через контроль)"""
+        if self.supervisor.state == ConnectionSupervisor.CONNECTED and self.db.connection_status:
+            self.db.ping()
+        self.root.after(int(self.supervisor.ping_interval * 1000), self._ping_connection)
+    
+    def _on_connection_event(self, event):
+        """Отображение состояния подключения"""
+        if event.state == ConnectionSupervisor.CONNECTED:
+            # Соединение открыто в фоновом потоке, а используется только здесь
+            if not self.db.attach(self.supervisor.config, event.connection):
+                self.status_bar.set_connection_status(False, reconnecting=True)
+                self.supervisor.reconnect()
+                return
             self.status_bar.set_connection_status(True)
             self.logger.log("Успешное подключение к базе данных")
             
             # Обновляем данные во вкладках
             self.refresh_all()
+            self.cleaner.start(self.db.config.acct_cleanup_window)
             
-            # Переключаемся на вкладку пользователей
-            self.notebook.select(1)
+            # После ручного подключения переключаемся на вкладку пользователей
+            if self._select_users_on_connect:
+                self._select_users_on_connect = False
+                self.notebook.select(1)
+        
+        elif event.state in (ConnectionSupervisor.CONNECTING, ConnectionSupervisor.RECONNECTING):
+            if event.state == ConnectionSupervisor.RECONNECTING:
+                # Связь потеряна: до нового соединения вкладки не обращаются к БД
+                self.db.connection_status = False
+            self.status_bar.set_connection_status(False, reconnecting=True)
+        
+        elif event.state == ConnectionSupervisor.WAITING:
+            self.status_bar.set_connection_status(False, reconnecting=True)
+            self.status_bar.set_status(
+                f"Нет подключения к БД (попытка {event.attempt}), повтор через {event.retry_in:.0f} с"
+            )
+        
         else:
             self.status_bar.set_connection_status(False)
-            self.logger.log("Не удалось подключиться к базе данных")
+    
+    def _poll_cleanup(self):
+        """Прогресс фоновой очистки radacct в строке статуса"""
+        active, deleted, total = self.cleaner.progress()
+        if active:
+            self.status_bar.set_status(f"Очистка radacct удаленных пользователей: {deleted} из {total}")
+        elif self._cleanup_active:
+            self.status_bar.set_status(f"Очистка radacct завершена: удалено {deleted}")
+        self._cleanup_active = active
+        self.root.after(self.CLEANUP_POLL_MS, self._poll_cleanup)
     
     def disconnect_db(self):
         """Отключение от базы данных"""
+        self.supervisor.stop()
+        self.cleaner.stop()
+        self._select_users_on_connect = False
         if self.db.disconnect():
             self.status_bar.set_connection_status(False)
             self.logger.log("Отключено от базы данных")
             
             # Очищаем данные во вкладках
-            self.users_tab.clear_users()
-            self.groups_tab.clear_groups()
+            self._stale_tabs.clear()
+            self._fetched = {}
+            if self.users_tab is not None:
+                self.users_tab.clear_users()
+            if self.groups_tab is not None:
+                self.groups_tab.clear_groups()
+            if self.online_tab is not None:
+                self.online_tab.clear()
         else:
             self.logger.log("Ошибка отключения от базы данных")
     
     def refresh_all(self):
-        """Обновление всех данных"""
+        """Обновление всех данных
+        
+        Данные загружаются в фоне, а вкладки заполняются при открытии.
+        """
         if self.db.connection_status:
-            self.users_tab.load_users()
-            self.groups_tab.load_groups()
-            self.add_user_tab.update_groups()   # Добавлено
-            self.bulk_tab.update_groups()       # Добавлено
-            self.logger.log("Данные обновлены")
+            self.start_background_fetch()
         else:
             self.logger.log("Нет подключения к БД. Подключитесь сначала.")
     
@@ -210,6 +477,10 @@ class RadiusManagerMainWindow:
         """Обработка закрытия окна"""
         import tkinter.messagebox as messagebox
         if messagebox.askokcancel("Выход", "Вы уверены, что хотите выйти?"):
+            self.supervisor.stop()
+            self.cleaner.stop()
+            if self.online_tab is not None:
+                self.online_tab.close()
             if self.db.conn:
                 try:
                     self.db.disconnect()
@@ -217,6 +488,8 @@ class RadiusManagerMainWindow:
                 except:
                     pass
             
+            self.executor.shutdown(wait=False)
+            self.logger.stop()
             self.root.destroy()
     
     def update_connection_status(self, connected: bool):
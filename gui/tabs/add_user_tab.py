@@ -9,7 +9,8 @@ import random
 import string
 from datetime import datetime, timedelta
 from tkcalendar import Calendar  # Импортируем Calendar вместо DateEntry
-from database import User, Attribute
+from typing import List
+from database import User, Group, Attribute
 from utils.helpers import generate_password
 
 class AddUserTab:
@@ -226,11 +227,12 @@ class AddUserTab:
         """Очистка поля даты - РАБОТАЕТ ГАРАНТИРОВАННО"""
         self.expiration_var.set("")
     
-    def _load_groups(self):
-        """Загрузка списка групп из БД"""
+    def _load_groups(self, groups: List[Group] = None):
+        """Загрузка списка групп из БД (groups - уже загруженный в фоне список)"""
         try:
-            if self.db.connection_status:
-                groups = self.db.get_groups()
+            if groups is not None or self.db.connection_status:
+                if groups is None:
+                    groups = self.db.get_groups()
                 if groups:
                     group_names = [group.name for group in groups if group.name and not group.name.startswith('_group_')]
                     
@@ -457,6 +459,6 @@ class AddUserTab:
 """
         self.attrs_text.insert(1.0, hint)
     
-    def update_groups(self):
+    def update_groups(self, groups: List[Group] = None):
         """Обновление списка групп"""
-        self._load_groups()
\ No newline at end of file
+        self._load_groups(groups)
\ No newline at end of file
@@ -5,19 +5,34 @@
 
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
-import csv
 import random
 import string
-from typing import List
-from database import User, Attribute
+from typing import Callable, List
+from database import User, Group, Attribute, read_users_csv
+from jobs import ChunkSizer, Job, format_duration, write_error_report
+from gui.dialogs import PasswordDialog
 
 class BulkTab:
-    """Вкладка для массовых операций"""
+    """Вкладка для массовых операций
     
-    def __init__(self, parent, db_manager, logger):
+    Массовые действия применяются к пользователям, выбранным на вкладке
+    "Пользователи" (selected_users), и выполняются фоновыми задачами Job,
+    как и массовое добавление. После изменений вызывается users_changed.
+    """
+    
+    # Пользователей в порции массового действия (каждый - своя транзакция)
+    ACTION_CHUNK_SIZE = 50
+    
+    def __init__(self, parent, db_manager, logger,
+                 selected_users: Callable[[], List[str]] = None,
+                 users_changed: Callable[[], None] = None):
         self.parent = parent
         self.db = db_manager
         self.logger = logger
+        self.selected_users = selected_users or (lambda: [])
+        self.users_changed = users_changed
+        self.job = None
+        self._job_verb = "добавлено"
         
         self.frame = ttk.Frame(parent)
         self._create_widgets()
@@ -43,6 +58,13 @@ class BulkTab:
                                   width=12)
         self.group_combo.pack(side=tk.LEFT, padx=5)
         
+        # Число параллельных подключений записи (разделы по хэшу имени)
+        ttk.Label(settings_frame, text="Потоков записи:").pack(side=tk.LEFT, padx=(10, 5))
+        writers = self.db.config.bulk_writers if self.db.config else 1
+        self.bulk_writers = tk.IntVar(value=writers)
+        ttk.Spinbox(settings_frame, from_=1, to=16, textvariable=self.bulk_writers,
+                    width=4, state='readonly').pack(side=tk.LEFT, padx=5)
+        
         # Текстовое поле для ввода
         input_frame = ttk.Frame(bulk_frame)
         input_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -78,6 +100,23 @@ class BulkTab:
         ttk.Button(btn_frame, text="Сгенерировать пользователей", 
                   command=self._generate_users).pack(side=tk.LEFT, padx=5)
         
+        # Прогресс выполнения фоновой задачи
+        progress_frame = ttk.Frame(bulk_frame)
+        progress_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, maximum=100, mode='determinate')
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 10))
+        
+        self.cancel_btn = ttk.Button(progress_frame, text="Отмена", 
+                                     command=self._cancel_job, state='disabled')
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        self.report_btn = ttk.Button(progress_frame, text="Отчет об ошибках", 
+                                     command=self._save_job_report, state='disabled')
+        self.report_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.progress_label = ttk.Label(bulk_frame, text="")
+        self.progress_label.pack(anchor=tk.W, padx=5, pady=(5, 0))
+        
         # Фрейм для массовых действий
         actions_frame = ttk.LabelFrame(self.frame, text="Массовые действия", padding=15)
         actions_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -92,11 +131,12 @@ class BulkTab:
                   command=self._bulk_delete, 
                   style='Danger.TButton').pack(side=tk.LEFT, padx=5)
     
-    def update_groups(self):
-        """Обновление списка групп в комбобоксе"""
-        if self.db.connection_status:
+    def update_groups(self, groups: List[Group] = None):
+        """Обновление списка групп в комбобоксе (groups - уже загруженный в фоне список)"""
+        if groups is not None or self.db.connection_status:
             try:
-                groups = self.db.get_groups()
+                if groups is None:
+                    groups = self.db.get_groups()
                 group_names = [group.name for group in groups]
                 
                 if group_names:
@@ -202,29 +242,7 @@ class BulkTab:
             f"Добавить {len(users)} пользователей?"):
             return
         
-        added = 0
-        errors = []
-        
-        for user, extra_attrs in users:
-            try:
-                if self.db.add_user(user, extra_attrs):
-                    added += 1
-                else:
-                    errors.append(f"{user.username}: ошибка добавления")
-            except Exception as e:
-                errors.append(f"{user.username}: {str(e)}")
-        
-        if errors:
-            error_msg = "\n".join(errors[:10])
-            if len(errors) > 10:
-                error_msg += f"\n... и еще {len(errors) - 10} ошибок"
-            
-            self.logger.log(f"Массовое добавление: {len(errors)} ошибок")
-            messagebox.showerror("Ошибки при добавлении", error_msg)
-        
-        if added > 0:
-            self.logger.log(f"Массовое добавление: {added} пользователей")
-            messagebox.showinfo("Успех", f"Добавлено пользователей: {added}")
+        if self._start_job("Массовое добавление", users):
             self._clear_bulk()
     
     def _import_csv(self):
@@ -243,87 +261,174 @@ class BulkTab:
         
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                
-                # Пропускаем заголовок, если есть
-                try:
-                    header = next(reader)
-                except StopIteration:
-                    header = []
-                
-                users = []
-                errors = []
-                
-                for i, row in enumerate(reader, 2 if header else 1):
-                    if len(row) < 2:
-                        errors.append(f"Строка {i}: недостаточно данных")
-                        continue
-                    
-                    username = row[0].strip()
-                    password = row[1].strip()
-                    group = row[2].strip() if len(row) > 2 else self.bulk_group.get()
-                    
-                    if not username or not password:
-                        errors.append(f"Строка {i}: отсутствует имя пользователя или пароль")
-                        continue
-                    
-                    user = User(
-                        username=username,
-                        password=password,
-                        group=group
-                    )
-                    
-                    # Дополнительные поля
-                    if len(row) > 3 and row[3].strip():
-                        user.expiration = row[3].strip()
-                    
-                    users.append(user)
-                
-                if errors:
-                    error_msg = "\n".join(errors[:10])
-                    if len(errors) > 10:
-                        error_msg += f"\n... и еще {len(errors) - 10} ошибок"
-                    
-                    self.logger.log(f"Импорт CSV: {len(errors)} ошибок")
-                    messagebox.showerror("Ошибки импорта", error_msg)
-                    return
-                
-                if not users:
-                    messagebox.showwarning("Внимание", "Нет данных для импорта!")
-                    return
-                
-                # Подтверждение
-                if not messagebox.askyesno("Подтверждение", 
-                    f"Импортировать {len(users)} пользователей?"):
-                    return
-                
-                added = 0
-                import_errors = []
-                
-                for user in users:
-                    try:
-                        if self.db.add_user(user):
-                            added += 1
-                        else:
-                            import_errors.append(f"{user.username}: ошибка добавления")
-                    except Exception as e:
-                        import_errors.append(f"{user.username}: {str(e)}")
-                
-                if import_errors:
-                    error_msg = "\n".join(import_errors[:10])
-                    if len(import_errors) > 10:
-                        error_msg += f"\n... и еще {len(import_errors) - 10} ошибок"
-                    
-                    self.logger.log(f"Импорт CSV: {len(import_errors)} ошибок")
-                    messagebox.showerror("Ошибки импорта", error_msg)
-                
-                if added > 0:
-                    self.logger.log(f"Импорт CSV: {added} пользователей")
-                    messagebox.showinfo("Успех", f"Импортировано пользователей: {added}")
-        
+                users, errors = read_users_csv(f, self.bulk_group.get())
         except Exception as e:
             self.logger.log(f"Ошибка импорта CSV: {str(e)}")
             messagebox.showerror("Ошибка", f"Не удалось импортировать файл:\n{str(e)}")
+            return
+        
+        if errors:
+            self.logger.log(f"Импорт CSV: {len(errors)} ошибок")
+            self._show_errors("Ошибки импорта", errors)
+            return
+        
+        if not users:
+            messagebox.showwarning("Внимание", "Нет данных для импорта!")
+            return
+        
+        # Подтверждение
+        if not messagebox.askyesno("Подтверждение", 
+            f"Импортировать {len(users)} пользователей?"):
+            return
+        
+        self._start_job("Импорт CSV", [(user, None) for user in users])
+    
+    def _start_job(self, name: str, users: list) -> bool:
+        """Запуск фонового добавления пользователей с прогрессом и отменой"""
+        # Строк одного пользователя в таблице: до трех в radcheck,
+        # в radreply - таймауты и дополнительные атрибуты
+        extra_count = max((len(extra_attrs or []) for _, extra_attrs in users), default=0)
+        sizer = ChunkSizer(rows_per_item=max(3, 2 + extra_count))
+        
+        return self._run_job(name, users, self._add_users_chunk, "добавлено",
+                             label=lambda item: item[0].username, sizer=sizer)
+    
+    def _run_job(self, name: str, items: list, process, verb: str,
+                 label: Callable = str, sizer: ChunkSizer = None,
+                 chunk_size: int = 100) -> bool:
+        """Запуск фоновой задачи с прогрессом и отменой (verb - итог для сводки)"""
+        if self.job and self.job.is_running():
+            messagebox.showwarning("Внимание", "Дождитесь завершения текущей операции!")
+            return False
+        
+        self.job = Job(
+            name,
+            items,
+            process,
+            self.db,
+            chunk_size=chunk_size,
+            label=label,
+            sizer=sizer,
+            writers=self.bulk_writers.get()
+        )
+        self._job_verb = verb
+        self.job.start()
+        
+        self.logger.log(f"{name}: запущено для {len(items)} пользователей")
+        self.cancel_btn.config(state='normal')
+        self.report_btn.config(state='disabled')
+        self._poll_job()
+        return True
+    
+    @staticmethod
+    def _add_users_chunk(db, chunk) -> list:
+        """Добавление порции пользователей одной транзакцией (в фоновом потоке)"""
+        return db.add_users_batch(chunk)
+    
+    @staticmethod
+    def _each_user(action: Callable) -> Callable:
+        """Обработчик порции для Job: action(db, username) -> bool по каждому имени"""
+        def process(db, chunk) -> list:
+            results = []
+            for username in chunk:
+                db.last_error = ''
+                if action(db, username):
+                    results.append(None)
+                else:
+                    results.append(db.last_error or "ошибка операции")
+            return results
+        return process
+    
+    def _poll_job(self):
+        """Периодическое обновление прогресса задачи"""
+        job = self.job
+        if job is None:
+            return
+        
+        progress = job.progress()
+        self.progress_bar['value'] = progress.percent
+        self.progress_label.config(text=(
+            f"{job.name}: {progress.done}/{progress.total} "
+            f"(ошибок: {progress.failed}) | {progress.rate:.1f} строк/с | "
+            f"порция: {progress.chunk_size} | осталось: {format_duration(progress.eta)}"
+        ))
+        
+        if job.is_running():
+            self.frame.after(250, self._poll_job)
+        else:
+            self._on_job_finished(job, progress)
+    
+    def _on_job_finished(self, job: Job, progress):
+        """Завершение задачи: итоги и отчет об ошибках"""
+        self.cancel_btn.config(state='disabled')
+        self.report_btn.config(state='normal' if job.errors else 'disabled')
+        
+        summary = (f"{job.name}: {self._job_verb} {progress.succeeded}, ошибок {len(job.errors)}, "
+                   f"время {format_duration(progress.elapsed)}")
+        if job.metrics:
+            self.logger.log(f"{job.name}: {job.metrics.summary()}")
+        self.logger.log(f"{job.name}: {job.chunk_summary()}")
+        if progress.retries:
+            summary += f", повторов после временных ошибок {progress.retries}"
+        if progress.state == Job.CANCELLED:
+            summary += f" (отменено, обработано {progress.done} из {progress.total})"
+        self.logger.log(summary)
+        
+        if progress.succeeded and self.users_changed:
+            self.users_changed()
+        
+        if job.errors:
+            if messagebox.askyesno("Ошибки выполнения", 
+                f"{summary}\n\nСохранить полный отчет об ошибках?"):
+                self._save_job_report()
+        else:
+            messagebox.showinfo("Готово", summary)
+    
+    def _cancel_job(self):
+        """Отмена текущей задачи на границе порции"""
+        if self.job and self.job.is_running():
+            self.job.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.logger.log(f"{self.job.name}: запрошена отмена")
+    
+    def _save_job_report(self):
+        """Сохранение полного отчета об ошибках задачи"""
+        if not self.job or not self.job.errors:
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="Сохранить отчет об ошибках",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            count = self.job.write_report(file_path)
+            self.logger.log(f"Отчет об ошибках сохранен: {file_path} ({count})")
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить отчет:\n{str(e)}")
+    
+    def _show_errors(self, title: str, errors: List[str]):
+        """Показ первых ошибок с возможностью сохранить полный список"""
+        error_msg = "\n".join(errors[:10])
+        if len(errors) > 10:
+            error_msg += f"\n... и еще {len(errors) - 10} ошибок"
+        
+        if not messagebox.askyesno(title, f"{error_msg}\n\nСохранить полный список ошибок?"):
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="Сохранить список ошибок",
+            defaultextension=".txt",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if file_path:
+            try:
+                write_error_report(file_path, errors)
+            except OSError as e:
+                messagebox.showerror("Ошибка", f"Не удалось сохранить список:\n{str(e)}")
     
     def _export_csv(self):
         """Экспорт пользователей в CSV файл"""
@@ -355,24 +460,70 @@ class BulkTab:
         """Массовая разблокировка выбранных пользователей"""
         self._bulk_toggle_block(False)
     
+    def _selected_for_action(self) -> List[str]:
+        """Пользователи, выбранные на вкладке "Пользователи" (с проверками)"""
+        if not self.db.connection_status:
+            messagebox.showerror("Ошибка", "Нет подключения к БД!")
+            return []
+        
+        usernames = self.selected_users()
+        if not usernames:
+            messagebox.showwarning("Внимание", 
+                "Выберите пользователей в таблице на вкладке 'Пользователи'!")
+        return usernames
+    
     def _bulk_toggle_block(self, block: bool):
         """Массовая блокировка/разблокировка пользователей"""
-        # Этот метод должен вызываться из главного окна с передачей списка пользователей
-        # В текущей реализации он требует интеграции с вкладкой пользователей
-        messagebox.showinfo("Информация", 
-            "Эта функция должна быть вызвана из вкладки 'Пользователи'.\n"
-            "Выберите пользователей в таблице пользователей и используйте контекстное меню.")
+        usernames = self._selected_for_action()
+        if not usernames:
+            return
+        
+        action = "Блокировать" if block else "Разблокировать"
+        if not messagebox.askyesno("Подтверждение", 
+            f"{action} {len(usernames)} пользователей?"):
+            return
+        
+        self._run_job(
+            "Массовая блокировка" if block else "Массовая разблокировка",
+            usernames,
+            self._each_user(lambda db, username: db.block_user(username, block)),
+            "заблокировано" if block else "разблокировано",
+            chunk_size=self.ACTION_CHUNK_SIZE
+        )
     
     def _bulk_change_password(self):
         """Массовое изменение пароля выбранных пользователей"""
-        # Этот метод также требует интеграции с вкладкой пользователей
-        messagebox.showinfo("Информация", 
-            "Эта функция должна быть вызвана из вкладки 'Пользователи'.\n"
-            "Выберите пользователей в таблице пользователей и используйте контекстное меню.")
+        usernames = self._selected_for_action()
+        if not usernames:
+            return
+        
+        new_password = PasswordDialog(self.parent, "Изменить пароль", 
+                                      f"Пользователей: {len(usernames)}").show()
+        if not new_password:
+            return
+        
+        self._run_job(
+            "Массовая смена пароля",
+            usernames,
+            self._each_user(lambda db, username: db.update_user_password(username, new_password)),
+            "изменено",
+            chunk_size=self.ACTION_CHUNK_SIZE
+        )
     
     def _bulk_delete(self):
         """Массовое удаление выбранных пользователей"""
-        # Этот метод также требует интеграции с вкладкой пользователей
-        messagebox.showinfo("Информация", 
-            "Эта функция должна быть вызвана из вкладки 'Пользователи'.\n"
-            "Выберите пользователей в таблице пользователей и используйте контекстное меню.")
\ No newline at end of file
+        usernames = self._selected_for_action()
+        if not usernames:
+            return
+        
+        if not messagebox.askyesno("Подтверждение", 
+            f"Удалить {len(usernames)} пользователей?\nЭто действие нельзя отменить!"):
+            return
+        
+        self._run_job(
+            "Массовое удаление",
+            usernames,
+            self._each_user(lambda db, username: db.delete_user(username)),
+            "удалено",
+            chunk_size=self.ACTION_CHUNK_SIZE
+        )
\ No newline at end of file
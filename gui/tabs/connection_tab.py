@@ -223,22 +223,25 @@ Trusted Connection (без имени/пароля)."""
             self._load_config()
             self.logger.log("Настройки восстановлены по умолчанию")
     
+    def apply_settings(self):
+        """Перенос настроек из полей ввода в конфигурацию БД"""
+        self.config_manager.update_database_config(
+            driver=self.conn_entries['driver'].get(),
+            server=self.conn_entries['server'].get(),
+            port=self.conn_entries['port'].get(),
+            database=self.conn_entries['database'].get(),
+            username=self.conn_entries['username'].get(),
+            password=self.conn_entries['password'].get(),
+            trusted_connection=self.trusted_var.get(),
+            encrypt=self.encrypt_var.get()
+        )
+        return self.config_manager.get_database_config()
+    
     def connect(self):
         """Подключение к базе данных"""
         try:
             # Обновляем конфиг из полей ввода
-            self.config_manager.update_database_config(
-                driver=self.conn_entries['driver'].get(),
-                server=self.conn_entries['server'].get(),
-                port=self.conn_entries['port'].get(),
-                database=self.conn_entries['database'].get(),
-                username=self.conn_entries['username'].get(),
-                password=self.conn_entries['password'].get(),
-                trusted_connection=self.trusted_var.get(),
-                encrypt=self.encrypt_var.get()
-            )
-            
-            config = self.config_manager.get_database_config()
+            config = self.apply_settings()
             
             if self.db_manager.connect(config):
                 return True
@@ -5,8 +5,11 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
+from typing import List
 from database import Group, Attribute
-from gui.dialogs import GroupDialog, AttributeDialog
+from models import TableModel, text_key, int_key
+from gui.dialogs import GroupDialog, AttributeDialog, QuotaDialog
+from gui.widgets import VirtualTreeview
 
 class GroupsTab:
     """Вкладка для управления группами"""
@@ -18,6 +21,16 @@ class GroupsTab:
         
         self.frame = ttk.Frame(parent)
         self.selected_group = None
+        
+        # Модель таблицы групп с кэшированными ключами сортировки
+        self.groups_model = TableModel(
+            ('name', 'user_count', 'default_priority'),
+            sort_keys={
+                'name': text_key,
+                'user_count': int_key,
+                'default_priority': int_key,
+            }
+        )
         self._create_widgets()
     
     def _create_widgets(self):
@@ -38,6 +51,8 @@ class GroupsTab:
                   command=self._add_group).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Удалить выбранную", 
                   command=self._delete_group).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Квота...", 
+                  command=self._set_quota).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Обновить список", 
                   command=self.load_groups).pack(side=tk.LEFT, padx=5)
         
@@ -46,7 +61,13 @@ class GroupsTab:
         table_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ('name', 'user_count', 'default_priority')
-        self.groups_tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=15)
+        self.groups_tree = VirtualTreeview(
+            table_frame,
+            self.groups_model,
+            columns=columns,
+            show='headings',
+            height=15
+        )
         
         self.groups_tree.heading('name', text='Имя группы')
         self.groups_tree.heading('user_count', text='Пользователей')
@@ -56,9 +77,10 @@ class GroupsTab:
         self.groups_tree.column('user_count', width=100)
         self.groups_tree.column('default_priority', width=120)
         
-        vsb = ttk.Scrollbar(table_frame, orient="vertical", command=self.groups_tree.yview)
+        vsb = ttk.Scrollbar(table_frame, orient="vertical")
         hsb = ttk.Scrollbar(table_frame, orient="horizontal", command=self.groups_tree.xview)
-        self.groups_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.groups_tree.attach_scrollbar(vsb)
+        self.groups_tree.configure(xscrollcommand=hsb.set)
         
         self.groups_tree.grid(row=0, column=0, sticky='nsew')
         vsb.grid(row=0, column=1, sticky='ns')
@@ -68,7 +90,7 @@ class GroupsTab:
         table_frame.grid_rowconfigure(0, weight=1)
         
         # Привязываем событие выбора группы
-        self.groups_tree.bind('<<TreeviewSelect>>', self._on_group_selected)
+        self.groups_tree.bind('<<RowsSelected>>', self._on_group_selected)
         
         # Информация о группах
         self.groups_info_label = ttk.Label(left_frame, text="Всего групп: 0")
@@ -183,30 +205,26 @@ class GroupsTab:
         self.attr_stats_label = ttk.Label(right_frame, text="Check: 0 | Reply: 0")
         self.attr_stats_label.pack(side=tk.BOTTOM, anchor=tk.W, pady=(10, 0))
     
-    def load_groups(self):
-        """Загрузка списка групп из БД"""
-        if not self.db.connection_status:
+    def load_groups(self, groups: List[Group] = None):
+        """Загрузка списка групп из БД (groups - уже загруженный в фоне список)"""
+        if groups is None and not self.db.connection_status:
             self.logger.log("Нет подключения к БД. Подключитесь сначала.")
             return
         
         try:
-            # Очищаем текущий список
-            for item in self.groups_tree.get_children():
-                self.groups_tree.delete(item)
-            
             # Получаем группы из БД
-            groups = self.db.get_groups()
+            if groups is None:
+                groups = self.db.get_groups()
             
             # Фильтруем фиктивные группы
             real_groups = [group for group in groups if not group.name.startswith('_group_')]
             
-            # Заполняем таблицу
-            for group in real_groups:
-                self.groups_tree.insert('', tk.END, values=(
-                    group.name,
-                    group.user_count,
-                    group.default_priority
-                ))
+            # Заполняем модель таблицы
+            self.groups_model.set_rows([
+                (group.name, group.user_count, group.default_priority)
+                for group in real_groups
+            ])
+            self.groups_tree.reset()
             
             # Обновляем информацию
             self.groups_info_label.config(text=f"Всего групп: {len(real_groups)}")
@@ -218,18 +236,18 @@ class GroupsTab:
     
     def clear_groups(self):
         """Очистка списка групп"""
-        for item in self.groups_tree.get_children():
-            self.groups_tree.delete(item)
+        self.groups_model.clear()
+        self.groups_tree.reset()
         self.groups_info_label.config(text="Всего групп: 0")
         self._clear_attributes()
     
     def _on_group_selected(self, event):
         """Обработка выбора группы"""
-        selected = self.groups_tree.selection()
+        selected = self.groups_tree.selected_rows()
         if not selected:
             return
         
-        groupname = self.groups_tree.item(selected[0])['values'][0]
+        groupname = selected[0][0]
         self.selected_group = groupname
         self._load_group_attributes(groupname)
     
@@ -316,13 +334,13 @@ class GroupsTab:
     
     def _delete_group(self):
         """Удаление группы"""
-        selected = self.groups_tree.selection()
+        selected = self.groups_tree.selected_rows()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите группу для удаления!")
             return
         
-        groupname = self.groups_tree.item(selected[0])['values'][0]
-        user_count = self.groups_tree.item(selected[0])['values'][1]
+        groupname = selected[0][0]
+        user_count = selected[0][1]
         
         # Проверяем, что это не системная группа
         if groupname == "default" or groupname == "users":
@@ -349,6 +367,24 @@ class GroupsTab:
         else:
             messagebox.showerror("Ошибка", f"Не удалось удалить группу '{groupname}'")
     
+    def _set_quota(self):
+        """Установка квоты выбранной группе"""
+        selected = self.groups_tree.selected_rows()
+        if not selected:
+            messagebox.showwarning("Внимание", "Выберите группу!")
+            return
+        
+        groupname = selected[0][0]
+        result = QuotaDialog(self.parent, "Квота группы", f"Группа: {groupname}").show()
+        if not result:
+            return
+        
+        counter, value = result
+        if self.db.set_quota([groupname], counter.check_name, value, 'group'):
+            self._load_group_attributes(groupname)
+        else:
+            messagebox.showerror("Ошибка", f"Не удалось установить квоту: {self.db.last_error}")
+    
     def _add_check_attr(self):
         """Добавление Check атрибута"""
         if not self.selected_group:
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Вкладка открытых сессий (кто сейчас в сети)
+"""
+
+import time
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+from models import OnlineSessions
+from gui.widgets import VirtualTreeview
+
+class OnlineTab:
+    """Вкладка открытых сессий radacct с автообновлением
+    
+    Первая загрузка читает все открытые сессии, дальше раз в REFRESH_MS
+    запрашиваются только изменения с прошлого опроса (новые по radacctid,
+    обновленные и закрытые по acctupdatetime). Раз в FULL_REFRESH_EVERY
+    опросов выполняется полная сверка - на случай, если NAS не обновляет
+    acctupdatetime. Запросы идут в фоновом потоке через отдельное
+    подключение и только пока вкладка открыта.
+    """
+    
+    REFRESH_MS = 5000
+    POLL_MS = 100
+    FULL_REFRESH_EVERY = 12
+    
+    def __init__(self, parent, db_manager, logger):
+        self.parent = parent
+        self.db = db_manager
+        self.logger = logger
+        
+        self.frame = ttk.Frame(parent)
+        self.sessions_model = OnlineSessions()
+        
+        # Фоновые запросы: одно подключение, не больше одного запроса сразу
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="online")
+        self._worker = None
+        self._future = None
+        self._mark = None
+        self._polls = 0
+        
+        self._create_widgets()
+        self.frame.after(self.REFRESH_MS, self._on_timer)
+    
+    def _create_widgets(self):
+        """Создание виджетов вкладки"""
+        main_frame = ttk.LabelFrame(self.frame, text="Открытые сессии", padding=10)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Панель управления
+        control_frame = ttk.Frame(main_frame)
+        control_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(control_frame, text="Поиск:").pack(side=tk.LEFT, padx=(0, 5))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(control_frame, textvariable=self.search_var, width=30)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind('<KeyRelease>', lambda e: self._apply_filter())
+        
+        ttk.Button(control_frame, text="Обновить",
+                  command=lambda: self.refresh(full=True)).pack(side=tk.LEFT, padx=5)
+        
+        self.auto_refresh = tk.BooleanVar(value=True)
+        ttk.Checkbutton(control_frame, text=f"Автообновление ({self.REFRESH_MS // 1000} с)",
+                        variable=self.auto_refresh).pack(side=tk.LEFT, padx=10)
+        
+        # Таблица сессий
+        table_frame = ttk.Frame(main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = OnlineSessions.COLUMNS
+        self.tree = VirtualTreeview(
+            table_frame,
+            self.sessions_model,
+            columns=columns,
+            show='headings',
+            height=15
+        )
+        
+        self.tree.heading('username', text='Пользователь')
+        self.tree.heading('nasipaddress', text='NAS')
+        self.tree.heading('framedipaddress', text='IP-адрес')
+        self.tree.heading('acctstarttime', text='Начало')
+        self.tree.heading('acctinputoctets', text='Входящий')
+        self.tree.heading('acctoutputoctets', text='Исходящий')
+        
+        self.tree.column('username', width=150, minwidth=100)
+        self.tree.column('nasipaddress', width=110, minwidth=90)
+        self.tree.column('framedipaddress', width=110, minwidth=90)
+        self.tree.column('acctstarttime', width=130, minwidth=110)
+        self.tree.column('acctinputoctets', width=100, minwidth=80)
+        self.tree.column('acctoutputoctets', width=100, minwidth=80)
+        
+        vsb = ttk.Scrollbar(table_frame, orient="vertical")
+        hsb = ttk.Scrollbar(table_frame, orient="horizontal", command=self.tree.xview)
+        self.tree.attach_scrollbar(vsb)
+        self.tree.configure(xscrollcommand=hsb.set)
+        
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        vsb.grid(row=0, column=1, sticky='ns')
+        hsb.grid(row=1, column=0, sticky='ew')
+        
+        table_frame.grid_columnconfigure(0, weight=1)
+        table_frame.grid_rowconfigure(0, weight=1)
+        
+        self.stats_label = ttk.Label(main_frame, text="Сессий: 0")
+        self.stats_label.pack(anchor=tk.W, pady=(10, 0))
+    
+    def refresh(self, full: bool = False):
+        """Запрос сессий в фоне (full - полная перезагрузка)"""
+        if self._future is not None or not self.db.connection_status:
+            return
+        
+        self._polls += 1
+        if self._polls % self.FULL_REFRESH_EVERY == 0:
+            full = True
+        mark = None if full else self._mark
+        self._future = self.executor.submit(self._fetch, mark)
+        self.frame.after(self.POLL_MS, self._poll_result)
+    
+    def clear(self):
+        """Очистка списка (после отключения от БД)"""
+        self._mark = None
+        self.sessions_model.clear()
+        self.tree.reset()
+        self.stats_label.config(text="Сессий: 0")
+        self.executor.submit(self._close_worker)
+    
+    def close(self):
+        """Закрытие фонового подключения (при выходе из программы)"""
+        self.executor.submit(self._close_worker)
+        self.executor.shutdown(wait=False)
+    
+    def _fetch(self, mark):
+        """Загрузка сессий (выполняется в фоновом потоке)"""
+        started = time.perf_counter()
+        if self._worker is None:
+            self._worker = self.db.spawn()
+            if self._worker is None:
+                raise RuntimeError("Не удалось открыть подключение для списка сессий")
+        
+        if mark is None:
+            rows, new_mark = self._worker.get_online_sessions()
+        else:
+            rows, new_mark = self._worker.get_session_changes(mark)
+        
+        if new_mark is None:
+            # Ошибка запроса: следующий опрос - через новое подключение и полностью
+            self._close_worker()
+        return mark is None, rows, new_mark, time.perf_counter() - started
+    
+    def _close_worker(self):
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+    
+    def _poll_result(self):
+        """Применение результата фонового запроса в потоке Tk"""
+        if self._future is None:
+            return
+        if not self._future.done():
+            self.frame.after(self.POLL_MS, self._poll_result)
+            return
+        
+        future, self._future = self._future, None
+        try:
+            full, rows, self._mark, duration = future.result()
+        except Exception as e:
+            self._mark = None
+            self.logger.log(f"Ошибка загрузки открытых сессий: {str(e)}")
+            return
+        
+        if full:
+            self.sessions_model.replace(rows)
+            self.logger.log(f"Открытые сессии: {len(self.sessions_model.sessions)} "
+                            f"за {duration:.3f} с")
+            changed = True
+        else:
+            changed = self.sessions_model.apply(rows)
+        
+        if changed:
+            self._apply_filter()
+        self._update_stats()
+    
+    def _apply_filter(self):
+        """Фильтр по части имени пользователя"""
+        text = self.search_var.get().strip().casefold()
+        if text:
+            rows = self.sessions_model.rows
+            self.sessions_model.set_filter(lambda row_id: text in (rows[row_id][0] or '').casefold())
+        else:
+            self.sessions_model.set_filter(None)
+        self.tree.refresh()
+        self._update_stats()
+    
+    def _update_stats(self):
+        total = self.sessions_model.row_count()
+        shown = len(self.sessions_model)
+        text = f"Сессий: {total}"
+        if shown != total:
+            text += f" (показано {shown})"
+        self.stats_label.config(text=f"{text}, обновлено {time.strftime('%H:%M:%S')}")
+    
+    def _on_timer(self):
+        """Периодическое обновление, пока вкладка открыта"""
+        try:
+            if self.auto_refresh.get() and self.frame.winfo_ismapped():
+                self.refresh()
+        finally:
+            self.frame.after(self.REFRESH_MS, self._on_timer)
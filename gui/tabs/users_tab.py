@@ -6,12 +6,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from typing import List
-from database import User, Attribute
-from gui.dialogs import PasswordDialog, AttributeDialog
+from database import User, Group, Attribute
+from jobs import format_duration
+from models import UserStore
+from utils.helpers import format_file_size
+from gui.dialogs import PasswordDialog, AttributeDialog, QuotaDialog
+from gui.widgets import VirtualTreeview
 
 class UsersTab:
     """Вкладка для управления пользователями"""
     
+    # Сессий radacct на одну страницу вкладки "Сессии"
+    SESSIONS_PAGE = 100
+    
     def __init__(self, parent, db_manager, logger, status_bar):
         self.parent = parent
         self.db = db_manager
@@ -19,6 +26,9 @@ class UsersTab:
         self.status_bar = status_bar
         self.selected_user = None
         
+        # Колоночное хранилище - единственный источник данных вкладки
+        self.users_model = UserStore()
+        
         self.frame = ttk.Frame(parent)
         self._create_widgets()
         self._create_context_menu()
@@ -89,7 +99,14 @@ class UsersTab:
         
         # Создаем Treeview с колонками
         columns = ('username', 'group', 'status', 'last_login')
-        self.tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=15)
+        self.tree = VirtualTreeview(
+            table_frame,
+            self.users_model,
+            row_tags=self._row_tags,
+            columns=columns,
+            show='headings',
+            height=15
+        )
         
         # Настраиваем заголовки
         self.tree.heading('username', text='Имя пользователя')
@@ -108,9 +125,10 @@ class UsersTab:
         self.tree.tag_configure('active', background='#e8f5e9')
         
         # Scrollbars
-        vsb = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
+        vsb = ttk.Scrollbar(table_frame, orient="vertical")
         hsb = ttk.Scrollbar(table_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.attach_scrollbar(vsb)
+        self.tree.configure(xscrollcommand=hsb.set)
         
         # Размещение
         self.tree.grid(row=0, column=0, sticky='nsew')
@@ -121,7 +139,7 @@ class UsersTab:
         table_frame.grid_rowconfigure(0, weight=1)
         
         # Привязка событий
-        self.tree.bind('<<TreeviewSelect>>', self._on_user_selected)
+        self.tree.bind('<<RowsSelected>>', self._on_user_selected)
         self.tree.bind("<Button-3>", self._show_context_menu)
         
         # Панель статистики
@@ -236,6 +254,105 @@ class UsersTab:
         ttk.Button(reply_btn_frame, text="Удалить", 
                   command=self._delete_reply_attr, width=12).pack(side=tk.LEFT, padx=2)
         
+        # Вкладка использования (таблицы агрегатов radacct)
+        self.usage_frame = ttk.Frame(self.attr_notebook)
+        self.attr_notebook.add(self.usage_frame, text="Трафик")
+        
+        usage_mode_frame = ttk.Frame(self.usage_frame)
+        usage_mode_frame.grid(row=0, column=0, columnspan=2, sticky='w', pady=(0, 5))
+        
+        self.usage_monthly = tk.BooleanVar(value=False)
+        ttk.Radiobutton(usage_mode_frame, text="По дням", variable=self.usage_monthly, value=False,
+                        command=self._load_usage).pack(side=tk.LEFT, padx=2)
+        ttk.Radiobutton(usage_mode_frame, text="По месяцам", variable=self.usage_monthly, value=True,
+                        command=self._load_usage).pack(side=tk.LEFT, padx=2)
+        
+        usage_columns = ('period', 'sessions', 'session_time', 'input', 'output')
+        self.usage_tree = ttk.Treeview(
+            self.usage_frame,
+            columns=usage_columns,
+            show='headings',
+            height=8,
+            selectmode='browse'
+        )
+        
+        self.usage_tree.heading('period', text='Период')
+        self.usage_tree.heading('sessions', text='Сессий')
+        self.usage_tree.heading('session_time', text='Время')
+        self.usage_tree.heading('input', text='Входящий')
+        self.usage_tree.heading('output', text='Исходящий')
+        
+        self.usage_tree.column('period', width=90)
+        self.usage_tree.column('sessions', width=60)
+        self.usage_tree.column('session_time', width=80)
+        self.usage_tree.column('input', width=90)
+        self.usage_tree.column('output', width=90)
+        
+        usage_vsb = ttk.Scrollbar(self.usage_frame, orient="vertical", command=self.usage_tree.yview)
+        self.usage_tree.configure(yscrollcommand=usage_vsb.set)
+        
+        self.usage_tree.grid(row=1, column=0, sticky='nsew')
+        usage_vsb.grid(row=1, column=1, sticky='ns')
+        
+        self.usage_frame.grid_columnconfigure(0, weight=1)
+        self.usage_frame.grid_rowconfigure(1, weight=1)
+        
+        # Вкладка истории сессий radacct (догружается страницами при прокрутке)
+        self.sessions_frame = ttk.Frame(self.attr_notebook)
+        self.attr_notebook.add(self.sessions_frame, text="Сессии")
+        
+        sessions_columns = ('start', 'stop', 'nas', 'ip', 'session_time', 'input', 'output', 'cause')
+        self.sessions_tree = ttk.Treeview(
+            self.sessions_frame,
+            columns=sessions_columns,
+            show='headings',
+            height=8,
+            selectmode='browse'
+        )
+        
+        self.sessions_tree.heading('start', text='Начало')
+        self.sessions_tree.heading('stop', text='Окончание')
+        self.sessions_tree.heading('nas', text='NAS')
+        self.sessions_tree.heading('ip', text='IP-адрес')
+        self.sessions_tree.heading('session_time', text='Время')
+        self.sessions_tree.heading('input', text='Входящий')
+        self.sessions_tree.heading('output', text='Исходящий')
+        self.sessions_tree.heading('cause', text='Причина')
+        
+        self.sessions_tree.column('start', width=130)
+        self.sessions_tree.column('stop', width=130)
+        self.sessions_tree.column('nas', width=100)
+        self.sessions_tree.column('ip', width=100)
+        self.sessions_tree.column('session_time', width=80)
+        self.sessions_tree.column('input', width=80)
+        self.sessions_tree.column('output', width=80)
+        self.sessions_tree.column('cause', width=110)
+        
+        self.sessions_vsb = ttk.Scrollbar(self.sessions_frame, orient="vertical",
+                                          command=self.sessions_tree.yview)
+        sessions_hsb = ttk.Scrollbar(self.sessions_frame, orient="horizontal",
+                                     command=self.sessions_tree.xview)
+        self.sessions_tree.configure(yscrollcommand=self._on_sessions_scroll, xscrollcommand=sessions_hsb.set)
+        
+        self.sessions_tree.grid(row=0, column=0, sticky='nsew')
+        self.sessions_vsb.grid(row=0, column=1, sticky='ns')
+        sessions_hsb.grid(row=1, column=0, sticky='ew')
+        
+        self.sessions_label = ttk.Label(self.sessions_frame, text="")
+        self.sessions_label.grid(row=2, column=0, columnspan=2, sticky='w', pady=(5, 0))
+        
+        self.sessions_frame.grid_columnconfigure(0, weight=1)
+        self.sessions_frame.grid_rowconfigure(0, weight=1)
+        
+        # Состояние постраничной загрузки: пользователь, ключ последней строки, есть ли еще
+        self._sessions_user = None
+        self._sessions_after = None
+        self._sessions_more = False
+        self._sessions_queued = False
+        
+        # Статистика и сессии загружаются только при открытой вкладке
+        self.attr_notebook.bind('<<NotebookTabChanged>>', lambda e: self._on_attr_tab_changed())
+        
         # Статистика атрибутов
         self.attr_stats_label = ttk.Label(right_frame, text="Check: 0 | Reply: 0")
         self.attr_stats_label.pack(side=tk.BOTTOM, anchor=tk.W, pady=(10, 0))
@@ -250,6 +367,7 @@ class UsersTab:
             ("Блокировать", self._block_user),
             ("Разблокировать", self._unblock_user),
             ("Удалить", self._delete_user),
+            ("Квота...", self._set_quota),
             ("Экспортировать", self._export_selected),
         ]
         
@@ -266,60 +384,62 @@ class UsersTab:
             return
         
         try:
-            # Очищаем текущий список
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            # Получаем пользователей из БД
-            users = self.db.get_users()
-            
-            # Заполняем таблицу
-            for user in users:
-                # Выбираем тег в зависимости от статуса
-                tag = 'blocked' if user.status == 'Заблокирован' else 'active'
-                
-                self.tree.insert('', tk.END, values=(
-                    user.username,
-                    user.group,
-                    user.status,
-                    user.last_login
-                ), tags=(tag,))
-            
-            # Обновляем статистику
-            self.stats_label.config(text=f"Всего пользователей: {len(users)}")
-            self.logger.log(f"Загружено пользователей: {len(users)}")
-            
-            # Обновляем список групп в фильтрах
-            self._update_group_filters()
-            
-            # Очищаем атрибуты
-            self._clear_attributes()
+            # Загружаем пользователей из БД прямо в хранилище
+            # (Treeview отрисовывает только видимые строки)
+            self.db.get_user_store(self.users_model)
+            self._show_loaded_users()
             
         except Exception as e:
             self.logger.log(f"Ошибка загрузки пользователей: {str(e)}")
             messagebox.showerror("Ошибка", f"Не удалось загрузить пользователей:\n{str(e)}")
     
+    def show_users(self, store: UserStore, groups: List[Group] = None):
+        """Отображение пользователей и групп, загруженных в фоновом потоке"""
+        self.users_model.replace_with(store)
+        self._show_loaded_users(groups)
+    
+    def _show_loaded_users(self, groups: List[Group] = None):
+        """Обновление вкладки после загрузки хранилища"""
+        # Обновляем список групп в фильтрах
+        self._update_group_filters(groups)
+        
+        # Применяем поиск и фильтры, обновляем статистику
+        self._apply_filters()
+        self.logger.log(f"Загружено пользователей: {self.users_model.row_count()}")
+        
+        # Очищаем атрибуты
+        self._clear_attributes()
+    
     def clear_users(self):
         """Очистка списка пользователей"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.users_model.clear()
+        self.tree.reset()
         self.stats_label.config(text="Всего пользователей: 0")
         self._clear_attributes()
     
+    def _row_tags(self, row):
+        """Тег строки в зависимости от статуса"""
+        return ('blocked',) if row[2] == 'Заблокирован' else ('active',)
+    
     def _on_user_selected(self, event=None):
         """Обработка выбора пользователя"""
-        selected = self.tree.selection()
+        selected = self.tree.selected_rows()
         if not selected:
             self._clear_attributes()
             return
         
-        username = self.tree.item(selected[0])['values'][0]
+        username = selected[0][0]
+        if username == self.selected_user:
+            return
+        
         self.selected_user = username
         self.selected_user_label.config(
             text=f"Атрибуты пользователя: {username}",
             foreground='#333333'
         )
         self._load_user_attributes(username)
+        self._load_usage(username)
+        self._load_sessions(username)
     
     def _load_user_attributes(self, username):
         """Загрузка атрибутов выбранного пользователя"""
@@ -362,6 +482,90 @@ class UsersTab:
                 foreground='red'
             )
     
+    def _load_usage(self, username=None):
+        """Загрузка истории трафика пользователя (если открыта вкладка "Трафик")"""
+        if self.attr_notebook.select() != str(self.usage_frame):
+            return
+        if username is None:
+            selected = self.tree.selected_rows()
+            if not selected:
+                return
+            username = selected[0][0]
+        
+        for item in self.usage_tree.get_children():
+            self.usage_tree.delete(item)
+        
+        monthly = self.usage_monthly.get()
+        for period, sessions, session_time, octets_in, octets_out in self.db.get_user_usage(username, monthly):
+            self.usage_tree.insert('', tk.END, values=(
+                period.strftime('%Y-%m' if monthly else '%Y-%m-%d'),
+                sessions,
+                format_duration(session_time),
+                format_file_size(octets_in),
+                format_file_size(octets_out)
+            ))
+    
+    def _on_attr_tab_changed(self):
+        self._load_usage()
+        self._load_sessions()
+    
+    def _load_sessions(self, username=None):
+        """Первая страница сессий пользователя (если открыта вкладка "Сессии")"""
+        if self.attr_notebook.select() != str(self.sessions_frame):
+            return
+        if username is None:
+            selected = self.tree.selected_rows()
+            if not selected:
+                return
+            username = selected[0][0]
+        if username == self._sessions_user:
+            return
+        
+        self._clear_sessions()
+        self._sessions_user = username
+        self._sessions_more = True
+        self._load_sessions_page()
+    
+    def _load_sessions_page(self):
+        """Следующая страница сессий (ключ - последняя загруженная строка)"""
+        self._sessions_queued = False
+        if not self._sessions_more or self._sessions_user is None:
+            return
+        
+        rows = self.db.get_user_sessions(self._sessions_user, self.SESSIONS_PAGE, self._sessions_after)
+        self._sessions_more = len(rows) == self.SESSIONS_PAGE
+        for (radacctid, start, stop, nas, ip, session_time, octets_in, octets_out, cause) in rows:
+            self.sessions_tree.insert('', tk.END, values=(
+                start.strftime('%Y-%m-%d %H:%M:%S'),
+                stop.strftime('%Y-%m-%d %H:%M:%S') if stop else "в сети",
+                nas,
+                ip or '',
+                format_duration(session_time or 0),
+                format_file_size(octets_in or 0),
+                format_file_size(octets_out or 0),
+                cause or ''
+            ))
+        if rows:
+            self._sessions_after = (rows[-1][1], rows[-1][0])
+        
+        count = len(self.sessions_tree.get_children())
+        self.sessions_label.config(text=f"Сессий: {count}{'+' if self._sessions_more else ''}")
+    
+    def _on_sessions_scroll(self, first, last):
+        """Догрузка следующей страницы при прокрутке до конца списка"""
+        self.sessions_vsb.set(first, last)
+        if self._sessions_more and not self._sessions_queued and float(last) >= 1.0:
+            self._sessions_queued = True
+            self.sessions_tree.after_idle(self._load_sessions_page)
+    
+    def _clear_sessions(self):
+        for item in self.sessions_tree.get_children():
+            self.sessions_tree.delete(item)
+        self.sessions_label.config(text="")
+        self._sessions_user = None
+        self._sessions_after = None
+        self._sessions_more = False
+    
     def _clear_attributes(self):
         """Очистка таблиц атрибутов"""
         for item in self.check_tree.get_children():
@@ -370,6 +574,11 @@ class UsersTab:
         for item in self.reply_tree.get_children():
             self.reply_tree.delete(item)
         
+        for item in self.usage_tree.get_children():
+            self.usage_tree.delete(item)
+        
+        self._clear_sessions()
+        
         self.selected_user_label.config(
             text="Выберите пользователя для просмотра атрибутов",
             foreground='#666666'
@@ -380,12 +589,12 @@ class UsersTab:
     def _add_check_attr(self):
         """Добавление Check атрибута пользователя"""
         # Исправлено: проверяем выбранного пользователя
-        selected_users = self.tree.selection()
+        selected_users = self.tree.selected_rows()
         if not selected_users:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected_users[0])['values'][0]
+        username = selected_users[0][0]
         self.selected_user = username  # Обновляем выбранного пользователя
         self._load_user_attributes(username)  # Загружаем атрибуты
         
@@ -405,12 +614,12 @@ class UsersTab:
     def _add_reply_attr(self):
         """Добавление Reply атрибута пользователя"""
         # Исправлено: проверяем выбранного пользователя
-        selected_users = self.tree.selection()
+        selected_users = self.tree.selected_rows()
         if not selected_users:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected_users[0])['values'][0]
+        username = selected_users[0][0]
         self.selected_user = username  # Обновляем выбранного пользователя
         self._load_user_attributes(username)  # Загружаем атрибуты
         
@@ -435,12 +644,12 @@ class UsersTab:
             return
         
         # Исправлено: проверяем выбранного пользователя
-        selected_users = self.tree.selection()
+        selected_users = self.tree.selected_rows()
         if not selected_users:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected_users[0])['values'][0]
+        username = selected_users[0][0]
         self.selected_user = username
         
         # Получаем текущие значения
@@ -481,12 +690,12 @@ class UsersTab:
             return
         
         # Исправлено: проверяем выбранного пользователя
-        selected_users = self.tree.selection()
+        selected_users = self.tree.selected_rows()
         if not selected_users:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected_users[0])['values'][0]
+        username = selected_users[0][0]
         self.selected_user = username
         
         # Получаем текущие значения
@@ -527,12 +736,12 @@ class UsersTab:
             return
         
         # Исправлено: проверяем выбранного пользователя
-        selected_users = self.tree.selection()
+        selected_users = self.tree.selected_rows()
         if not selected_users:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected_users[0])['values'][0]
+        username = selected_users[0][0]
         self.selected_user = username
         
         values = self.check_tree.item(selected_attr[0])['values']
@@ -556,12 +765,12 @@ class UsersTab:
             return
         
         # Исправлено: проверяем выбранного пользователя
-        selected_users = self.tree.selection()
+        selected_users = self.tree.selected_rows()
         if not selected_users:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected_users[0])['values'][0]
+        username = selected_users[0][0]
         self.selected_user = username
         
         values = self.reply_tree.item(selected_attr[0])['values']
@@ -579,68 +788,54 @@ class UsersTab:
     
     def _search_users(self, event=None):
         """Поиск пользователей по имени"""
-        search_term = self.search_var.get().lower()
-        
-        if not search_term:
-            # Если поиск пустой, показываем всех
-            for item in self.tree.get_children():
-                self.tree.selection_remove(item)
-            return
-        
-        # Ищем совпадения
-        found_items = []
-        for item in self.tree.get_children():
-            values = self.tree.item(item)['values']
-            username = values[0].lower() if values[0] else ''
-            
-            if search_term in username:
-                found_items.append(item)
-        
-        # Выделяем найденные элементы
-        self.tree.selection_set(found_items)
-        
-        if found_items:
-            self.tree.see(found_items[0])
-            self.stats_label.config(text=f"Найдено пользователей: {len(found_items)}")
+        self._apply_filters()
     
     def _clear_search(self):
         """Очистка поиска"""
         self.search_var.set("")
-        for item in self.tree.get_children():
-            self.tree.selection_remove(item)
-        self.load_users()  # Перезагружаем полный список
+        self._apply_filters()
     
     def _apply_filters(self, event=None):
-        """Применение фильтров"""
+        """Применение поиска и фильтров к модели"""
+        search_term = self.search_var.get().casefold()
         status_filter = self.status_filter.get()
         group_filter = self.group_filter.get()
         
-        # Показываем/скрываем элементы в зависимости от фильтров
-        visible_count = 0
-        for item in self.tree.get_children():
-            values = self.tree.item(item)['values']
-            status = values[2] if len(values) > 2 else ''
-            group = values[1] if len(values) > 1 else ''
-            
-            # Проверяем фильтры
-            status_match = (status_filter == "Все") or (status == status_filter)
-            group_match = (group_filter == "Все") or (group == group_filter)
-            
-            if status_match and group_match:
-                self.tree.item(item, open=True)
-                visible_count += 1
-            else:
-                self.tree.item(item, open=False)
+        if not search_term and status_filter == "Все" and group_filter == "Все":
+            self.users_model.set_filter(None)
+            self.tree.reset()
+            self.stats_label.config(text=f"Всего пользователей: {len(self.users_model)}")
+            return
+        
+        store = self.users_model
+        usernames = store.folded_usernames() if search_term else store.usernames
+        group_ids = store.group_ids
+        status_ids = store.status_ids
+        group_id = store.find_group(group_filter)
+        status_id = store.find_status(status_filter)
+        
+        # Сравниваем индексы интернированных значений, а не строки
+        def matches(row_id):
+            return ((not search_term or search_term in usernames[row_id])
+                    and (status_filter == "Все" or status_ids[row_id] == status_id)
+                    and (group_filter == "Все" or group_ids[row_id] == group_id))
+        
+        self.users_model.set_filter(matches)
+        self.tree.reset()
         
-        self.stats_label.config(text=f"Отфильтровано пользователей: {visible_count}")
+        if search_term:
+            self.stats_label.config(text=f"Найдено пользователей: {len(self.users_model)}")
+        else:
+            self.stats_label.config(text=f"Отфильтровано пользователей: {len(self.users_model)}")
     
-    def _update_group_filters(self):
-        """Обновление списка групп в фильтрах"""
-        if not self.db.connection_status:
+    def _update_group_filters(self, groups: List[Group] = None):
+        """Обновление списка групп в фильтрах (groups - уже загруженный список)"""
+        if groups is None and not self.db.connection_status:
             return
         
         try:
-            groups = self.db.get_groups()
+            if groups is None:
+                groups = self.db.get_groups()
             group_names = [group.name for group in groups]
             
             # Обновляем комбобокс фильтра
@@ -655,7 +850,7 @@ class UsersTab:
         """Показать контекстное меню"""
         item = self.tree.identify_row(event.y)
         if item:
-            self.tree.selection_set(item)
+            self.tree.select_item(item)
             self.context_menu.post(event.x_root, event.y_root)
         else:
             # Если клик не на элементе, показываем меню для таблицы
@@ -666,12 +861,12 @@ class UsersTab:
     
     def _change_password(self):
         """Изменение пароля выбранного пользователя"""
-        selected = self.tree.selection()
+        selected = self.tree.selected_rows()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected[0])['values'][0]
+        username = selected[0][0]
         
         # Создаем диалог для ввода нового пароля
         dialog = PasswordDialog(self.parent, "Изменить пароль", username)
@@ -687,11 +882,11 @@ class UsersTab:
     
     def _copy_username(self):
         """Копирование имени пользователя в буфер обмена"""
-        selected = self.tree.selection()
+        selected = self.tree.selected_rows()
         if not selected:
             return
         
-        username = self.tree.item(selected[0])['values'][0]
+        username = selected[0][0]
         self.parent.clipboard_clear()
         self.parent.clipboard_append(username)
         self.logger.log(f"Скопировано имя: {username}")
@@ -719,12 +914,12 @@ class UsersTab:
     
     def _toggle_user_block(self, block=True):
         """Блокировка/разблокировка пользователя"""
-        selected = self.tree.selection()
+        selected = self.tree.selected_rows()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected[0])['values'][0]
+        username = selected[0][0]
         action = "заблокирован" if block else "разблокирован"
         
         if self.db.block_user(username, block):
@@ -734,14 +929,33 @@ class UsersTab:
         else:
             messagebox.showerror("Ошибка", f"Не удалось {action} пользователя '{username}'")
     
+    def _set_quota(self):
+        """Установка квоты выбранным пользователям"""
+        usernames = self.get_selected_users()
+        if not usernames:
+            messagebox.showwarning("Внимание", "Выберите пользователей!")
+            return
+        
+        target = usernames[0] if len(usernames) == 1 else f"Пользователей: {len(usernames)}"
+        result = QuotaDialog(self.parent, "Квота", target).show()
+        if not result:
+            return
+        
+        counter, value = result
+        if self.db.set_quota(usernames, counter.check_name, value, 'user'):
+            if len(usernames) == 1:
+                self._load_user_attributes(usernames[0])
+        else:
+            messagebox.showerror("Ошибка", f"Не удалось установить квоту: {self.db.last_error}")
+    
     def _delete_user(self):
         """Удаление выбранного пользователя"""
-        selected = self.tree.selection()
+        selected = self.tree.selected_rows()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите пользователя!")
             return
         
-        username = self.tree.item(selected[0])['values'][0]
+        username = selected[0][0]
         
         if not messagebox.askyesno("Подтверждение", 
             f"Удалить пользователя '{username}'?\nЭто действие нельзя отменить!"):
@@ -762,7 +976,7 @@ class UsersTab:
     
     def _export_selected(self):
         """Экспорт выбранных пользователей"""
-        selected = self.tree.selection()
+        selected = self.tree.selected_rows()
         if not selected:
             messagebox.showwarning("Внимание", "Выберите пользователей!")
             return
@@ -780,8 +994,7 @@ class UsersTab:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write("Username,Group,Status,Last Login\n")
                 
-                for item in selected:
-                    values = self.tree.item(item)['values']
+                for values in selected:
                     f.write(','.join([f'"{v}"' for v in values]) + '\n')
             
             self.logger.log(f"Экспорт выбранных: {len(selected)} пользователей")
@@ -814,5 +1027,4 @@ class UsersTab:
     
     def get_selected_users(self) -> List[str]:
         """Получение списка выбранных пользователей"""
-        selected = self.tree.selection()
-        return [self.tree.item(item)['values'][0] for item in selected]
\ No newline at end of file
+        return [row[0] for row in self.tree.selected_rows()]
\ No newline at end of file
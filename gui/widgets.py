@@ -90,9 +90,14 @@ class StatusBar(tk.Frame):
         """Установка текста статуса"""
         self.status_label.config(text=text)
     
-    def set_connection_status(self, connected: bool):
-        """Установка статуса подключения"""
-        color = "green" if connected else "red"
+    def set_connection_status(self, connected: bool, reconnecting: bool = False):
+        """Установка статуса подключения (reconnecting - идет переподключение)"""
+        if connected:
+            color = "green"
+        elif reconnecting:
+            color = "orange"
+        else:
+            color = "red"
         self.connection_indicator.config(fg=color)
 
 class ToolBar(tk.Frame):
@@ -228,4 +233,216 @@ class EditableTreeview(ttk.Treeview):
             self.edit_entry.destroy()
             self.edit_entry = None
             self.edit_item = None
-            self.edit_column = None
\ No newline at end of file
+            self.edit_column = None
+
+class VirtualTreeview(ttk.Treeview):
+    """Treeview, отображающий только видимые строки табличной модели"""
+    
+    SORT_ASC = ' ▲'
+    SORT_DESC = ' ▼'
+    
+    def __init__(self, master, model, row_tags: Callable = None, **kwargs):
+        kwargs.setdefault('show', 'headings')
+        super().__init__(master, **kwargs)
+        
+        self.model = model
+        self.row_tags = row_tags
+        self.scrollbar = None
+        self.offset = 0
+        self.page_size = int(self.cget('height') or 10)
+        
+        # Слоты - постоянные строки Treeview, в которые подставляются данные
+        self._slots: List[str] = []
+        self._slot_rows: List[Any] = []
+        self._slot_index: Dict[str, int] = {}
+        
+        # Выделение хранится в идентификаторах строк модели
+        self._selected = set()
+        self._extend_selection = False
+        
+        for column in self.cget('columns'):
+            self.heading(column, command=lambda c=column: self.sort_by(c))
+        
+        self.bind('<Configure>', self._on_configure)
+        self.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.bind('<Button-1>', self._remember_modifiers)
+        self.bind('<MouseWheel>', lambda e: self._scroll_event(-1 * (e.delta // 120) * 3))
+        self.bind('<Button-4>', lambda e: self._scroll_event(-3))
+        self.bind('<Button-5>', lambda e: self._scroll_event(3))
+        self.bind('<Up>', lambda e: self._move_cursor(-1))
+        self.bind('<Down>', lambda e: self._move_cursor(1))
+        self.bind('<Prior>', lambda e: self._move_cursor(-self.page_size))
+        self.bind('<Next>', lambda e: self._move_cursor(self.page_size))
+        self.bind('<Home>', lambda e: self._move_cursor(-len(self.model)))
+        self.bind('<End>', lambda e: self._move_cursor(len(self.model)))
+    
+    def attach_scrollbar(self, scrollbar: ttk.Scrollbar):
+        """Подключение вертикальной полосы прокрутки к модели"""
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+    
+    def yview(self, *args):
+        """Прокрутка по строкам модели (протокол Scrollbar)"""
+        total = len(self.model)
+        if not args:
+            return self._fractions()
+        
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * total))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.page_size
+            self.scroll_to(self.offset + amount)
+    
+    def scroll_to(self, offset: int):
+        """Прокрутка к позиции в представлении"""
+        offset = max(0, min(offset, len(self.model) - self.page_size))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+    
+    def sort_by(self, column: str):
+        """Сортировка по колонке (повторный клик - обратный порядок)"""
+        self.model.sort(column)
+        
+        for name in self.cget('columns'):
+            text = self.heading(name, 'text')
+            for marker in (self.SORT_ASC, self.SORT_DESC):
+                if text.endswith(marker):
+                    text = text[:-len(marker)]
+            if name == column:
+                text += self.SORT_DESC if self.model.sort_reverse else self.SORT_ASC
+            self.heading(name, text=text)
+        
+        self.offset = 0
+        self.refresh()
+    
+    def refresh(self):
+        """Перерисовка видимых строк из модели"""
+        total = len(self.model)
+        self.offset = max(0, min(self.offset, total - self.page_size))
+        count = min(self.page_size, total)
+        
+        while len(self._slots) < count:
+            iid = self.insert('', tk.END)
+            self._slot_index[iid] = len(self._slots)
+            self._slots.append(iid)
+            self._slot_rows.append(None)
+        while len(self._slots) > count:
+            iid = self._slots.pop()
+            self._slot_rows.pop()
+            del self._slot_index[iid]
+            self.delete(iid)
+        
+        visible_selection = []
+        for index, iid in enumerate(self._slots):
+            position = self.offset + index
+            row_id = self.model.row_id(position)
+            row = self.model.row(position)
+            tags = self.row_tags(row) if self.row_tags else ()
+            self.item(iid, values=row, tags=tags)
+            self._slot_rows[index] = row_id
+            if row_id in self._selected:
+                visible_selection.append(iid)
+        
+        if tuple(visible_selection) != super().selection():
+            self.selection_set(visible_selection)
+        
+        if self.scrollbar:
+            self.scrollbar.set(*self._fractions())
+    
+    def reset(self):
+        """Сброс прокрутки и выделения (после перезагрузки данных)"""
+        self.offset = 0
+        self._selected = set()
+        self.refresh()
+    
+    def selected_rows(self) -> List[tuple]:
+        """Выделенные строки модели в порядке отображения"""
+        if not self._selected:
+            return []
+        return [self.model.row_by_id(row_id) for row_id in self.model.view if row_id in self._selected]
+    
+    def select_row(self, row_id: int):
+        """Выделение строки модели с прокруткой к ней"""
+        position = self.model.position_of(row_id)
+        if position < 0:
+            return
+        
+        self._selected = {row_id}
+        if not self.offset <= position < self.offset + self.page_size:
+            self.offset = position
+        self.refresh()
+        self.event_generate('<<RowsSelected>>')
+    
+    def select_item(self, iid: str):
+        """Выделение строки по элементу Treeview (например, при правом клике)"""
+        index = self._slot_index.get(iid)
+        if index is not None:
+            self.select_row(self._slot_rows[index])
+    
+    def _fractions(self):
+        """Видимая доля представления для полосы прокрутки"""
+        total = len(self.model)
+        if total == 0:
+            return 0.0, 1.0
+        return self.offset / total, min(1.0, (self.offset + self.page_size) / total)
+    
+    def _on_configure(self, event):
+        """Пересчет количества видимых строк при изменении размера"""
+        style = ttk.Style()
+        rowheight = int(style.lookup('Treeview', 'rowheight') or 20)
+        # Заголовок занимает примерно одну строку
+        page_size = max(1, event.height // rowheight - 1)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.refresh()
+    
+    def _remember_modifiers(self, event):
+        """Запоминаем, расширяет ли клик текущее выделение (Ctrl/Shift)"""
+        self._extend_selection = bool(event.state & 0x0005)
+    
+    def _on_tree_select(self, event=None):
+        """Синхронизация выделения Treeview с выделением модели"""
+        shown = {row_id for row_id in self._slot_rows}
+        selected = {self._slot_rows[self._slot_index[iid]] for iid in super().selection()}
+        
+        # Эхо от refresh(): видимое выделение совпадает с сохраненным
+        if selected == self._selected & shown:
+            return
+        
+        if self._extend_selection:
+            self._selected = (self._selected - shown) | selected
+        else:
+            self._selected = selected
+        self._extend_selection = False
+        self.event_generate('<<RowsSelected>>')
+    
+    def _scroll_event(self, amount: int):
+        """Прокрутка колесиком мыши"""
+        self.scroll_to(self.offset + amount)
+        return 'break'
+    
+    def _move_cursor(self, delta: int):
+        """Перемещение выделения клавиатурой с прокруткой модели"""
+        total = len(self.model)
+        if total == 0:
+            return 'break'
+        
+        focus = self.focus()
+        index = self._slot_index.get(focus, 0)
+        position = max(0, min(self.offset + index + delta, total - 1))
+        
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + self.page_size:
+            self.offset = position - self.page_size + 1
+        
+        self._selected = {self.model.row_id(position)}
+        self.refresh()
+        
+        slot = self._slots[position - self.offset]
+        self.focus(slot)
+        self.event_generate('<<RowsSelected>>')
+        return 'break'
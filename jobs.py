@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Фоновые задачи для длительных массовых операций
+"""
+
+import copy
+import csv
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+@dataclass
+class JobProgress:
+    """Снимок состояния задачи"""
+    state: str
+    done: int
+    total: int
+    succeeded: int
+    failed: int
+    elapsed: float
+    retries: int = 0
+    chunk_size: int = 0
+    
+    @property
+    def rate(self) -> float:
+        """Скорость обработки, строк в секунду"""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+    
+    @property
+    def eta(self) -> Optional[float]:
+        """Оценка оставшегося времени в секундах"""
+        rate = self.rate
+        if rate <= 0:
+            return None
+        return (self.total - self.done) / rate
+    
+    @property
+    def percent(self) -> float:
+        """Процент выполнения"""
+        return 100.0 * self.done / self.total if self.total else 100.0
+
+@dataclass
+class ChunkStat:
+    """Статистика обработанной порции"""
+    start: int
+    size: int
+    seconds: float
+    failed: int
+    writer: int = 0
+
+class ChunkSizer:
+    """Подбор размера порции по задержке и доле ошибок
+    
+    Порция растет, пока укладывается в target_seconds без ошибок, и
+    уменьшается вдвое при медленной обработке или ошибках (ошибка откатывает
+    всю порцию). Верхняя граница держит число строк одной транзакции в каждой
+    таблице ниже порога эскалации блокировок SQL Server (5000) с запасом.
+    """
+    
+    LOCK_ESCALATION_THRESHOLD = 5000
+    LOCK_HEADROOM = 0.8
+    GROWTH = 1.5
+    MAX_ERROR_RATE = 0.1
+    
+    def __init__(self, initial: int = 100, minimum: int = 1, maximum: int = None,
+                 rows_per_item: int = 1, target_seconds: float = 1.0):
+        lock_limit = int(self.LOCK_ESCALATION_THRESHOLD * self.LOCK_HEADROOM) // max(1, rows_per_item)
+        self.maximum = max(1, min(maximum or lock_limit, lock_limit))
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.target_seconds = target_seconds
+        self.size = max(self.minimum, min(initial, self.maximum))
+    
+    def next_size(self) -> int:
+        return self.size
+    
+    def record(self, size: int, seconds: float, failed: int):
+        """Учет результата порции и выбор следующего размера"""
+        error_rate = failed / size if size else 0.0
+        if error_rate > self.MAX_ERROR_RATE or seconds > 2 * self.target_seconds:
+            self.size = max(self.minimum, size // 2)
+        elif failed == 0 and seconds < self.target_seconds:
+            self.size = min(self.maximum, max(size + 1, int(size * self.GROWTH)))
+
+class Job:
+    """Массовая операция, выполняемая порциями в фоновом потоке
+    
+    process(db, chunk) получает отдельное подключение к БД и порцию элементов
+    и возвращает список ошибок той же длины (None - элемент обработан успешно).
+    Отмена срабатывает на границе порций. Если передан sizer (ChunkSizer),
+    размер каждой следующей порции подбирается по результатам предыдущей.
+    
+    При writers > 1 элементы делятся на разделы по хэшу label(item) (имени
+    пользователя), и каждый раздел обрабатывает свой поток со своим
+    подключением - операции над одним пользователем не конфликтуют между
+    потоками. Результаты всех потоков собираются в общие счетчики и отчет.
+    """
+    
+    PENDING = 'pending'
+    RUNNING = 'running'
+    CANCELLED = 'cancelled'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    
+    def __init__(self, name: str, items: Sequence[Any],
+                 process: Callable[[Any, Sequence[Any]], List[Optional[str]]],
+                 db_manager, chunk_size: int = 100, label: Callable[[Any], str] = str,
+                 sizer: ChunkSizer = None, writers: int = 1):
+        self.name = name
+        self.items = items
+        self.process = process
+        self.db_manager = db_manager
+        self.chunk_size = max(1, chunk_size)
+        self.label = label
+        self.sizer = sizer
+        self.writers = max(1, min(writers, len(items) or 1))
+        self.chunks: List[ChunkStat] = []
+        self._sizers: List[ChunkSizer] = []
+        
+        self.state = self.PENDING
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.started_at = None
+        self.finished_at = None
+        self.metrics = None   # счетчики подключения задачи (повторы и т.п.)
+        
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Запуск задачи в фоновом потоке"""
+        self.state = self.RUNNING
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+    
+    def cancel(self):
+        """Запрос отмены (задача остановится на границе порции)"""
+        self._cancel.set()
+    
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+    
+    def is_running(self) -> bool:
+        return self.state in (self.PENDING, self.RUNNING)
+    
+    def wait(self, timeout: float = None):
+        """Ожидание завершения задачи"""
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def progress(self) -> JobProgress:
+        """Текущее состояние задачи (потокобезопасно)"""
+        with self._lock:
+            end = self.finished_at or time.monotonic()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return JobProgress(
+                state=self.state,
+                done=self.done,
+                total=len(self.items),
+                succeeded=self.succeeded,
+                failed=self.failed,
+                elapsed=elapsed,
+                retries=self.metrics.retries if self.metrics else 0,
+                chunk_size=self._current_chunk_size()
+            )
+    
+    def _current_chunk_size(self) -> int:
+        """Текущий размер порции (средний по потокам записи)"""
+        sizers = self._sizers or ([self.sizer] if self.sizer else [])
+        if not sizers:
+            return self.chunk_size
+        return sum(sizer.next_size() for sizer in sizers) // len(sizers)
+    
+    def write_report(self, filename: str) -> int:
+        """Сохранение полного отчета об ошибках в CSV
+        
+        После ошибок следует таблица порций: начало, размер, время, ошибки.
+        """
+        with self._lock:
+            errors = list(self.errors)
+            chunks = list(self.chunks)
+        
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Item', 'Error'])
+            writer.writerows(errors)
+        
+            if chunks:
+                writer.writerow([])
+                writer.writerow(['Chunk', 'Writer', 'Start', 'Size', 'Seconds', 'Failed'])
+                writer.writerows(
+                    (number, chunk.writer, chunk.start, chunk.size, f"{chunk.seconds:.3f}", chunk.failed)
+                    for number, chunk in enumerate(chunks, 1)
+                )
+        
+        return len(errors)
+    
+    def chunk_summary(self) -> str:
+        """Краткая сводка размеров порций для лога"""
+        with self._lock:
+            sizes = [chunk.size for chunk in self.chunks]
+        if not sizes:
+            return "порций нет"
+        return (f"порций {len(sizes)}, размер мин. {min(sizes)} / сред. {sum(sizes) // len(sizes)} "
+                f"/ макс. {max(sizes)}")
+    
+    def _partitions(self) -> List[Sequence[Any]]:
+        """Разделы элементов по хэшу имени (стабильному между запусками)"""
+        if self.writers == 1:
+            return [self.items]
+        partitions = [[] for _ in range(self.writers)]
+        for item in self.items:
+            key = str(self.label(item)).encode('utf-8')
+            partitions[zlib.crc32(key) % self.writers].append(item)
+        return [partition for partition in partitions if partition]
+    
+    def _run(self):
+        """Основной цикл задачи: по потоку записи на раздел"""
+        connections = []
+        try:
+            partitions = self._partitions()
+            
+            # Подключения открываем заранее: при ошибке задача не начнется
+            for _ in partitions:
+                db = self.db_manager.spawn(metrics=self.metrics)
+                if db is None:
+                    raise RuntimeError("Не удалось открыть подключение для фоновой задачи")
+                connections.append(db)
+                if self.metrics is None:
+                    self.metrics = db.metrics
+                
+            self._sizers = [copy.deepcopy(self.sizer) for _ in partitions] if self.sizer else []
+                
+            if len(partitions) == 1:
+                self._run_writer(0, connections[0], partitions[0])
+            else:
+                threads = [
+                    threading.Thread(target=self._run_writer, args=(index, db, partition),
+                                     name=f"job-{self.name}-{index}", daemon=True)
+                    for index, (db, partition) in enumerate(zip(connections, partitions))
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            
+            final_state = self.CANCELLED if self.done < len(self.items) else self.FINISHED
+        
+        except Exception as e:
+            with self._lock:
+                self.errors.append((self.name, str(e)))
+            final_state = self.FAILED
+        
+        finally:
+            for db in connections:
+                db.close()
+        
+        with self._lock:
+            self.state = final_state
+            self.finished_at = time.monotonic()
+    
+    def _run_writer(self, index: int, db, items: Sequence[Any]):
+        """Обработка раздела порциями через свое подключение"""
+        sizer = self._sizers[index] if self._sizers else None
+        start = 0
+        while start < len(items):
+            if self._cancel.is_set():
+                break
+            
+            size = sizer.next_size() if sizer else self.chunk_size
+            chunk = items[start:start + size]
+            chunk_started = time.monotonic()
+            try:
+                results = self.process(db, chunk)
+            except Exception as e:
+                results = [str(e)] * len(chunk)
+            seconds = time.monotonic() - chunk_started
+            failed = sum(1 for error in results if error is not None)
+            
+            if sizer:
+                sizer.record(len(chunk), seconds, failed)
+            
+            with self._lock:
+                for item, error in zip(chunk, results):
+                    if error is None:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+                        self.errors.append((self.label(item), error))
+                self.done += len(chunk)
+                self.chunks.append(ChunkStat(start, len(chunk), seconds, failed, index))
+            start += len(chunk)
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Форматирование длительности в виде ЧЧ:ММ:СС"""
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def write_error_report(filename: str, errors: Sequence[str]) -> int:
+    """Сохранение списка ошибок (строк) в текстовый файл"""
+    with open(filename, 'w', encoding='utf-8') as f:
+        for error in errors:
+            f.write(f"{error}\n")
+    return len(errors)
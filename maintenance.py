@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Фоновое обслуживание базы данных в окне обслуживания
+"""
+
+import threading
+import time
+from datetime import datetime, time as day_time
+from typing import Optional, Tuple
+
+from schema import QUOTA_VERSION, ROLLUP_PENDING_VERSION
+
+def parse_window(spec: str) -> Optional[Tuple[day_time, day_time]]:
+    """Разбор окна обслуживания 'ЧЧ:ММ-ЧЧ:ММ' (None - окно не ограничено)
+    
+    Окно может переходить через полночь ('23:00-05:00').
+    Некорректная строка вызывает ValueError.
+    """
+    if not spec or not spec.strip():
+        return None
+    start, end = (datetime.strptime(part.strip(), '%H:%M').time() for part in spec.split('-', 1))
+    return start, end
+
+def in_window(window: Optional[Tuple[day_time, day_time]], now: datetime = None) -> bool:
+    """Попадает ли текущее время в окно обслуживания"""
+    if window is None:
+        return True
+    start, end = window
+    current = (now or datetime.now()).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+class AccountingCleaner:
+    """Фоновая очистка radacct удаленных пользователей
+    
+    Поток раз в check_interval секунд проверяет очередь rm_acct_cleanup и,
+    если текущее время в окне обслуживания, удаляет сессии порциями через
+    отдельное подключение (DatabaseManager.cleanup_accounting). При выходе
+    из окна очистка прерывается на границе порции. Прогресс читается из
+    потока Tk через progress(). При acct_stale_close в том же окне
+    закрываются зависшие сессии (close_stale_sessions). Агрегаты radacct
+    (update_rollups) и счетчики квот (update_quota_counters) обновляются
+    на каждой проверке, независимо от окна.
+    """
+    
+    CHECK_INTERVAL = 60.0
+    
+    def __init__(self, db_manager, logger=None, check_interval: float = CHECK_INTERVAL):
+        self.db = db_manager
+        self.logger = logger
+        self.check_interval = check_interval
+        self.window = None
+        
+        self._lock = threading.Lock()
+        self._active = False
+        self._deleted = 0
+        self._total = 0
+        
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def start(self, window_spec: str = ''):
+        """Запуск фоновой проверки очереди"""
+        try:
+            self.window = parse_window(window_spec)
+        except ValueError:
+            self.window = None
+            if self.logger:
+                self.logger.log(f"Некорректное окно обслуживания '{window_spec}', "
+                                f"ожидается ЧЧ:ММ-ЧЧ:ММ; очистка radacct без ограничения времени")
+        
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                        name="acct-cleanup", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 1.0):
+        """Остановка (текущая порция завершается)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+    
+    def progress(self) -> Tuple[bool, int, int]:
+        """(идет очистка, удалено сессий, всего в очереди)"""
+        with self._lock:
+            return self._active, self._deleted, self._total
+    
+    def _allowed(self) -> bool:
+        return in_window(self.window)
+    
+    def _on_progress(self, deleted: int, total: int):
+        with self._lock:
+            self._deleted = deleted
+            self._total = total
+    
+    def _run(self, stop: threading.Event):
+        """Цикл проверки очереди"""
+        while not stop.is_set():
+            if self.db.connection_status:
+                self._rollup(stop)
+            if self._allowed() and self.db.connection_status:
+                self._clean(stop)
+            
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+    
+    def _rollup(self, stop: threading.Event):
+        """Добавление новых сессий в агрегаты и счетчики квот"""
+        worker = self.db.spawn()
+        if worker is None:
+            return
+        try:
+            if worker.schema_version >= QUOTA_VERSION:
+                worker.update_quota_counters()
+            if worker.schema_version >= ROLLUP_PENDING_VERSION:
+                worker.update_rollups(cancel=stop)
+        finally:
+            worker.close()
+    
+    def _clean(self, stop: threading.Event):
+        """Одна очистка очереди через отдельное подключение"""
+        worker = self.db.spawn()
+        if worker is None:
+            return
+        try:
+            config = worker.config
+            if config.acct_stale_close:
+                worker.close_stale_sessions(
+                    config.acct_stale_factor,
+                    config.acct_stale_interval,
+                    batch_size=config.acct_batch_size,
+                    delay=config.acct_batch_delay,
+                    cancel=stop
+                )
+            
+            if not worker.pending_acct_cleanup():
+                return
+            
+            with self._lock:
+                self._active = True
+                self._deleted = self._total = 0
+            started = time.monotonic()
+            
+            worker.cleanup_accounting(
+                batch_size=config.acct_batch_size,
+                delay=config.acct_batch_delay,
+                archive=config.acct_cleanup_archive,
+                allowed=self._allowed,
+                cancel=stop,
+                progress=self._on_progress
+            )
+            
+            if self.logger and not self._allowed():
+                self.logger.log(f"Очистка radacct остановлена: окно обслуживания закончилось "
+                                f"({time.monotonic() - started:.0f} с)")
+        finally:
+            with self._lock:
+                self._active = False
+            worker.close()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Модели данных для табличных представлений
+"""
+
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from utils.helpers import format_file_size
+
+def text_key(value: Any) -> str:
+    """Ключ сортировки для текста без учета регистра"""
+    return str(value or '').casefold()
+
+def int_key(value: Any) -> int:
+    """Ключ сортировки для целых чисел"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def datetime_key(value: Any) -> datetime:
+    """Ключ сортировки для даты в формате 'YYYY-MM-DD HH:MM' ('Никогда' - в начале)"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d %H:%M')
+    except ValueError:
+        return datetime.min
+
+class TableModel:
+    """Модель таблицы с кэшированными ключами сортировки и перестановками"""
+
+    def __init__(self, columns: Sequence[str], sort_keys: Dict[str, Callable[[Any], Any]] = None):
+        self.columns = tuple(columns)
+        self.sort_keys = sort_keys or {}
+        self.rows: List[tuple] = []
+        self.view = array('i')
+        self.sort_column: Optional[str] = None
+        self.sort_reverse = False
+
+        # Кэши: ключи и возрастающая перестановка по каждой колонке
+        self._keys: Dict[str, list] = {}
+        self._permutations: Dict[str, array] = {}
+        self._mask: Optional[bytearray] = None
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def set_rows(self, rows: Sequence[tuple]):
+        """Замена данных модели (сбрасывает кэши, сохраняет сортировку)"""
+        self.rows = [tuple(row) for row in rows]
+        self._invalidate()
+
+    def clear(self):
+        """Очистка модели"""
+        self.set_rows([])
+
+    def row_count(self) -> int:
+        """Общее количество строк без учета фильтра"""
+        return len(self.rows)
+
+    def row(self, position: int) -> tuple:
+        """Строка по позиции в текущем представлении"""
+        return self.row_by_id(self.view[position])
+
+    def row_id(self, position: int) -> int:
+        """Идентификатор строки по позиции в текущем представлении"""
+        return self.view[position]
+
+    def row_by_id(self, row_id: int) -> tuple:
+        """Строка по идентификатору"""
+        return self.rows[row_id]
+
+    def position_of(self, row_id: int) -> int:
+        """Позиция строки в представлении (-1, если строка скрыта)"""
+        try:
+            return self.view.index(row_id)
+        except ValueError:
+            return -1
+
+    def column_values(self, column: str) -> Sequence[Any]:
+        """Значения колонки для всех строк"""
+        index = self.columns.index(column)
+        return [row[index] for row in self.rows]
+
+    def sort(self, column: str, reverse: bool = None):
+        """Сортировка по колонке; повторный вызов без reverse меняет направление"""
+        if reverse is None:
+            reverse = (not self.sort_reverse) if column == self.sort_column else False
+
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self._rebuild_view()
+
+    def set_filter(self, predicate: Optional[Callable[[int], bool]]):
+        """Установка фильтра по идентификатору строки (None - без фильтра)"""
+        if predicate is None:
+            self._mask = None
+        else:
+            self._mask = bytearray(1 if predicate(row_id) else 0 for row_id in range(self.row_count()))
+        self._rebuild_view()
+
+    def _sort_keys_for(self, column: str) -> list:
+        """Предвычисленные ключи сортировки колонки"""
+        keys = self._keys.get(column)
+        if keys is None:
+            key_func = self.sort_keys.get(column, text_key)
+            keys = [key_func(value) for value in self.column_values(column)]
+            self._keys[column] = keys
+        return keys
+
+    def _permutation(self, column: str) -> array:
+        """Возрастающая перестановка строк по колонке (вычисляется один раз)"""
+        permutation = self._permutations.get(column)
+        if permutation is None:
+            keys = self._sort_keys_for(column)
+            permutation = array('i', sorted(range(len(keys)), key=keys.__getitem__))
+            self._permutations[column] = permutation
+        return permutation
+
+    def _invalidate(self):
+        """Сброс кэшей после изменения данных"""
+        self._keys.clear()
+        self._permutations.clear()
+        self._mask = None
+        self._rebuild_view()
+
+    def _rebuild_view(self):
+        """Пересборка представления за O(n) из кэшированной перестановки"""
+        if self.sort_column in self.columns:
+            order = self._permutation(self.sort_column)
+            if self.sort_reverse:
+                order = order[::-1]
+        else:
+            order = range(self.row_count())
+
+        mask = self._mask
+        if mask is None:
+            self.view = array('i', order)
+        else:
+            self.view = array('i', (row_id for row_id in order if mask[row_id]))
+
+
+class UserStore(TableModel):
+    """Компактное колоночное хранилище пользователей RADIUS
+
+    Вместо объекта на каждую строку хранит колонки в массивах: имена - в списке,
+    группы и статусы - индексами в таблицах интернированных строк, время
+    последнего входа - целым числом минут. Строки для отображения собираются
+    только по запросу (для видимых строк таблицы).
+    """
+
+    COLUMNS = ('username', 'group', 'status', 'last_login')
+    NEVER = 'Никогда'
+    EPOCH = datetime(2000, 1, 1)
+
+    def __init__(self):
+        super().__init__(self.COLUMNS)
+        self.usernames: List[str] = []
+        self.group_ids = array('I')
+        self.status_ids = array('B')
+        self.last_logins = array('q')   # минуты от EPOCH, -1 - никогда
+
+        # Интернированные значения групп и статусов
+        self.groups: List[str] = []
+        self.statuses: List[str] = []
+        self._group_index: Dict[str, int] = {}
+        self._status_index: Dict[str, int] = {}
+
+    def row_count(self) -> int:
+        return len(self.usernames)
+
+    def clear(self):
+        """Очистка хранилища"""
+        self.usernames = []
+        self.group_ids = array('I')
+        self.status_ids = array('B')
+        self.last_logins = array('q')
+        self.groups = []
+        self.statuses = []
+        self._group_index = {}
+        self._status_index = {}
+        self._invalidate()
+
+    def set_rows(self, rows: Sequence[tuple]):
+        """Замена данных строками (username, group, status, last_login_minutes)"""
+        self.clear()
+        self.extend(rows)
+        self.commit()
+
+    def extend(self, rows: Sequence[tuple]):
+        """Добавление порции строк (username, group, status, last_login_minutes)
+
+        После загрузки всех порций нужно вызвать commit().
+        """
+        append_username = self.usernames.append
+        append_group = self.group_ids.append
+        append_status = self.status_ids.append
+        append_login = self.last_logins.append
+        group_id = self.group_id
+        status_id = self.status_id
+
+        for username, group, status, last_login in rows:
+            append_username(username or '')
+            append_group(group_id(group or 'default'))
+            append_status(status_id(status or 'Активен'))
+            append_login(-1 if last_login is None else int(last_login))
+
+    def commit(self):
+        """Завершение загрузки: сброс кэшей и пересборка представления"""
+        self._invalidate()
+
+    def replace_with(self, other: 'UserStore'):
+        """Перенос данных из другого хранилища (например, загруженного в фоне)
+        
+        Колонки передаются без копирования, сортировка текущего хранилища сохраняется.
+        """
+        self.usernames = other.usernames
+        self.group_ids = other.group_ids
+        self.status_ids = other.status_ids
+        self.last_logins = other.last_logins
+        self.groups = other.groups
+        self.statuses = other.statuses
+        self._group_index = other._group_index
+        self._status_index = other._status_index
+        self._invalidate()
+    
+    def group_id(self, group: str) -> int:
+        """Индекс интернированной группы (добавляет новую при необходимости)"""
+        index = self._group_index.get(group)
+        if index is None:
+            index = len(self.groups)
+            self.groups.append(group)
+            self._group_index[group] = index
+        return index
+
+    def status_id(self, status: str) -> int:
+        """Индекс интернированного статуса (добавляет новый при необходимости)"""
+        index = self._status_index.get(status)
+        if index is None:
+            index = len(self.statuses)
+            self.statuses.append(status)
+            self._status_index[status] = index
+        return index
+
+    def find_group(self, group: str) -> int:
+        """Индекс группы без добавления (-1, если группы нет)"""
+        return self._group_index.get(group, -1)
+
+    def find_status(self, status: str) -> int:
+        """Индекс статуса без добавления (-1, если статуса нет)"""
+        return self._status_index.get(status, -1)
+
+    def folded_usernames(self) -> List[str]:
+        """Имена в нижнем регистре для поиска (общий кэш с ключами сортировки)"""
+        return self._sort_keys_for('username')
+
+    def format_last_login(self, minutes: int) -> str:
+        """Время последнего входа в формате 'YYYY-MM-DD HH:MM'"""
+        if minutes < 0:
+            return self.NEVER
+        return (self.EPOCH + timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M')
+
+    def row_by_id(self, row_id: int) -> tuple:
+        return (
+            self.usernames[row_id],
+            self.groups[self.group_ids[row_id]],
+            self.statuses[self.status_ids[row_id]],
+            self.format_last_login(self.last_logins[row_id])
+        )
+
+    def column_values(self, column: str) -> Sequence[Any]:
+        if column == 'username':
+            return self.usernames
+        if column == 'group':
+            return [self.groups[group_id] for group_id in self.group_ids]
+        if column == 'status':
+            return [self.statuses[status_id] for status_id in self.status_ids]
+        if column == 'last_login':
+            return [self.format_last_login(minutes) for minutes in self.last_logins]
+        raise KeyError(column)
+
+    def _sort_keys_for(self, column: str) -> Sequence[Any]:
+        keys = self._keys.get(column)
+        if keys is not None:
+            return keys
+
+        if column == 'username':
+            keys = [username.casefold() for username in self.usernames]
+        elif column == 'group':
+            group_keys = [text_key(group) for group in self.groups]
+            keys = [group_keys[group_id] for group_id in self.group_ids]
+        elif column == 'status':
+            status_keys = [text_key(status) for status in self.statuses]
+            keys = [status_keys[status_id] for status_id in self.status_ids]
+        elif column == 'last_login':
+            # Минуты уже упорядочены как даты, -1 ('Никогда') - в начале
+            keys = self.last_logins
+        else:
+            raise KeyError(column)
+
+        self._keys[column] = keys
+        return keys
+
+
+class OnlineSessions(TableModel):
+    """Открытые сессии radacct с инкрементальным обновлением
+    
+    Сессии хранятся по radacctid; apply() добавляет новые, обновляет
+    счетчики и убирает закрытые. Обновленные счетчики меняются на месте,
+    представление пересобирается целиком только при изменении набора сессий. Строки для отображения форматируются
+    по запросу, сортировка идет по исходным значениям.
+    """
+    
+    COLUMNS = ('username', 'nasipaddress', 'framedipaddress', 'acctstarttime',
+               'acctinputoctets', 'acctoutputoctets')
+    
+    def __init__(self):
+        super().__init__(self.COLUMNS, sort_keys={
+            'acctstarttime': datetime_key,
+            'acctinputoctets': int_key,
+            'acctoutputoctets': int_key,
+        })
+        self.sessions: Dict[int, tuple] = {}
+        self._row_ids: Dict[int, int] = {}
+    
+    def replace(self, rows: Sequence[tuple]):
+        """Полная замена строками (radacctid, ..., acctstoptime)"""
+        self.sessions = {row[0]: tuple(row[1:-1]) for row in rows if row[-1] is None}
+        self._publish()
+    
+    def apply(self, rows: Sequence[tuple]) -> bool:
+        """Применение изменений; True - список изменился
+        
+        Если набор сессий не изменился, измененные строки обновляются на месте
+        и сбрасываются кэши только затронутых колонок; полная пересборка -
+        только при появлении или закрытии сессий.
+        """
+        added = removed = False
+        updates: Dict[int, tuple] = {}
+        for row in rows:
+            session_id = row[0]
+            if row[-1] is not None:
+                if self.sessions.pop(session_id, None) is not None:
+                    removed = True
+                    updates.pop(session_id, None)
+            else:
+                values = tuple(row[1:-1])
+                if self.sessions.get(session_id) != values:
+                    added |= session_id not in self.sessions
+                    self.sessions[session_id] = values
+                    updates[session_id] = values
+        
+        if added or removed:
+            self._publish()
+        elif updates:
+            self._update_rows(updates)
+        return added or removed or bool(updates)
+    
+    def clear(self):
+        self.sessions = {}
+        self._publish()
+    
+    def _publish(self):
+        """Пересборка строк модели из словаря сессий (сортировка сохраняется)"""
+        self._row_ids = {session_id: row_id for row_id, session_id in enumerate(self.sessions)}
+        self.set_rows(list(self.sessions.values()))
+    
+    def _update_rows(self, updates: Dict[int, tuple]):
+        """Замена строк на месте с точечным сбросом кэшей сортировки"""
+        changed_columns = set()
+        for session_id, values in updates.items():
+            row_id = self._row_ids[session_id]
+            old = self.rows[row_id]
+            self.rows[row_id] = values
+            for index, column in enumerate(self.columns):
+                if old[index] != values[index]:
+                    changed_columns.add(column)
+                    keys = self._keys.get(column)
+                    if keys is not None:
+                        keys[row_id] = self.sort_keys.get(column, text_key)(values[index])
+        
+        for column in changed_columns:
+            self._permutations.pop(column, None)
+        if self.sort_column in changed_columns:
+            self._rebuild_view()
+    
+    def row_by_id(self, row_id: int) -> tuple:
+        username, nas, framed_ip, started, octets_in, octets_out = self.rows[row_id]
+        return (
+            username or '',
+            nas or '',
+            framed_ip or '',
+            started.strftime('%Y-%m-%d %H:%M') if isinstance(started, datetime) else '',
+            format_file_size(octets_in or 0),
+            format_file_size(octets_out or 0),
+        )
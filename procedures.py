@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Хранимые процедуры RADIUS Manager для записи пользователей за один запрос
+"""
+
+import re
+from typing import Dict, List, Optional
+
+# Версия набора процедур; увеличивается при любом изменении текста ниже.
+# Номер записывается в тело каждой процедуры комментарием VERSION_MARKER.
+PROCEDURES_VERSION = 2
+VERSION_MARKER = 'rm_version:'
+
+# Табличный тип для передачи атрибутов (TVP): строки (attribute, op, value)
+ATTRIBUTE_TYPE = 'rm_attribute_list'
+
+ATTRIBUTE_TYPE_DDL = f"""
+CREATE TYPE {ATTRIBUTE_TYPE} AS TABLE (
+    attribute NVARCHAR(64) NOT NULL,
+    op CHAR(2) NOT NULL,
+    value NVARCHAR(253) NOT NULL
+)
+"""
+
+PROCEDURES: Dict[str, str] = {
+    'rm_add_user': f"""
+CREATE PROCEDURE rm_add_user
+    @username NVARCHAR(64),
+    @groupname NVARCHAR(64),
+    @check {ATTRIBUTE_TYPE} READONLY,
+    @reply {ATTRIBUTE_TYPE} READONLY
+AS
+-- {VERSION_MARKER} {PROCEDURES_VERSION}
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO radcheck (username, attribute, op, value)
+        SELECT @username, attribute, op, value FROM @check;
+    INSERT INTO radusergroup (username, groupname, priority)
+        VALUES (@username, @groupname, 10);
+    INSERT INTO radreply (username, attribute, op, value)
+        SELECT @username, attribute, op, value FROM @reply;
+END
+""",
+    'rm_delete_user': f"""
+CREATE PROCEDURE rm_delete_user
+    @username NVARCHAR(64)
+AS
+-- {VERSION_MARKER} {PROCEDURES_VERSION}
+BEGIN
+    SET NOCOUNT ON;
+    DELETE FROM radcheck WHERE username = @username;
+    DELETE FROM radreply WHERE username = @username;
+    DELETE FROM radusergroup WHERE username = @username;
+    IF OBJECT_ID('rm_acct_cleanup', 'U') IS NOT NULL
+    BEGIN
+        -- Сессии удаляет фоновая очистка порциями
+        UPDATE rm_acct_cleanup
+            SET upto_id = (SELECT ISNULL(MAX(radacctid), 0) FROM radacct), queued_at = SYSUTCDATETIME()
+            WHERE username = @username;
+        IF @@ROWCOUNT = 0
+            INSERT INTO rm_acct_cleanup (username, upto_id)
+                SELECT @username, ISNULL(MAX(radacctid), 0) FROM radacct;
+    END
+    ELSE IF OBJECT_ID('radacct', 'U') IS NOT NULL
+        DELETE FROM radacct WHERE username = @username;
+END
+""",
+    'rm_block_user': f"""
+CREATE PROCEDURE rm_block_user
+    @username NVARCHAR(64),
+    @block BIT
+AS
+-- {VERSION_MARKER} {PROCEDURES_VERSION}
+BEGIN
+    SET NOCOUNT ON;
+    IF @block = 1
+        INSERT INTO radcheck (username, attribute, op, value)
+            VALUES (@username, 'Login-Time', ':=', 'Never');
+    ELSE
+        DELETE FROM radcheck
+            WHERE username = @username AND attribute = 'Login-Time' AND value = 'Never';
+END
+""",
+    # Замена значений перечисленных атрибутов; новый пароль заменяет
+    # все атрибуты *-Password пользователя
+    'rm_set_attributes': f"""
+CREATE PROCEDURE rm_set_attributes
+    @username NVARCHAR(64),
+    @check {ATTRIBUTE_TYPE} READONLY,
+    @reply {ATTRIBUTE_TYPE} READONLY
+AS
+-- {VERSION_MARKER} {PROCEDURES_VERSION}
+BEGIN
+    SET NOCOUNT ON;
+    DELETE FROM radcheck
+        WHERE username = @username
+          AND (attribute IN (SELECT attribute FROM @check)
+               OR (attribute LIKE '%Password'
+                   AND EXISTS (SELECT 1 FROM @check WHERE attribute LIKE '%Password')));
+    INSERT INTO radcheck (username, attribute, op, value)
+        SELECT @username, attribute, op, value FROM @check;
+    DELETE FROM radreply
+        WHERE username = @username AND attribute IN (SELECT attribute FROM @reply);
+    INSERT INTO radreply (username, attribute, op, value)
+        SELECT @username, attribute, op, value FROM @reply;
+END
+""",
+}
+
+def procedure_version(definition: Optional[str]) -> int:
+    """Версия процедуры по тексту ее определения (0 - без отметки)"""
+    match = re.search(re.escape(VERSION_MARKER) + r'\s*(\d+)', definition or '')
+    return int(match.group(1)) if match else 0
+
+def attribute_rows(rows: List[tuple]) -> List[tuple]:
+    """Строки TVP (attribute, op, value) из строк (username, attribute, value, op)"""
+    return [(attribute, op, value) for _, attribute, value, op in rows]
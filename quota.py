@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Квоты времени и трафика для FreeRADIUS sqlcounter
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+# Счетчики использования по пользователям: строка на (пользователь, период)
+COUNTER_TABLE = 'rm_quota_counter'
+
+# Периоды счетчиков
+DAILY = 'D'
+MONTHLY = 'M'
+
+# Начало текущего периода по часам сервера БД (в них же пишется acctstarttime)
+PERIOD_START = {
+    DAILY: "CAST(GETDATE() AS DATE)",
+    MONTHLY: "DATEFROMPARTS(YEAR(GETDATE()), MONTH(GETDATE()), 1)",
+}
+
+@dataclass(frozen=True)
+class QuotaCounter:
+    """Квота: check-атрибут с лимитом и счетчик, с которым его сравнивает sqlcounter"""
+    check_name: str
+    counter_name: str
+    instance: str
+    period: str
+    column: str
+    title: str
+    unit: int = 1
+    reply_name: str = ''
+    
+    def query(self) -> str:
+        """Запрос sqlcounter: поиск одной строки по первичному ключу"""
+        return (f"SELECT ISNULL(SUM({self.column}), 0) FROM {COUNTER_TABLE} "
+                f"WHERE username = '%{{${{key}}}}' AND period = '{self.period}' "
+                f"AND period_start = {PERIOD_START[self.period]}")
+    
+    def sqlcounter_config(self, sql_instance: str = 'sql') -> str:
+        """Секция модуля sqlcounter для mods-available/sqlcounter"""
+        lines = [
+            f"sqlcounter {self.instance} {{",
+            f"\tsql_module_instance = {sql_instance}",
+            f"\tdialect = ${{modules.{sql_instance}.dialect}}",
+            f"\tcounter_name = {self.counter_name}",
+            f"\tcheck_name = {self.check_name}",
+        ]
+        if self.reply_name:
+            lines.append(f"\treply_name = {self.reply_name}")
+        lines += [
+            "\tkey = User-Name",
+            f"\treset = {'daily' if self.period == DAILY else 'monthly'}",
+            f"\tquery = \"{self.query()}\"",
+            "}",
+        ]
+        return '\n'.join(lines)
+    
+    def to_value(self, amount: float) -> str:
+        """Значение атрибута из количества в единицах title (часы, ГБ)"""
+        return str(int(amount * self.unit))
+
+# Лимиты трафика больше 4 ГБ требуют типа integer64 в словаре FreeRADIUS
+QUOTA_COUNTERS = (
+    QuotaCounter('Max-Daily-Session', 'Daily-Session-Time', 'dailycounter', DAILY,
+                 'session_time', "Время в сутки, ч", 3600, 'Session-Timeout'),
+    QuotaCounter('Max-Monthly-Session', 'Monthly-Session-Time', 'monthlycounter', MONTHLY,
+                 'session_time', "Время в месяц, ч", 3600, 'Session-Timeout'),
+    QuotaCounter('Max-Daily-Traffic', 'Daily-Traffic', 'dailytraffic', DAILY,
+                 'total_octets', "Трафик в сутки, ГБ", 1024 ** 3),
+    QuotaCounter('Max-Monthly-Traffic', 'Monthly-Traffic', 'monthlytraffic', MONTHLY,
+                 'total_octets', "Трафик в месяц, ГБ", 1024 ** 3),
+)
+
+def find_counter(check_name: str) -> Optional[QuotaCounter]:
+    """Квота по имени check-атрибута"""
+    for counter in QUOTA_COUNTERS:
+        if counter.check_name.lower() == check_name.lower():
+            return counter
+    return None
+
+def sqlcounter_config(sql_instance: str = 'sql') -> str:
+    """Конфигурация всех счетчиков для FreeRADIUS (mods-available/sqlcounter)"""
+    sections: List[str] = [counter.sqlcounter_config(sql_instance) for counter in QUOTA_COUNTERS]
+    return '\n\n'.join(sections) + '\n'
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Описание схемы RADIUS: таблицы, индексы и нумерованные миграции
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import List, Tuple, Union
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Индекс таблицы RADIUS"""
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+    include: Tuple[str, ...] = ()
+    where: str = ''
+    unique: bool = False
+    
+    def ddl(self, online: bool = False) -> str:
+        """Оператор CREATE INDEX (online - без блокировки таблицы на время построения)"""
+        sql = (f"CREATE {'UNIQUE ' if self.unique else ''}NONCLUSTERED INDEX {self.name} "
+               f"ON {self.table} ({', '.join(self.columns)})")
+        if self.include:
+            sql += f" INCLUDE ({', '.join(self.include)})"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        if online:
+            sql += " WITH (ONLINE = ON)"
+        return sql
+
+# Индексы миграции 2; новые индексы добавляются новой миграцией,
+# иначе изменится контрольная сумма уже примененной
+INDEXES: List[IndexSpec] = [
+    # Поиск атрибутов пользователя и проверка пароля
+    IndexSpec('idx_radcheck_username_attribute', 'radcheck', ('username', 'attribute'), ('op', 'value')),
+    # Выборка по атрибуту: список пользователей, проверка Login-Time = 'Never'
+    IndexSpec('idx_radcheck_attribute_value', 'radcheck', ('attribute', 'value'), ('username',)),
+    IndexSpec('idx_radreply_username_attribute', 'radreply', ('username', 'attribute'), ('op', 'value')),
+    # Пользователь входит в группу не больше одного раза
+    IndexSpec('ux_radusergroup_username_groupname', 'radusergroup', ('username', 'groupname'), ('priority',),
+              unique=True),
+    # Последний вход и история сессий пользователя
+    IndexSpec('idx_radacct_username_starttime', 'radacct', ('username', 'acctstarttime DESC')),
+    IndexSpec('idx_radacct_acctstarttime', 'radacct', ('acctstarttime',)),
+    # Открытые сессии (фильтрованный индекс - только acctstoptime IS NULL)
+    IndexSpec('idx_radacct_open_sessions', 'radacct', ('username',),
+              ('acctsessionid', 'nasipaddress', 'acctstarttime', 'framedipaddress'),
+              where='acctstoptime IS NULL'),
+    IndexSpec('idx_radgroupcheck_groupname', 'radgroupcheck', ('groupname',)),
+    IndexSpec('idx_radgroupreply_groupname', 'radgroupreply', ('groupname',)),
+]
+
+@dataclass(frozen=True)
+class Backfill:
+    """Пакетное заполнение данных: UPDATE TOP (batch_size), пока есть строки
+    
+    Условие where должно исключать уже обновленные строки, иначе цикл
+    не закончится. Каждая порция фиксируется отдельно, чтобы не держать
+    блокировки на всю таблицу.
+    """
+    table: str
+    assignments: str
+    where: str
+    batch_size: int = 5000
+    
+    def sql(self) -> str:
+        return f"UPDATE TOP ({self.batch_size}) {self.table} SET {self.assignments} WHERE {self.where}"
+
+@dataclass(frozen=True)
+class Rollup:
+    """Таблица агрегатов radacct: суммы по ключу (пользователь, группа, NAS) за день или месяц
+    
+    Заполняется инкрементально из временной таблицы порции закрытых сессий
+    (колонки username, groupname, nasipaddress, day и суммы).
+    """
+    table: str
+    key: str
+    monthly: bool = False
+    
+    SUMS = ('sessions', 'session_time', 'input_octets', 'output_octets')
+    
+    def ddl(self) -> str:
+        return f"""
+IF OBJECT_ID('{self.table}', 'U') IS NULL
+CREATE TABLE {self.table} (
+    {self.key} NVARCHAR(64) NOT NULL,
+    period DATE NOT NULL,
+    sessions INT NOT NULL,
+    session_time BIGINT NOT NULL,
+    input_octets BIGINT NOT NULL,
+    output_octets BIGINT NOT NULL,
+    PRIMARY KEY ({self.key}, period)
+)
+"""
+    
+    def merge_sql(self, source: str) -> str:
+        """Прибавление сумм из source к строкам таблицы (MERGE по ключу и периоду)"""
+        period = "DATEFROMPARTS(YEAR(day), MONTH(day), 1)" if self.monthly else "day"
+        sums = ', '.join(f"SUM({column}) AS {column}" for column in self.SUMS)
+        updates = ', '.join(f"t.{column} = t.{column} + s.{column}" for column in self.SUMS)
+        columns = ', '.join((self.key, 'period') + self.SUMS)
+        values = ', '.join(f"s.{column}" for column in (self.key, 'period') + self.SUMS)
+        return (
+            f"MERGE {self.table} WITH (HOLDLOCK) AS t "
+            f"USING (SELECT ISNULL({self.key}, '') AS {self.key}, {period} AS period, {sums} "
+            f"FROM {source} GROUP BY ISNULL({self.key}, ''), {period}) AS s "
+            f"ON t.{self.key} = s.{self.key} AND t.period = s.period "
+            f"WHEN MATCHED THEN UPDATE SET {updates} "
+            f"WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values});"
+        )
+
+@dataclass(frozen=True)
+class DropIndex:
+    """Удаление индекса, замененного новым (если он есть)"""
+    name: str
+    table: str
+    
+    def sql(self) -> str:
+        return (f"IF EXISTS (SELECT * FROM sys.indexes WHERE name = '{self.name}' "
+                f"AND object_id = OBJECT_ID('{self.table}', 'U')) DROP INDEX {self.name} ON {self.table}")
+
+Step = Union[str, IndexSpec, Backfill, DropIndex]
+
+@dataclass(frozen=True)
+class Migration:
+    """Нумерованная миграция схемы
+    
+    Шаги - операторы SQL (каждый отдельным пакетом), индексы (создаются, если
+    их нет, с ONLINE = ON там, где сервер это поддерживает) и пакетные
+    заполнения. Шаги должны быть идемпотентны: прерванную миграцию можно
+    запустить повторно. Контрольная сумма текста шагов хранится в таблице
+    версий и сверяется, чтобы заметить изменение уже примененной миграции.
+    """
+    version: int
+    name: str
+    steps: Tuple[Step, ...]
+    
+    @property
+    def checksum(self) -> str:
+        parts = []
+        for step in self.steps:
+            if isinstance(step, IndexSpec):
+                text = step.ddl()
+            elif isinstance(step, (Backfill, DropIndex)):
+                text = step.sql()
+            else:
+                text = step
+            parts.append(re.sub(r'\s+', ' ', text).strip())
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+# Таблица версий схемы
+VERSION_TABLE = 'rm_schema_version'
+
+VERSION_TABLE_DDL = f"""
+IF OBJECT_ID('{VERSION_TABLE}', 'U') IS NULL
+CREATE TABLE {VERSION_TABLE} (
+    version INT NOT NULL PRIMARY KEY,
+    name NVARCHAR(128) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+)
+"""
+
+RADIUS_TABLES = ('radcheck', 'radreply', 'radusergroup', 'radacct', 'radgroupcheck', 'radgroupreply')
+
+# Стандартные таблицы RADIUS (пропускаются, если уже есть)
+TABLES_DDL = (
+    # Таблица radcheck
+    """
+    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radcheck')
+    CREATE TABLE radcheck (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        username NVARCHAR(64) NOT NULL,
+        attribute NVARCHAR(64) NOT NULL,
+        op CHAR(2) DEFAULT ':=' NOT NULL,
+        value NVARCHAR(253) NOT NULL
+    )
+    """,
+    # Таблица radreply
+    """
+    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radreply')
+    CREATE TABLE radreply (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        username NVARCHAR(64) NOT NULL,
+        attribute NVARCHAR(64) NOT NULL,
+        op CHAR(2) DEFAULT '=' NOT NULL,
+        value NVARCHAR(253) NOT NULL
+    )
+    """,
+    # Таблица radusergroup
+    """
+    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radusergroup')
+    CREATE TABLE radusergroup (
+        username NVARCHAR(64) NOT NULL,
+        groupname NVARCHAR(64) NOT NULL,
+        priority INT DEFAULT 10
+    )
+    """,
+    # Таблица radacct
+    """
+    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radacct')
+    CREATE TABLE radacct (
+        radacctid BIGINT IDENTITY(1,1) PRIMARY KEY,
+        acctsessionid NVARCHAR(64) NOT NULL,
+        acctuniqueid NVARCHAR(32) NOT NULL,
+        username NVARCHAR(64),
+        groupname NVARCHAR(64),
+        realm NVARCHAR(64),
+        nasipaddress NVARCHAR(15) NOT NULL,
+        nasportid NVARCHAR(15),
+        nasporttype NVARCHAR(32),
+        acctstarttime DATETIME,
+        acctstoptime DATETIME,
+        acctsessiontime INT,
+        acctauthentic NVARCHAR(32),
+        connectinfo_start NVARCHAR(50),
+        connectinfo_stop NVARCHAR(50),
+        acctinputoctets BIGINT,
+        acctoutputoctets BIGINT,
+        calledstationid NVARCHAR(50),
+        callingstationid NVARCHAR(50),
+        acctterminatecause NVARCHAR(32),
+        servicetype NVARCHAR(32),
+        framedprotocol NVARCHAR(32),
+        framedipaddress NVARCHAR(15)
+    )
+    """,
+    # Таблица radgroupcheck
+    """
+    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radgroupcheck')
+    CREATE TABLE radgroupcheck (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        groupname NVARCHAR(64) NOT NULL,
+        attribute NVARCHAR(64) NOT NULL,
+        op CHAR(2) DEFAULT ':=' NOT NULL,
+        value NVARCHAR(253) NOT NULL
+    )
+    """,
+    # Таблица radgroupreply
+    """
+    IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radgroupreply')
+    CREATE TABLE radgroupreply (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        groupname NVARCHAR(64) NOT NULL,
+        attribute NVARCHAR(64) NOT NULL,
+        op CHAR(2) DEFAULT '=' NOT NULL,
+        value NVARCHAR(253) NOT NULL
+    )
+    """,
+)
+
+# Стандартные колонки radacct в порядке таблицы (с колонками миграции 5).
+# При архивации список берется из sys.columns: дополнительные колонки
+# FreeRADIUS тоже переносятся (см. DatabaseManager._archive_columns)
+ACCT_COLUMNS = (
+    'radacctid', 'acctsessionid', 'acctuniqueid', 'username', 'groupname', 'realm',
+    'nasipaddress', 'nasportid', 'nasporttype', 'acctstarttime', 'acctstoptime',
+    'acctsessiontime', 'acctauthentic', 'connectinfo_start', 'connectinfo_stop',
+    'acctinputoctets', 'acctoutputoctets', 'calledstationid', 'callingstationid',
+    'acctterminatecause', 'servicetype', 'framedprotocol', 'framedipaddress',
+    'acctupdatetime', 'acctinterval',
+)
+
+# Архив закрытых сессий: те же колонки, radacctid переносится как есть
+ACCT_ARCHIVE_DDL = """
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'radacct_archive')
+CREATE TABLE radacct_archive (
+    radacctid BIGINT NOT NULL PRIMARY KEY,
+    acctsessionid NVARCHAR(64) NOT NULL,
+    acctuniqueid NVARCHAR(32) NOT NULL,
+    username NVARCHAR(64),
+    groupname NVARCHAR(64),
+    realm NVARCHAR(64),
+    nasipaddress NVARCHAR(15) NOT NULL,
+    nasportid NVARCHAR(15),
+    nasporttype NVARCHAR(32),
+    acctstarttime DATETIME,
+    acctstoptime DATETIME,
+    acctsessiontime INT,
+    acctauthentic NVARCHAR(32),
+    connectinfo_start NVARCHAR(50),
+    connectinfo_stop NVARCHAR(50),
+    acctinputoctets BIGINT,
+    acctoutputoctets BIGINT,
+    calledstationid NVARCHAR(50),
+    callingstationid NVARCHAR(50),
+    acctterminatecause NVARCHAR(32),
+    servicetype NVARCHAR(32),
+    framedprotocol NVARCHAR(32),
+    framedipaddress NVARCHAR(15)
+)
+"""
+
+def column_sql_type(type_name: str, max_length: int, precision: int, scale: int) -> str:
+    """Тип колонки для DDL по строке sys.columns/sys.types (max_length в байтах)"""
+    type_name = type_name.upper()
+    if type_name in ('NVARCHAR', 'NCHAR'):
+        return f"{type_name}({'MAX' if max_length == -1 else max_length // 2})"
+    if type_name in ('VARCHAR', 'CHAR', 'VARBINARY', 'BINARY'):
+        return f"{type_name}({'MAX' if max_length == -1 else max_length})"
+    if type_name in ('DECIMAL', 'NUMERIC'):
+        return f"{type_name}({precision}, {scale})"
+    if type_name in ('DATETIME2', 'DATETIMEOFFSET', 'TIME'):
+        return f"{type_name}({scale})"
+    return type_name
+
+# Очередь фоновой очистки radacct удаленных пользователей: удаляются сессии
+# с radacctid <= upto_id, чтобы не задеть пользователя, созданного заново
+ACCT_CLEANUP_DDL = """
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'rm_acct_cleanup')
+CREATE TABLE rm_acct_cleanup (
+    username NVARCHAR(64) NOT NULL PRIMARY KEY,
+    upto_id BIGINT NOT NULL,
+    queued_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+)
+"""
+
+# Агрегаты трафика и времени сессий (пользователь, группа и NAS по дням,
+# пользователь по месяцам); сессия относится к дню своего начала
+USAGE_ROLLUPS = (
+    Rollup('rm_usage_user_daily', 'username'),
+    Rollup('rm_usage_user_monthly', 'username', monthly=True),
+    Rollup('rm_usage_group_daily', 'groupname'),
+    Rollup('rm_usage_nas_daily', 'nasipaddress'),
+)
+
+# Отметки обработанных radacctid по заданиям агрегирования
+ROLLUP_STATE = 'rm_rollup_state'
+
+ROLLUP_STATE_DDL = f"""
+IF OBJECT_ID('{ROLLUP_STATE}', 'U') IS NULL
+CREATE TABLE {ROLLUP_STATE} (
+    name NVARCHAR(64) NOT NULL PRIMARY KEY,
+    high_water BIGINT NOT NULL,
+    updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+)
+"""
+
+# Сессии, открытые при обработке их диапазона radacctid: добавляются
+# в агрегаты при закрытии, не задерживая отметку
+ROLLUP_PENDING = 'rm_rollup_pending'
+
+ROLLUP_PENDING_DDL = f"""
+IF OBJECT_ID('{ROLLUP_PENDING}', 'U') IS NULL
+CREATE TABLE {ROLLUP_PENDING} (
+    radacctid BIGINT NOT NULL PRIMARY KEY
+)
+"""
+
+# Счетчики квот для sqlcounter (quota.py) и учтенные значения открытых
+# сессий, чтобы промежуточные обновления прибавляли только прирост
+QUOTA_DDL = (
+    """
+IF OBJECT_ID('rm_quota_counter', 'U') IS NULL
+CREATE TABLE rm_quota_counter (
+    username NVARCHAR(64) NOT NULL,
+    period CHAR(1) NOT NULL,
+    period_start DATE NOT NULL,
+    session_time BIGINT NOT NULL,
+    input_octets BIGINT NOT NULL,
+    output_octets BIGINT NOT NULL,
+    total_octets AS (input_octets + output_octets) PERSISTED,
+    PRIMARY KEY (username, period, period_start)
+)
+""",
+    """
+IF OBJECT_ID('rm_quota_session', 'U') IS NULL
+CREATE TABLE rm_quota_session (
+    radacctid BIGINT NOT NULL PRIMARY KEY,
+    day DATE NOT NULL,
+    session_time BIGINT NOT NULL,
+    input_octets BIGINT NOT NULL,
+    output_octets BIGINT NOT NULL
+)
+""",
+)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'radius_tables', TABLES_DDL),
+    Migration(2, 'indexes', tuple(INDEXES)),
+    Migration(3, 'radacct_archive', (
+        ACCT_ARCHIVE_DDL,
+        IndexSpec('idx_radacct_archive_username_starttime', 'radacct_archive', ('username', 'acctstarttime DESC')),
+    )),
+    Migration(4, 'acct_cleanup_queue', (ACCT_CLEANUP_DDL,)),
+    # Колонки FreeRADIUS 3 для промежуточных обновлений (добавление NULL-колонки
+    # меняет только метаданные) и индексы для просмотра открытых сессий
+    Migration(5, 'radacct_online', (
+        "IF COL_LENGTH('radacct', 'acctupdatetime') IS NULL ALTER TABLE radacct ADD acctupdatetime DATETIME NULL",
+        "IF COL_LENGTH('radacct', 'acctinterval') IS NULL ALTER TABLE radacct ADD acctinterval INT NULL",
+        IndexSpec('idx_radacct_online', 'radacct', ('radacctid',),
+                  ('username', 'nasipaddress', 'framedipaddress', 'acctstarttime', 'acctupdatetime',
+                   'acctinputoctets', 'acctoutputoctets'),
+                  where='acctstoptime IS NULL'),
+        IndexSpec('idx_radacct_acctupdatetime', 'radacct', ('acctupdatetime',)),
+    )),
+    # Агрегаты для отчетов; индексы по периоду - для топа за день/месяц
+    Migration(6, 'usage_rollups', tuple(rollup.ddl() for rollup in USAGE_ROLLUPS) + (
+        ROLLUP_STATE_DDL,
+        IndexSpec('idx_rm_usage_user_daily_period', 'rm_usage_user_daily', ('period',), Rollup.SUMS),
+        IndexSpec('idx_rm_usage_user_monthly_period', 'rm_usage_user_monthly', ('period',), Rollup.SUMS),
+    )),
+    Migration(7, 'quota_counters', QUOTA_DDL + (
+        IndexSpec('idx_rm_quota_counter_period_start', 'rm_quota_counter', ('period_start',)),
+    )),
+    # Поиск сессии по acctuniqueid при загрузке detail-файлов (MERGE по ключу)
+    Migration(8, 'radacct_uniqueid', (
+        IndexSpec('idx_radacct_acctuniqueid', 'radacct', ('acctuniqueid',)),
+    )),
+    # Колонки промежуточных обновлений (миграция 5) в архиве сессий
+    Migration(9, 'radacct_archive_columns', (
+        "IF OBJECT_ID('radacct_archive', 'U') IS NOT NULL AND COL_LENGTH('radacct_archive', 'acctupdatetime') IS NULL "
+        "ALTER TABLE radacct_archive ADD acctupdatetime DATETIME NULL",
+        "IF OBJECT_ID('radacct_archive', 'U') IS NOT NULL AND COL_LENGTH('radacct_archive', 'acctinterval') IS NULL "
+        "ALTER TABLE radacct_archive ADD acctinterval INT NULL",
+    )),
+    # Один фильтрованный индекс открытых сессий вместо idx_radacct_open_sessions
+    # и idx_radacct_online (acctstoptime в INCLUDE - иначе оптимизатор не
+    # считает его покрывающим) и покрывающий индекс изменений по acctupdatetime
+    Migration(10, 'radacct_online_covering', (
+        IndexSpec('idx_radacct_open', 'radacct', ('radacctid',),
+                  ('username', 'acctsessionid', 'nasipaddress', 'framedipaddress', 'acctstarttime',
+                   'acctupdatetime', 'acctinterval', 'acctsessiontime', 'acctinputoctets', 'acctoutputoctets',
+                   'acctstoptime'),
+                  where='acctstoptime IS NULL'),
+        IndexSpec('idx_radacct_updates', 'radacct', ('acctupdatetime',),
+                  ('username', 'nasipaddress', 'framedipaddress', 'acctstarttime',
+                   'acctinputoctets', 'acctoutputoctets', 'acctstoptime')),
+        DropIndex('idx_radacct_open_sessions', 'radacct'),
+        DropIndex('idx_radacct_online', 'radacct'),
+        DropIndex('idx_radacct_acctupdatetime', 'radacct'),
+    )),
+    Migration(11, 'rollup_pending', (ROLLUP_PENDING_DDL,)),
+]
+
+# Версия схемы, начиная с которой radacct удаленных пользователей чистится в фоне
+ACCT_CLEANUP_VERSION = 4
+
+# Версия схемы с колонкой acctupdatetime (инкрементальное обновление сессий)
+ACCT_UPDATES_VERSION = 5
+
+# Версия схемы с таблицами агрегатов radacct
+USAGE_VERSION = 6
+
+# Версия схемы со счетчиками квот
+QUOTA_VERSION = 7
+
+# Версия схемы с индексом по acctuniqueid (загрузка detail-файлов)
+DETAIL_VERSION = 8
+
+# Версия схемы с отложенным агрегированием открытых сессий
+ROLLUP_PENDING_VERSION = 11
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+def schema_indexes() -> List[IndexSpec]:
+    """Индексы схемы последней версии (без удаленных более поздними миграциями)"""
+    indexes = {}
+    for migration in MIGRATIONS:
+        for step in migration.steps:
+            if isinstance(step, IndexSpec):
+                indexes[step.name] = step
+            elif isinstance(step, DropIndex):
+                indexes.pop(step.name, None)
+    return list(indexes.values())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Фоновый контроль подключения к базе данных
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+from config import DatabaseConfig
+
+@dataclass
+class ConnectionEvent:
+    """Изменение состояния подключения"""
+    state: str
+    attempt: int = 0
+    retry_in: float = 0.0
+    message: str = ''
+    # Новое соединение для DatabaseManager.attach (только для CONNECTED)
+    connection: Any = None
+
+class ConnectionSupervisor:
+    """Подключение в фоновом потоке с проверкой и переподключением
+    
+    Поток открывает соединения, периодически проверяет связь с сервером
+    запросом SELECT 1 и при обрыве переподключается с экспоненциальной
+    задержкой. Общее соединение DatabaseManager.conn поток не трогает:
+    pyodbc запрещает использовать одно соединение из нескольких потоков,
+    а без MARS проверка во время чтения в потоке Tk получила бы ошибку
+    "connection busy". Поэтому проверка идет через собственное служебное
+    соединение, а новое основное соединение передается в событии CONNECTED
+    и подключается в потоке Tk (DatabaseManager.attach). Основное
+    соединение проверяет сам поток Tk (DatabaseManager.ping), а о его потере
+    (в том числе при неудачном переподключении в транзакции) сообщает
+    через connection_lost(). Изменения
+    состояния забираются в потоке Tk через poll_events(), поэтому поток не
+    обращается к виджетам.
+    """
+    
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+    RECONNECTING = 'reconnecting'
+    WAITING = 'waiting'
+    STOPPED = 'stopped'
+    
+    def __init__(self, db_manager, logger=None, ping_interval: float = 30.0,
+                 initial_delay: float = 1.0, max_delay: float = 60.0):
+        self.db = db_manager
+        self.logger = logger
+        self.ping_interval = max(1.0, ping_interval)
+        self.initial_delay = max(0.1, initial_delay)
+        self.max_delay = max(self.initial_delay, max_delay)
+        
+        self.state = self.STOPPED
+        self.config: Optional[DatabaseConfig] = None
+        self.attempt = 0
+        self.connected_once = False
+        
+        self._events = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._retry = threading.Event()
+        self._lost = threading.Event()
+        # Передача соединения и остановка не пересекаются (важно при перезапуске)
+        self._connect_lock = threading.Lock()
+        self._thread = None
+    
+    def start(self, config: DatabaseConfig):
+        """Запуск (или перезапуск) подключения с указанной конфигурацией"""
+        self.stop()
+        self.config = config
+        self.attempt = 0
+        self.connected_once = False
+        self._stop = threading.Event()
+        self._wake.clear()
+        self._retry.clear()
+        self._lost.clear()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                        name="db-supervisor", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 1.0):
+        """Остановка контроля (подключение не закрывается)
+        
+        Еще не переданные в поток Tk соединения закрываются.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        with self._connect_lock:
+            for event in self.poll_events():
+                self._close(event.connection)
+        if self.state != self.STOPPED:
+            self._set_state(self.STOPPED)
+    
+    def reconnect(self):
+        """Запрос нового соединения (основное не удалось подключить в потоке Tk)"""
+        self._retry.set()
+        self._wake.set()
+    
+    def connection_lost(self, message: str = ''):
+        """Потеря основного соединения (DatabaseManager.on_connection_lost, из любого потока)"""
+        if self.state == self.CONNECTED:
+            self._lost.set()
+            self._wake.set()
+    
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def poll_events(self) -> List[ConnectionEvent]:
+        """Накопленные изменения состояния (вызывается в потоке Tk)"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+    
+    def _set_state(self, state: str, retry_in: float = 0.0, message: str = '', connection=None):
+        self.state = state
+        self._events.put(ConnectionEvent(state, self.attempt, retry_in, message, connection))
+    
+    @staticmethod
+    def _close(connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+    
+    def _log(self, message: str):
+        if self.logger:
+            self.logger.log(message)
+    
+    def _run(self, stop: threading.Event):
+        """Основной цикл: подключение, проверка, переподключение"""
+        delay = self.initial_delay
+        probe = None
+        
+        try:
+            while not stop.is_set():
+                if probe is None:
+                    self.attempt += 1
+                    self._set_state(self.RECONNECTING if self.connected_once else self.CONNECTING)
+                    
+                    started = time.perf_counter()
+                    conn = None
+                    try:
+                        probe = self.db.open_connection(self.config)
+                        conn = self.db.open_connection(self.config)
+                    except Exception as e:
+                        self._close(probe)
+                        probe = None
+                        message = str(e).replace('\n', ' ')
+                        self._log(f"Ошибка подключения: {message}")
+                        self._log(f"Повторная попытка подключения через {delay:.0f} с")
+                        self._set_state(self.WAITING, retry_in=delay, message=message)
+                        if stop.wait(delay):
+                            break
+                        delay = min(delay * 2, self.max_delay)
+                        continue
+                    
+                    with self._connect_lock:
+                        if stop.is_set():
+                            # Контроль остановлен во время подключения
+                            self._close(conn)
+                            break
+                        self._log(f"Подключение установлено за {time.perf_counter() - started:.2f} с "
+                                  f"(попытка {self.attempt})")
+                        self.connected_once = True
+                        self.attempt = 0
+                        # Потеря прежнего соединения уже обработана
+                        self._lost.clear()
+                        self._set_state(self.CONNECTED, connection=conn)
+                
+                self._wake.wait(self.ping_interval)
+                self._wake.clear()
+                if stop.is_set():
+                    break
+                
+                if self._retry.is_set():
+                    # Поток Tk не смог подключить переданное соединение
+                    self._retry.clear()
+                    self._close(probe)
+                    probe = None
+                    self._log(f"Повторная попытка подключения через {delay:.0f} с")
+                    self._set_state(self.WAITING, retry_in=delay, message=self.db.last_error)
+                    if stop.wait(delay):
+                        break
+                    delay = min(delay * 2, self.max_delay)
+                    continue
+                
+                if self._lost.is_set():
+                    # Служебное соединение может быть живо, а основное - оборвано
+                    self._lost.clear()
+                    self._log("Основное соединение с базой данных потеряно, переподключение...")
+                    self._close(probe)
+                    probe = None
+                    continue
+                
+                error = self.db.ping_connection(probe)
+                if error is None:
+                    delay = self.initial_delay
+                else:
+                    self._log(f"Соединение с базой данных потеряно ({error}), переподключение...")
+                    self._close(probe)
+                    probe = None
+        finally:
+            self._close(probe)
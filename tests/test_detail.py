@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Разбор detail-файла FreeRADIUS (tests/fixtures/detail) без подключения к БД
+"""
+
+import itertools
+import os
+import unittest
+from datetime import datetime
+
+from detail import COLUMN_NAMES, DetailFile, accounting_event, merge_session
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'detail')
+
+class DetailTest(unittest.TestCase):
+
+    def setUp(self):
+        self.records = list(DetailFile(FIXTURE).records())
+    
+    def session(self, index: int) -> dict:
+        kind, row = accounting_event(*self.records[index][1:])
+        self.assertEqual(kind, 'session')
+        return dict(zip(COLUMN_NAMES, row))
+    
+    def test_records_skip_partial(self):
+        """Пять полных записей, недописанная запись в конце не читается"""
+        self.assertEqual([attributes['Acct-Status-Type'] for _, _, attributes in self.records],
+                         ['Start', 'Interim-Update', 'Stop', 'Accounting-On', 'Start'])
+        self.assertEqual(self.records[0][1], 'Mon Jan 15 10:00:00 2024')
+        self.assertEqual(self.records[0][2]['User-Name'], 'alice')
+        
+        # Смещение после последней полной записи - начало недописанной
+        with open(FIXTURE, 'rb') as f:
+            tail = f.read()[self.records[-1][0]:]
+        self.assertTrue(tail.startswith(b'Mon Jan 15 10:13:00 2024\n'))
+    
+    def test_records_from_offset(self):
+        """Чтение с контрольной точки продолжает со следующей записи"""
+        rest = list(DetailFile(FIXTURE).records(self.records[2][0]))
+        self.assertEqual(rest, self.records[3:])
+        self.assertEqual(list(DetailFile(FIXTURE).records(os.path.getsize(FIXTURE))), [])
+    
+    def test_start(self):
+        row = self.session(0)
+        moment = datetime.fromtimestamp(1705312800)
+        self.assertEqual(row['username'], 'alice')
+        self.assertEqual(row['acctsessionid'], 'S-1')
+        self.assertEqual(row['nasipaddress'], '10.0.0.1')
+        self.assertEqual(row['framedipaddress'], '100.64.0.10')
+        self.assertEqual(row['acctstarttime'], moment)
+        self.assertEqual(row['acctupdatetime'], moment)
+        self.assertEqual(row['connectinfo_start'], 'start info')
+        self.assertEqual(row['has_start'], 1)
+        self.assertIsNone(row['acctstoptime'])
+    
+    def test_interim(self):
+        row = self.session(1)
+        self.assertEqual(row['acctsessiontime'], 300)
+        self.assertEqual(row['acctinputoctets'], 1000)
+        self.assertEqual(row['acctoutputoctets'], 2000)
+        # Время начала вычисляется из Acct-Session-Time
+        self.assertEqual(row['acctstarttime'], datetime.fromtimestamp(1705312800))
+        self.assertEqual(row['has_start'], 0)
+        self.assertIsNone(row['acctstoptime'])
+    
+    def test_stop(self):
+        row = self.session(2)
+        # Acct-Delay-Time вычитается из Timestamp
+        self.assertEqual(row['acctstoptime'], datetime.fromtimestamp(1705313400))
+        self.assertEqual(row['acctinputoctets'], (1 << 32) + 5000)
+        self.assertEqual(row['acctterminatecause'], 'User-Request')
+        self.assertEqual(row['connectinfo_stop'], 'stop info')
+    
+    def test_same_unique_id(self):
+        """Все события сессии получают один acctuniqueid"""
+        self.assertEqual(len({self.session(index)['acctuniqueid'] for index in range(3)}), 1)
+    
+    def test_accounting_on(self):
+        event = accounting_event(*self.records[3][1:])
+        self.assertEqual(event, ('nas', ('10.0.0.2', datetime.fromtimestamp(1705313460), 'Accounting-On')))
+    
+    def test_ipv6_nas_skipped(self):
+        """Адрес IPv6 длиннее nasipaddress - запись пропускается, а не обрезается"""
+        self.assertIsNone(accounting_event(*self.records[4][1:]))
+    
+    def test_merge_session(self):
+        events = [accounting_event(*record[1:])[1] for record in self.records[:3]]
+        merged = None
+        for event in events:
+            merged = merge_session(merged, event)
+        row = dict(zip(COLUMN_NAMES, merged))
+        
+        self.assertEqual(row['acctstarttime'], datetime.fromtimestamp(1705312800))
+        self.assertEqual(row['acctupdatetime'], datetime.fromtimestamp(1705313400))
+        self.assertEqual(row['acctstoptime'], datetime.fromtimestamp(1705313400))
+        self.assertEqual(row['acctinterval'], 300)
+        self.assertEqual(row['acctsessiontime'], 600)
+        self.assertEqual(row['acctinputoctets'], (1 << 32) + 5000)
+        self.assertEqual(row['connectinfo_start'], 'start info')
+        self.assertEqual(row['connectinfo_stop'], 'stop info')
+        self.assertEqual(row['has_start'], 1)
+    
+    def test_merge_session_any_order(self):
+        """Итог слияния не зависит от порядка событий (кроме acctinterval)"""
+        events = [accounting_event(*record[1:])[1] for record in self.records[:3]]
+        results = set()
+        for order in itertools.permutations(events):
+            merged = None
+            for event in order:
+                merged = merge_session(merged, event)
+            results.add(tuple(value for column, value in zip(COLUMN_NAMES, merged) if column != 'acctinterval'))
+        self.assertEqual(len(results), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Классификация ошибок pyodbc по SQLSTATE и кодам SQL Server
+"""
+
+import unittest
+
+try:
+    import pyodbc
+except ImportError:
+    raise unittest.SkipTest("нет pyodbc")
+
+from database import ERROR_FATAL, ERROR_RECONNECT, ERROR_RETRY, classify_error, error_codes
+
+DRIVER = '[Microsoft][ODBC Driver 17 for SQL Server][SQL Server]'
+
+def odbc_error(sqlstate, *records):
+    return pyodbc.Error(sqlstate, '; '.join(records))
+
+class ErrorCodesTest(unittest.TestCase):
+
+    def test_duplicate_key_with_number_in_value(self):
+        error = odbc_error(
+            '23000',
+            f"[23000] {DRIVER}Violation of UNIQUE KEY constraint 'ux_radcheck'. "
+            f"The duplicate key value is (64). (2627) (SQLExecDirectW)",
+            f"[01000] {DRIVER}The statement has been terminated. (3621)")
+        self.assertEqual(error_codes(error), ('23000', [2627, 3621]))
+        self.assertEqual(classify_error(error), ERROR_FATAL)
+    
+    def test_deadlock(self):
+        error = odbc_error('40001', f"[40001] {DRIVER}Transaction (Process ID 64) was deadlocked "
+                                    f"on lock resources. (1205) (SQLExecDirectW)")
+        self.assertEqual(error_codes(error)[1], [1205])
+        self.assertEqual(classify_error(error), ERROR_RETRY)
+    
+    def test_connection_lost(self):
+        error = odbc_error('08S01', f"[08S01] {DRIVER}TCP Provider: An existing connection was "
+                                    f"forcibly closed by the remote host. (10054) (SQLExecDirectW)")
+        self.assertEqual(classify_error(error), ERROR_RECONNECT)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Уровень изоляции чтения на основном соединении без autocommit
+"""
+
+import unittest
+
+try:
+    import pyodbc
+except ImportError:
+    raise unittest.SkipTest("нет pyodbc")
+
+from config import DatabaseConfig
+from database import DatabaseManager
+
+class RecordingCursor:
+    """Курсор, записывающий запросы в журнал соединения"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+    
+    def execute(self, sql, *params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SET TRANSACTION ISOLATION LEVEL'):
+            # Как SQL Server: SNAPSHOT нельзя включить внутри транзакции
+            if sql.endswith('SNAPSHOT') and self.conn.in_transaction:
+                raise pyodbc.Error('3951', 'Transaction failed because this DDL statement is not allowed')
+        else:
+            # IMPLICIT_TRANSACTIONS: любой запрос открывает транзакцию
+            self.conn.in_transaction = True
+        self.conn.log.append(sql)
+        if 'snapshot_isolation_state' in sql:
+            self.row = (1,)
+        elif 'dm_exec_session_wait_stats' in sql:
+            self.row = (0, 0)
+        else:
+            self.row = (1,)
+        return self
+    
+    def fetchone(self):
+        return self.row
+    
+    def fetchall(self):
+        return [self.row]
+    
+    def close(self):
+        pass
+
+class RecordingConnection:
+
+    def __init__(self):
+        self.log = []
+        self.in_transaction = False
+    
+    def cursor(self):
+        return RecordingCursor(self)
+    
+    def commit(self):
+        self.in_transaction = False
+        self.log.append('COMMIT')
+    
+    def rollback(self):
+        self.in_transaction = False
+        self.log.append('ROLLBACK')
+
+class IsolatedReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DatabaseManager()
+        self.db.conn = RecordingConnection()
+        self.db.config = DatabaseConfig(read_isolation='auto', lock_wait_stats=True)
+    
+    def read(self):
+        with self.db._isolated_read('test') as cursor:
+            cursor.execute("SELECT username FROM radcheck")
+    
+    def levels(self):
+        return [sql for sql in self.db.conn.log if sql == 'SET TRANSACTION ISOLATION LEVEL SNAPSHOT']
+    
+    def test_second_read_sets_isolation(self):
+        """Служебные запросы первого чтения не мешают второму сменить уровень"""
+        self.read()
+        self.read()
+        self.assertEqual(len(self.levels()), 2)
+        self.assertFalse(self.db.conn.in_transaction)
+    
+    def test_after_probe_outside_read(self):
+        """Неявная транзакция служебного чтения (версия схемы) завершается перед сменой уровня"""
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT MAX(version) FROM rm_schema_version")
+        self.read()
+        self.assertEqual(len(self.levels()), 1)
+    
+    def test_inside_write_transaction(self):
+        """Внутри транзакции записи чтение не фиксирует ее и не меняет уровень"""
+        def work(cursor):
+            cursor.execute("UPDATE radcheck SET value = 'x'")
+            self.read()
+            self.assertTrue(self.db.conn.in_transaction)
+        
+        self.db._transaction('test', work)
+        self.assertEqual(self.levels(), [])
+        self.assertEqual(self.db.conn.log.count('COMMIT'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Тесты инкрементального обновления модели открытых сессий
+"""
+
+import unittest
+from datetime import datetime
+
+from models import OnlineSessions
+
+STARTED = datetime(2024, 1, 1, 12, 0)
+
+def session(session_id, username, octets_in, stop=None):
+    return (session_id, username, '10.0.0.1', '10.1.0.1', STARTED, octets_in, 0, stop)
+
+class OnlineSessionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = OnlineSessions()
+        self.model.replace([session(1, 'bob', 300), session(2, 'alice', 100), session(3, 'carol', 200)])
+        self.model.sort('acctinputoctets')
+        self.model.sort('username')
+    
+    def test_counters_updated_in_place(self):
+        rows = self.model.rows
+        name_order = self.model._permutations['username']
+        
+        self.assertTrue(self.model.apply([session(2, 'alice', 500)]))
+        self.assertIs(self.model.rows, rows)
+        self.assertIs(self.model._permutations['username'], name_order)
+        self.assertNotIn('acctinputoctets', self.model._permutations)
+        self.assertEqual(self.model.rows[self.model.row_id(0)][4], 500)
+    
+    def test_sorted_column_changed(self):
+        self.model.sort('acctinputoctets', reverse=False)
+        self.model.apply([session(2, 'alice', 500)])
+        self.assertEqual([self.model.rows[row_id][0] for row_id in self.model.view],
+                         ['carol', 'bob', 'alice'])
+    
+    def test_unchanged_rows_ignored(self):
+        self.assertFalse(self.model.apply([session(1, 'bob', 300)]))
+    
+    def test_new_and_closed_sessions(self):
+        self.assertTrue(self.model.apply([session(4, 'dave', 50), session(1, 'bob', 300, STARTED)]))
+        self.assertEqual([self.model.rows[row_id][0] for row_id in self.model.view],
+                         ['alice', 'carol', 'dave'])
+        
+        self.model.apply([session(4, 'dave', 900)])
+        self.assertEqual(self.model.rows[self.model.row_id(2)], ('dave', '10.0.0.1', '10.1.0.1', STARTED, 900, 0))
+
+if __name__ == '__main__':
+    unittest.main()
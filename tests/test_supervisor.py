@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Переподключение ConnectionSupervisor при потере основного соединения
+"""
+
+import time
+import unittest
+
+from supervisor import ConnectionSupervisor
+
+class FakeConnection:
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+class FakeDatabase:
+    """Сервер доступен, служебное соединение всегда отвечает на проверку"""
+    
+    last_error = ''
+    
+    def __init__(self):
+        self.opened = 0
+    
+    def open_connection(self, config):
+        self.opened += 1
+        return FakeConnection(self.opened)
+    
+    @staticmethod
+    def ping_connection(conn):
+        return None
+
+class SupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDatabase()
+        self.supervisor = ConnectionSupervisor(self.db, ping_interval=60.0)
+        self.addCleanup(self.supervisor.stop)
+    
+    def wait_events(self, count, timeout=2.0):
+        events = []
+        deadline = time.monotonic() + timeout
+        while len(events) < count and time.monotonic() < deadline:
+            events.extend(self.supervisor.poll_events())
+            time.sleep(0.01)
+        return events
+    
+    def test_lost_main_connection_reconnects(self):
+        self.supervisor.start(config=None)
+        first = self.wait_events(2)
+        self.assertEqual([event.state for event in first],
+                         [ConnectionSupervisor.CONNECTING, ConnectionSupervisor.CONNECTED])
+        
+        self.supervisor.connection_lost("08S01")
+        second = self.wait_events(2)
+        self.assertEqual([event.state for event in second],
+                         [ConnectionSupervisor.RECONNECTING, ConnectionSupervisor.CONNECTED])
+        self.assertIsNot(second[1].connection, first[1].connection)
+    
+    def test_ignored_while_not_connected(self):
+        self.supervisor.connection_lost("08S01")
+        self.assertFalse(self.supervisor._lost.is_set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Адаптивная подстройка скорости записи (WriteThrottle)
+"""
+
+import unittest
+
+from throttle import WriteThrottle
+
+class AdaptiveThrottleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.throttle = WriteThrottle(rate=5000, adaptive=True, latency_target=0.2)
+        # Подстройка после каждого измерения
+        self.throttle.ADJUST_INTERVAL = 0.0
+    
+    def test_large_healthy_chunks_keep_rate(self):
+        """Порции по 5000 строк за 1 с (цель ChunkSizer) не снижают скорость"""
+        for _ in range(50):
+            self.throttle._observe(1.0, rows=5000)
+        self.assertEqual(self.throttle.rate, 5000)
+    
+    def test_slow_small_transactions_reduce_rate(self):
+        for _ in range(5):
+            self.throttle._observe(0.5, rows=1)
+        self.assertLess(self.throttle.rate, 5000)
+        self.assertGreaterEqual(self.throttle.rate, WriteThrottle.MIN_RATE)
+    
+    def test_slow_large_chunks_reduce_rate(self):
+        """Порция, медленная и в пересчете на строку, снижает скорость"""
+        for _ in range(5):
+            self.throttle._observe(20.0, rows=5000)
+        self.assertLess(self.throttle.rate, 5000)
+    
+    def test_rate_recovers(self):
+        for _ in range(5):
+            self.throttle._observe(0.5, rows=1)
+        for _ in range(200):
+            self.throttle._observe(0.01, rows=1)
+        self.assertEqual(self.throttle.rate, 5000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Ограничение скорости записи в базу данных
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+class WriteThrottle:
+    """Ограничитель записи: строк в секунду и одновременных транзакций
+    
+    Один объект разделяется основным подключением и фоновыми (spawn),
+    поэтому ограничения действуют на все массовые операции вместе.
+    Скорость считается в записываемых строках: транзакция порции из
+    rows строк занимает rows / rate секунд, так что крупные порции
+    массовых операций не обходят лимит.
+    В адаптивном режиме скорость снижается, когда сглаженная задержка
+    превышает latency_target, и постепенно восстанавливается до заданного
+    предела, когда задержка снова в норме. latency_target относится к
+    транзакции до LATENCY_ROWS строк: задержка крупной порции приводится
+    к этому объему, иначе долгая, но нормальная порция массового импорта
+    снижала бы скорость до MIN_RATE при любой нагрузке сервера.
+    """
+    
+    ADAPTIVE_MAX_RATE = 20000.0   # предел адаптивного режима без явного лимита, строк/с
+    MIN_RATE = 10.0
+    DECREASE_FACTOR = 0.7
+    INCREASE_STEP = 0.05          # доля предела, добавляемая при нормальной задержке
+    SMOOTHING = 0.2               # вес нового измерения в скользящем среднем
+    ADJUST_INTERVAL = 1.0         # не чаще одной подстройки в секунду
+    LATENCY_ROWS = 100            # объем транзакции, к которому приводится задержка
+    
+    def __init__(self, rate: float = 0.0, max_concurrent: int = 0,
+                 adaptive: bool = False, latency_target: float = 0.2, logger=None):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._semaphore: Optional[threading.BoundedSemaphore] = None
+        self.configure(rate, max_concurrent, adaptive, latency_target)
+    
+    def configure(self, rate: float = 0.0, max_concurrent: int = 0,
+                  adaptive: bool = False, latency_target: float = 0.2):
+        """Установка ограничений (0 - без ограничения)"""
+        with self._lock:
+            self.adaptive = adaptive
+            self.latency_target = max(0.001, latency_target)
+            self.max_rate = rate if rate > 0 else (self.ADAPTIVE_MAX_RATE if adaptive else 0.0)
+            self.rate = self.max_rate
+            self.max_concurrent = max(0, max_concurrent)
+            self.latency: Optional[float] = None
+            self.waited = 0.0
+            self._next_slot = time.monotonic()
+            self._adjusted_at = 0.0
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent else None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0 or self.max_concurrent > 0
+    
+    @contextmanager
+    def slot(self, rows: int = 1):
+        """Ожидание разрешения на транзакцию из rows строк и учет ее задержки"""
+        if not self.enabled:
+            yield
+            return
+        
+        self._wait_for_rate(rows)
+        semaphore = self._semaphore
+        if semaphore:
+            semaphore.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            if semaphore:
+                semaphore.release()
+            self._observe(time.monotonic() - started, rows)
+    
+    def charge(self, rows: int):
+        """Учет строк, число которых стало известно только после транзакции (MERGE)"""
+        with self._lock:
+            if self.rate <= 0 or rows <= 0:
+                return
+            self._next_slot = max(time.monotonic(), self._next_slot) + rows / self.rate
+    
+    def _wait_for_rate(self, rows: int):
+        """Равномерное распределение записываемых строк во времени"""
+        with self._lock:
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + max(1, rows) / self.rate
+            delay = slot - now
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _observe(self, latency: float, rows: int = 1):
+        """Учет задержки транзакции из rows строк и подстройка скорости (адаптивный режим)"""
+        if rows > self.LATENCY_ROWS:
+            latency *= self.LATENCY_ROWS / rows
+        message = None
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.SMOOTHING * (latency - self.latency)
+            
+            now = time.monotonic()
+            if not self.adaptive or self.max_rate <= 0 or now - self._adjusted_at < self.ADJUST_INTERVAL:
+                return
+            self._adjusted_at = now
+            
+            if self.latency > self.latency_target:
+                rate = max(self.MIN_RATE, self.rate * self.DECREASE_FACTOR)
+                if rate < self.rate:
+                    self.rate = rate
+                    message = (f"Задержка записи {self.latency * 1000:.0f} мс, "
+                               f"скорость снижена до {rate:.0f} строк/с")
+            elif self.latency < self.latency_target / 2 and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.INCREASE_STEP)
+                if self.rate == self.max_rate:
+                    message = f"Задержка записи в норме, скорость восстановлена до {self.rate:.0f} строк/с"
+        
+        if message and self.logger:
+            self.logger.log(message, operation='throttle')
@@ -3,58 +3,281 @@
 Модуль логирования
 """
 
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import deque
 from datetime import datetime
-import tkinter as tk
-from tkinter import scrolledtext
+from typing import Optional, TextIO
+
+class JsonLinesFormatter(logging.Formatter):
+    """Форматирование записей лога в JSON Lines"""
+    
+    FIELDS = ('operation', 'username', 'duration')
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат файла лога с необязательными полями операции"""
+    
+    def __init__(self):
+        super().__init__('%(asctime)s %(message)s')
+    
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extras = []
+        for field in JsonLinesFormatter.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                extras.append(f"{field}={value}")
+        if extras:
+            text += " [" + " ".join(extras) + "]"
+        return text
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """Постановка записи в очередь без форматирования в вызывающем потоке"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 class Logger:
-    """Класс для логирования сообщений"""
+    """Класс для логирования сообщений
     
-    def __init__(self, log_widget: scrolledtext.ScrolledText = None, status_label: tk.Label = None):
-        self.log_widget = log_widget
-        self.status_label = status_label
-        self.messages = []
+    Сообщения хранятся в кольцевом буфере ограниченного размера. Вызов log()
+    безопасен из любого потока: запись ставится в очередь, а виджет лога,
+    строка статуса и консоль обновляются пачками в потоке Tk через after().
+    Очередь вывода ограничена MAX_PENDING: если потоки пишут быстрее, чем
+    она выводится, старые строки отбрасываются, а их число выводится
+    одной строкой со следующей пачкой.
+    Запись в файл (enable_file_log) выполняет отдельный фоновый поток.
+    Модуль не импортирует tkinter, поэтому подходит и для консольного режима.
+    """
+    
+    FLUSH_INTERVAL_MS = 100
+    MAX_MESSAGES = 10000
+    MAX_WIDGET_LINES = 5000
+    MAX_BATCH = 1000
+    MAX_PENDING = 10000
+    
+    def __init__(self, log_widget=None, status_label=None,
+                 max_messages: int = MAX_MESSAGES, max_lines: int = MAX_WIDGET_LINES,
+                 console: Optional[TextIO] = sys.stdout):
+        self.log_widget = None
+        self.status_label = None
+        self.max_lines = max_lines
+        self.console = console
+        self.messages = deque(maxlen=max_messages)
+        
+        self._pending = deque(maxlen=self.MAX_PENDING)
+        self._pending_lock = threading.Lock()
+        self._dropped = 0
+        self._flush_job = None
+        self._flush_owner = None
+        
+        self._file_logger: Optional[logging.Logger] = None
+        self._file_listener: Optional[logging.handlers.QueueListener] = None
+        
+        if log_widget:
+            self.set_log_widget(log_widget)
+        if status_label:
+            self.set_status_label(status_label)
     
-    def log(self, message: str):
-        """Добавление сообщения в лог"""
+    def log(self, message: str, operation: str = None, username: str = None, duration: float = None):
+        """Добавление сообщения в лог (можно вызывать из любого потока)
+        
+        operation, username и duration попадают в файл лога как поля записи.
+        """
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}"
         
-        # Сохраняем в памяти
+        # Сохраняем в кольцевом буфере
         self.messages.append(log_entry)
         
-        # Выводим в виджет, если он есть
+        # В файл пишет фоновый поток, здесь только постановка в очередь
+        if self._file_logger:
+            self._file_logger.info(message, extra={
+                'operation': operation,
+                'username': username,
+                'duration': round(duration, 4) if duration is not None else None,
+            })
+        
+        if self._flush_owner is None:
+            # Интерфейса нет - выводим сразу в консоль
+            if self.console:
+                print(log_entry, file=self.console)
+        else:
+            with self._pending_lock:
+                if len(self._pending) == self._pending.maxlen:
+                    self._dropped += 1
+                self._pending.append((log_entry, message))
+    
+    def _take_pending(self, limit: int = None) -> list:
+        """Извлечение до limit записей очереди вывода (со строкой об отброшенных)"""
+        with self._pending_lock:
+            count = len(self._pending) if limit is None else min(limit, len(self._pending))
+            items = [self._pending.popleft() for _ in range(count)]
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            message = f"Пропущено сообщений лога: {dropped} (переполнение очереди вывода)"
+            items.insert(0, (f"[{datetime.now().strftime('%H:%M:%S')}] {message}", message))
+        return items
+    
+    def flush(self) -> int:
+        """Вывод накопленных сообщений, не больше MAX_BATCH (вызывается в потоке Tk)
+        
+        Возвращает количество выведенных сообщений.
+        """
+        items = self._take_pending(self.MAX_BATCH)
+        if not items:
+            return 0
+        entries = [log_entry for log_entry, _ in items]
+        last_message = items[-1][1]
+        
+        text = "\n".join(entries)
+        
+        # Выводим в виджет одной вставкой, удаляя старые строки сверх лимита
         if self.log_widget:
             self.log_widget.configure(state='normal')
-            self.log_widget.insert(tk.END, log_entry + "\n")
-            self.log_widget.see(tk.END)
+            self.log_widget.insert('end', text + "\n")
+            line_count = int(self.log_widget.index('end-1c').split('.')[0]) - 1
+            if line_count > self.max_lines:
+                self.log_widget.delete('1.0', f'{line_count - self.max_lines + 1}.0')
+            self.log_widget.see('end')
             self.log_widget.configure(state='disabled')
         
-        # Обновляем статус бар, если он есть
+        # Обновляем статус бар последним сообщением пачки
         if self.status_label:
-            self.status_label.config(text=message[:100])
+            self.status_label.config(text=last_message[:100])
         
         # Также выводим в консоль для отладки
-        print(log_entry)
+        if self.console:
+            print(text, file=self.console)
+        return len(entries)
+    
+    def stop(self):
+        """Остановка периодического вывода с выводом оставшихся сообщений"""
+        if self._flush_job and self._flush_owner:
+            from tkinter import TclError
+            try:
+                self._flush_owner.after_cancel(self._flush_job)
+                while self.flush():
+                    pass
+            except TclError:
+                pass
+        self._flush_job = None
+        self._flush_owner = None
+        
+        # Виджет уже уничтожен - остаток очереди выводится в консоль
+        for log_entry, _ in self._take_pending():
+            if self.console:
+                print(log_entry, file=self.console)
+        self.disable_file_log()
+    
+    def enable_file_log(self, filename: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                        rotate_when: str = '', json_lines: bool = False) -> bool:
+        """Включение записи лога в файл через фоновый поток
+        
+        rotate_when задает ротацию по времени ('midnight', 'H', 'D', ...),
+        иначе файл ротируется по размеру max_bytes.
+        """
+        self.disable_file_log()
+        
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+            if rotate_when:
+                handler = logging.handlers.TimedRotatingFileHandler(
+                    filename, when=rotate_when, backupCount=backup_count,
+                    encoding='utf-8', delay=True
+                )
+            else:
+                handler = logging.handlers.RotatingFileHandler(
+                    filename, maxBytes=max_bytes, backupCount=backup_count,
+                    encoding='utf-8', delay=True
+                )
+        except (OSError, ValueError) as e:
+            self.log(f"Не удалось открыть файл лога {filename}: {str(e)}")
+            return False
+        
+        handler.setFormatter(JsonLinesFormatter() if json_lines else TextFormatter())
+        
+        records = queue.SimpleQueue()
+        file_logger = logging.getLogger(f"radius_manager.file.{id(self)}")
+        file_logger.setLevel(logging.INFO)
+        file_logger.propagate = False
+        file_logger.handlers = [_RecordQueueHandler(records)]
+        
+        self._file_listener = logging.handlers.QueueListener(records, handler)
+        self._file_listener.start()
+        self._file_logger = file_logger
+        return True
+    
+    def disable_file_log(self):
+        """Отключение записи в файл (дописывает накопленные записи)"""
+        listener = self._file_listener
+        self._file_logger = None
+        self._file_listener = None
+        if listener:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
     
     def clear(self):
         """Очистка лога"""
-        self.messages = []
+        self.messages.clear()
+        with self._pending_lock:
+            self._pending.clear()
+            self._dropped = 0
         if self.log_widget:
             self.log_widget.configure(state='normal')
-            self.log_widget.delete(1.0, tk.END)
+            self.log_widget.delete(1.0, 'end')
             self.log_widget.configure(state='disabled')
     
     def get_messages(self, count: int = None):
         """Получение последних сообщений"""
+        messages = list(self.messages)
         if count is None:
-            return self.messages
-        return self.messages[-count:]
+            return messages
+        return messages[-count:]
     
-    def set_log_widget(self, log_widget: scrolledtext.ScrolledText):
+    def set_log_widget(self, log_widget):
         """Установка виджета для вывода лога"""
         self.log_widget = log_widget
+        self._start_flushing(log_widget)
     
-    def set_status_label(self, status_label: tk.Label):
+    def set_status_label(self, status_label):
         """Установка метки статуса"""
-        self.status_label = status_label
\ No newline at end of file
+        self.status_label = status_label
+        self._start_flushing(status_label)
+    
+    def _start_flushing(self, widget):
+        """Запуск периодического вывода в потоке Tk"""
+        if self._flush_owner is None and widget is not None:
+            self._flush_owner = widget
+            self._flush_job = widget.after(self.FLUSH_INTERVAL_MS, self._on_flush_timer)
+    
+    def _on_flush_timer(self):
+        """Периодический вывод накопленных сообщений"""
+        from tkinter import TclError
+        try:
+            self.flush()
+        finally:
+            try:
+                if self._flush_owner is not None:
+                    self._flush_job = self._flush_owner.after(self.FLUSH_INTERVAL_MS, self._on_flush_timer)
+            except TclError:
+                # Виджет уничтожен - дальше пишем сразу в консоль
+                self._flush_job = None
+                self._flush_owner = None